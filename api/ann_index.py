@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Approximate nearest-neighbour (IVF) index for embedding similarity search.
+
+台帳が数百万件になると全件の行列×ベクトル積でも 1クエリ数十ms〜かかるため、
+ベクトルを球面 k-means のセントロイド（``n_lists`` 個）で分割した転置リスト
+（Inverted File, IVF）を作り、クエリに近い ``n_probe`` 個のリストだけを走査する。
+
+- ``n_lists``: 分割数。増やすと1リストが小さくなり速いが、学習に時間がかかる
+- ``n_probe``: 走査するリスト数。増やすと再現率が上がり遅くなる（= n_lists で全件と同じ）
+- :meth:`IVFIndex.add` で学習後もベクトルを追加できる（最も近いリストに入る）。
+  追加が学習時の件数を大きく超えたら :meth:`IVFIndex.needs_retrain` で作り直す
+- 検索と追加は別スレッドから同時に呼んでよい（リストの追加・連結はロック下で行う）
+
+ベクトルはすべて L2 正規化済み float32 を前提とする（内積 = コサイン類似度）。
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("fixed_asset_api")
+
+# k-means の割り当て計算を一度に行う行数（類似度行列のメモリ上限）
+_ASSIGN_BLOCK_ROWS = 16384
+
+
+def default_n_lists(n: int) -> int:
+    """4·√n lists (faiss の目安), at least 1."""
+    return max(1, int(4 * np.sqrt(max(n, 1))))
+
+
+class IVFIndex:
+    """Inverted-file index over row-normalized float32 vectors."""
+
+    def __init__(
+        self,
+        n_lists: int,
+        n_probe: int = 8,
+        train_iterations: int = 10,
+        max_train_points: Optional[int] = None,
+        seed: int = 0,
+    ) -> None:
+        self.n_lists = max(1, n_lists)
+        self.n_probe = max(1, n_probe)
+        self.train_iterations = max(1, train_iterations)
+        self.max_train_points = max_train_points
+        self.seed = seed
+        self.dim = 0
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.trained_on = 0
+        self.ntotal = 0
+        self._ids: List[List[np.ndarray]] = []
+        self._vectors: List[List[np.ndarray]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids.shape[0] > 0
+
+    def needs_retrain(self, factor: float = 2.0) -> bool:
+        """True once the index holds ``factor`` x the vectors it was trained on."""
+        return self.is_trained and self.ntotal > factor * max(self.trained_on, 1)
+
+    # ------------------------------------------------------------------
+    # 学習・追加
+    # ------------------------------------------------------------------
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Spherical k-means on (a sample of) ``vectors``."""
+        n = vectors.shape[0]
+        if n == 0:
+            raise ValueError("Cannot train an IVF index on zero vectors")
+        rng = np.random.default_rng(self.seed)
+        k = min(self.n_lists, n)
+        limit = self.max_train_points or max(k * 40, 10_000)
+        if n > limit:
+            sample = np.asarray(vectors[np.sort(rng.choice(n, size=limit, replace=False))], dtype=np.float32)
+        else:
+            sample = np.asarray(vectors, dtype=np.float32)
+
+        centroids = sample[rng.choice(sample.shape[0], size=k, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assign, best = self._assign(sample, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=k)
+            sums = np.zeros_like(centroids)
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+            sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+            # 空のクラスタは最も当てはまりの悪い点で張り直す
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                worst = np.argsort(best)[:len(empty)]
+                sums[empty] = sample[worst]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            np.divide(sums, norms, out=sums, where=norms > 0)
+            centroids = sums
+
+        self.dim = sample.shape[1]
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.n_lists = k
+        self.trained_on = n
+        with self._lock:
+            self.ntotal = 0
+            self._ids = [[] for _ in range(k)]
+            self._vectors = [[] for _ in range(k)]
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Insert vectors (with caller ids) into their nearest list."""
+        if not self.is_trained:
+            raise RuntimeError("IVF index must be trained before add()")
+        if len(ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        assign, _ = self._assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        lists, starts = np.unique(assign[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        with self._lock:
+            for list_no, start, end in zip(lists.tolist(), starts.tolist(), bounds):
+                rows = order[start:end]
+                self._ids[list_no].append(ids[rows])
+                self._vectors[list_no].append(np.ascontiguousarray(vectors[rows]))
+            self.ntotal += len(ids)
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        assign = np.empty(vectors.shape[0], dtype=np.int64)
+        best = np.empty(vectors.shape[0], dtype=np.float32)
+        for start in range(0, vectors.shape[0], _ASSIGN_BLOCK_ROWS):
+            sims = np.asarray(vectors[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32) @ centroids.T
+            assign[start:start + len(sims)] = np.argmax(sims, axis=1)
+            best[start:start + len(sims)] = sims.max(axis=1)
+        return assign, best
+
+    def _list(self, list_no: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids / vectors of one list (追加分のチャンクを初回アクセス時に連結する).
+
+        連結と書き戻しは add() と同じロック下で行い、その間の追加を失わない。
+        """
+        with self._lock:
+            ids, vectors = self._ids[list_no], self._vectors[list_no]
+            if len(ids) > 1:
+                self._ids[list_no] = ids = [np.concatenate(ids)]
+                self._vectors[list_no] = vectors = [np.concatenate(vectors)]
+            if ids:
+                return ids[0], vectors[0]
+        return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float32)
+
+    # ------------------------------------------------------------------
+    # 検索
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        n_probe: Optional[int] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Approximate top-k for each row of ``queries`` (normalized float32).
+
+        クエリが同じリストを走査する場合はまとめて1回の行列積で計算する。
+
+        Returns:
+            per query ``(ids, scores)``: 類似度降順（同点は id 昇順）
+        """
+        m = queries.shape[0]
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if m == 0 or not self.is_trained or self.ntotal == 0 or top_k <= 0:
+            return [empty for _ in range(m)]
+
+        probe = min(n_probe or self.n_probe, self.n_lists)
+        coarse = queries @ self.centroids.T
+        if probe < self.n_lists:
+            probed = np.argpartition(-coarse, probe - 1, axis=1)[:, :probe]
+        else:
+            probed = np.broadcast_to(np.arange(self.n_lists), (m, self.n_lists))
+
+        cand_ids: List[List[np.ndarray]] = [[] for _ in range(m)]
+        cand_scores: List[List[np.ndarray]] = [[] for _ in range(m)]
+        flat_lists = probed.ravel()
+        flat_queries = np.repeat(np.arange(m), probed.shape[1])
+        order = np.argsort(flat_lists, kind="stable")
+        lists, starts = np.unique(flat_lists[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        for list_no, start, end in zip(lists.tolist(), starts.tolist(), bounds):
+            ids, vectors = self._list(list_no)
+            if not len(ids):
+                continue
+            query_rows = flat_queries[order[start:end]]
+            scores = queries[query_rows] @ vectors.T
+            for row, query_index in enumerate(query_rows.tolist()):
+                cand_ids[query_index].append(ids)
+                cand_scores[query_index].append(scores[row])
+
+        results = []
+        for query_index in range(m):
+            if not cand_ids[query_index]:
+                results.append(empty)
+                continue
+            ids = np.concatenate(cand_ids[query_index])
+            scores = np.concatenate(cand_scores[query_index])
+            if top_k < len(ids):
+                keep = np.argpartition(-scores, top_k - 1)[:top_k]
+                ids, scores = ids[keep], scores[keep]
+            order_k = np.lexsort((ids, -scores))
+            results.append((ids[order_k], scores[order_k]))
+        return results
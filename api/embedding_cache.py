@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache for text embeddings.
+
+台帳には「ノートPC」「事務机」のような同じ名称が何千行も並び、UI からは同じ検索語が
+何度も送られてくる。Embedding は（モデルが同じなら）入力テキストだけで決まるため、
+正規化したテキストとモデル名のハッシュをキーにベクトルを保存し、API 呼び出しを
+一度きりにする。
+
+- 前段: プロセス内 LRU（``mem_items`` 件）
+- 後段: ローカル SQLite（float32 の BLOB。再起動後もヒットする）。``path=None`` ならメモリのみ
+
+TTL は持たない（モデル名がキーに含まれるので、モデルを変えれば別エントリになる）。
+"""
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from api.response_cache import canonical_key
+
+logger = logging.getLogger("fixed_asset_api")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# SQLite の変数上限（999）未満で IN 句を分割する
+_SQL_CHUNK = 500
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_text(text: str) -> str:
+    """NFKC + collapsed whitespace (半角カナ・全角英数・余分な空白の揺れを吸収)."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Cache key for ``text`` (already normalized) embedded with ``model``."""
+    return canonical_key("embedding", model, text)
+
+
+class EmbeddingCache:
+    """Float32 vectors keyed by (model, normalized text).
+
+    I/O スレッドから並行に呼ばれても良いよう、LRU と SQLite 接続はロックで直列化する。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key    TEXT PRIMARY KEY,
+            model  TEXT NOT NULL,
+            dim    INTEGER NOT NULL,
+            vector BLOB NOT NULL
+        )
+    """
+
+    def __init__(self, path: Optional[Path] = None, mem_items: int = 4096) -> None:
+        self.path = Path(path) if path is not None else None
+        self.mem_items = max(0, mem_items)
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self._SCHEMA)
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the normalized ``texts`` that have one (missing ones are absent)."""
+        keys = {embedding_key(model, text): text for text in dict.fromkeys(texts)}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            pending = []
+            for key, text in keys.items():
+                vector = self._memory.get(key)
+                if vector is None:
+                    pending.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[text] = vector
+            for key, vector in self._read(pending).items():
+                found[keys[key]] = vector
+                self._remember(key, vector)
+            self._counters["hits"] += len(found)
+            self._counters["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, Any]) -> None:
+        """Store ``{normalized text: vector}`` for ``model``."""
+        rows = []
+        with self._lock:
+            for text, vector in vectors.items():
+                key = embedding_key(model, text)
+                array = np.array(vector, dtype=np.float32).ravel()
+                array.setflags(write=False)
+                self._remember(key, array)
+                rows.append((key, model, int(array.shape[0]), array.tobytes()))
+            self._counters["stores"] += len(rows)
+            if self._conn is None or not rows:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)", rows,
+                )
+            except sqlite3.Error as e:
+                logger.warning("Embedding cache write failed: %s", e)
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text]).get(text)
+
+    def put(self, model: str, text: str, vector: Any) -> None:
+        self.put_many(model, {text: vector})
+
+    def _read(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self._conn is None or not keys:
+            return {}
+        found = {}
+        try:
+            for start in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[start:start + _SQL_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, dim, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if vector.shape[0] == dim:
+                        found[key] = vector
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache read failed: %s", e)
+        return found
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.mem_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.mem_items:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            items = None
+            if self._conn is not None:
+                try:
+                    (items,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                except sqlite3.Error:
+                    pass
+            return {
+                "path": str(self.path) if self.path else None,
+                "items": items,
+                "memory_items": len(self._memory),
+                **self._counters,
+            }
+
+
+_UNSET: Any = object()
+_embedding_cache: Any = _UNSET
+_embedding_cache_lock = threading.Lock()
+
+
+def _default_embedding_cache() -> Optional[EmbeddingCache]:
+    if not _bool_env("EMBEDDING_CACHE_ENABLED", True):
+        return None
+    mem_items = _int_env("EMBEDDING_CACHE_MEM_ITEMS", 4096)
+    path = os.getenv("EMBEDDING_CACHE_PATH") or str(PROJECT_ROOT / "data" / "cache" / "embeddings.sqlite3")
+    try:
+        return EmbeddingCache(Path(path), mem_items=mem_items)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Embedding cache unavailable at %s, using memory: %s", path, e)
+        return EmbeddingCache(None, mem_items=mem_items)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache (created on first use; None when disabled)."""
+    global _embedding_cache
+    if _embedding_cache is _UNSET:
+        with _embedding_cache_lock:
+            if _embedding_cache is _UNSET:
+                _embedding_cache = _default_embedding_cache()
+    return _embedding_cache
+
+
+def set_embedding_cache(cache: Optional[EmbeddingCache]) -> None:
+    """Swap the process-wide cache (tests, or a shared path). None disables caching."""
+    global _embedding_cache
+    _embedding_cache = cache
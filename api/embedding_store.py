@@ -3,16 +3,67 @@
 Embedding Store for Fixed Asset Names.
 
 Uses Gemini text-embedding-004 API to generate embeddings for asset names.
-Supports batch processing with rate limiting and JSON persistence.
+Supports batch processing with rate limiting and binary persistence.
+
+検索用に正規化済み float32 行列（api.similarity_search.EmbeddingIndex）を保持し、
+items が変わったときだけ作り直す。
+
+保存形式（store_path が ``.json`` 以外のとき。既定）:
+- ``<base>.<version>.npy``: L2 正規化済み float32 行列（1行 = 1アイテム）。``np.load(mmap_mode="r")``
+  で読むため、複数の uvicorn ワーカーが同じページキャッシュを共有し、起動時に
+  JSON を解析するコストもかからない。保存のたびに新しいファイル名で書く
+- ``<base>.meta.json``: 名前・メタデータ・次元数と、対応する行列のファイル名を持つサイドカー。
+  行列を書いた後に最後に置き換えるので、他のワーカーが保存の途中で読んでも
+  meta と行列の組み合わせは常に一致する（format_version 1 の ``<base>.npy`` も読める）
+- 旧形式の ``<base>.json`` しか無い場合は初回 :meth:`EmbeddingStore.load` で
+  一度だけ変換する（:func:`migrate_json_store`）
+
+store_path に ``.json`` を指定した場合は従来どおりの JSON（互換用）。
+
+Embedding は api.embedding_cache に（正規化テキスト, EMBEDDING_MODEL）で保存し、
+add_items は重複名を1回だけ API に送って結果を各行に配り戻す。検索語も同じキャッシュを引く。
+
+大きな台帳は :meth:`EmbeddingStore.aadd_items`（または :func:`ingest_ledger`）で取り込む。
+複数バッチを並行に送り、共有トークンバケット（EMBEDDING_RPM）で送信ペースを揃え、
+429 の Retry-After に従って全体で待つ。取得済みのベクトルはバッチごとにキャッシュ /
+チェックポイントへ書くので、中断しても同じ取り込みを再実行すれば続きから再開できる。
 """
+import asyncio
 import json
 import logging
 import os
+import random
+import re
+import tempfile
 import time
-from typing import Any, Dict, List, Optional
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.embedding_cache import EmbeddingCache, get_embedding_cache, normalize_text
+from api.rate_limit import AsyncTokenBucket, is_retryable, retry_after_seconds
+from api.similarity_search import EmbeddingIndex
 
 logger = logging.getLogger("fixed_asset_api")
 
+_UNSET: Any = object()
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
 
 class EmbeddingStore:
     """
@@ -21,30 +72,105 @@ class EmbeddingStore:
     Features:
     - Batch processing (100 items per batch) for rate limit compliance
     - Automatic retry with exponential backoff
-    - JSON persistence
+    - Binary (memory-mapped) persistence
+    - Vectorized top-k search over a cached float32 matrix (see :attr:`index`)
+    - Optional IVF approximate index for very large ledgers (EMBEDDING_ANN=1)
+    - Deduplicated, cached embedding calls (see api.embedding_cache)
     """
 
-    # Gemini embedding model
+    # Default Gemini embedding model (EMBEDDING_MODEL で上書き)
     EMBEDDING_MODEL = "text-embedding-004"
     # Batch size for API calls (Gemini limit)
     BATCH_SIZE = 100
     # Maximum retry attempts
     MAX_RETRIES = 3
+    # Maximum retry attempts per batch in the concurrent ingestion path
+    INGEST_MAX_RETRIES = 8
     # Base wait time for retry (seconds)
     BASE_RETRY_WAIT = 1.0
 
-    def __init__(self, store_path: str = "data/embeddings.json"):
+    # Binary store format version (meta sidecar の format_version)
+    FORMAT_VERSION = 2
+    # 行列ファイル名を meta に持たない旧形式（行列は <base>.npy）
+    _UNVERSIONED_FORMAT = 1
+
+    def __init__(self, store_path: str = "data/embeddings", cache: Any = _UNSET):
         """
         Initialize the embedding store.
 
         Args:
-            store_path: Path to JSON file for persistence
+            store_path: Base path of the binary store (``<base>.<version>.npy`` +
+                ``<base>.meta.json``), or a ``.json`` file for the legacy format
+            cache: Embedding cache (default: the process-wide one; None disables caching)
         """
         self.store_path = store_path
-        self.items: List[Dict[str, Any]] = []
+        self.model = os.getenv("EMBEDDING_MODEL") or self.EMBEDDING_MODEL
+        self._cache = cache
+        self._items: List[Dict[str, Any]] = []
+        self._index: Optional[EmbeddingIndex] = None
+        self._index_key: Optional[Tuple[int, int]] = None
+        self._matrix_file: Optional[str] = None  # 最後に保存・読み込みした行列ファイル
         self._client = None
         self._configured = False
 
+    @property
+    def items(self) -> List[Dict[str, Any]]:
+        return self._items
+
+    @items.setter
+    def items(self, items: List[Dict[str, Any]]) -> None:
+        self._items = items
+        self.invalidate_index()
+
+    @property
+    def index(self) -> EmbeddingIndex:
+        """Search matrix for the current items.
+
+        items を差し替えたら作り直し、末尾に追加された分（add_items）は
+        :meth:`EmbeddingIndex.extend` で近似索引ごと追記する。
+        要素の embedding をその場で書き換えた場合は :meth:`invalidate_index` を呼ぶこと。
+        """
+        key = (id(self._items), len(self._items))
+        if self._index is not None and self._index_key == key:
+            return self._index
+        if self._index is not None and self._index_key[0] == key[0] and self._index_key[1] < key[1]:
+            self._index.extend(self._index_key[1])
+            ann = self._index.ann
+            if ann is not None and ann.needs_retrain():
+                logger.info("Embedding ANN index grew to %d vectors; retraining", ann.ntotal)
+                self._build_ann(self._index)
+        else:
+            self._index = EmbeddingIndex(self._items)
+            self._maybe_build_ann(self._index)
+        self._index_key = key
+        return self._index
+
+    def _maybe_build_ann(self, index: EmbeddingIndex) -> None:
+        """Attach an IVF index when EMBEDDING_ANN=1 and the store is large enough."""
+        if _bool_env("EMBEDDING_ANN", False) and len(index) >= _int_env("EMBEDDING_ANN_MIN_ITEMS", 50_000):
+            self._build_ann(index)
+
+    def _build_ann(self, index: EmbeddingIndex) -> None:
+        started = time.monotonic()
+        ann = index.build_ann(
+            n_lists=_int_env("EMBEDDING_IVF_LISTS", 0) or None,
+            n_probe=_int_env("EMBEDDING_IVF_PROBE", 8),
+        )
+        logger.info(
+            "Built embedding IVF index: %d vectors, %d lists, n_probe=%d (%.1fs)",
+            ann.ntotal, ann.n_lists, ann.n_probe, time.monotonic() - started,
+        )
+
+    def invalidate_index(self) -> None:
+        self._index = None
+        self._index_key = None
+
+    @property
+    def cache(self) -> Optional[Any]:
+        if self._cache is _UNSET:
+            return get_embedding_cache()
+        return self._cache
+
     def _ensure_configured(self) -> bool:
         """
         Ensure Gemini API is configured.
@@ -56,13 +182,10 @@ class EmbeddingStore:
             return True
 
         try:
-            from google import genai
-            api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-            if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-                self._client = genai.Client()
-            elif api_key:
-                self._client = genai.Client(api_key=api_key)
-            else:
+            from core.genai_client import get_client
+
+            self._client = get_client()
+            if self._client is None:
                 raise ValueError(
                     "認証情報が未設定（GOOGLE_GENAI_USE_VERTEXAI=True またはAPIキー）"
                 )
@@ -89,18 +212,19 @@ class EmbeddingStore:
         for attempt in range(self.MAX_RETRIES):
             try:
                 result = self._client.models.embed_content(
-                    model=self.EMBEDDING_MODEL,
+                    model=self.model,
                     contents=text,
                 )
                 return result.embeddings[0].values
 
             except (ConnectionError, TimeoutError, OSError, RuntimeError, ValueError) as e:
                 logger.warning("Embedding API error (attempt %d): %s", attempt + 1, e)
-                error_str = str(e).lower()
-                # Check for rate limit error
-                if "rate" in error_str or "quota" in error_str or "429" in error_str:
+                # Check for rate limit error (サーバーの Retry-After があればそれに従う)
+                if is_retryable(e):
                     if attempt < self.MAX_RETRIES - 1:
-                        wait_time = self.BASE_RETRY_WAIT * (2 ** attempt)
+                        wait_time = retry_after_seconds(e)
+                        if wait_time is None:
+                            wait_time = self.BASE_RETRY_WAIT * (2 ** attempt)
                         time.sleep(wait_time)
                         continue
                 raise
@@ -126,29 +250,86 @@ class EmbeddingStore:
         for attempt in range(self.MAX_RETRIES):
             try:
                 result = self._client.models.embed_content(
-                    model=self.EMBEDDING_MODEL,
+                    model=self.model,
                     contents=texts,
                 )
                 return [e.values for e in result.embeddings]
 
             except (ConnectionError, TimeoutError, OSError, RuntimeError, ValueError) as e:
                 logger.warning("Batch embedding API error (attempt %d): %s", attempt + 1, e)
-                error_str = str(e).lower()
-                # Check for rate limit error
-                if "rate" in error_str or "quota" in error_str or "429" in error_str:
+                # Check for rate limit error (サーバーの Retry-After があればそれに従う)
+                if is_retryable(e):
                     if attempt < self.MAX_RETRIES - 1:
-                        wait_time = self.BASE_RETRY_WAIT * (2 ** attempt)
+                        wait_time = retry_after_seconds(e)
+                        if wait_time is None:
+                            wait_time = self.BASE_RETRY_WAIT * (2 ** attempt)
                         time.sleep(wait_time)
                         continue
                 raise
 
         raise RuntimeError(f"Failed to get batch embeddings after {self.MAX_RETRIES} retries")
 
+    def embed_texts(self, texts: List[str]) -> List[Optional[Any]]:
+        """
+        Embeddings for ``texts``, calling the API once per distinct uncached text.
+
+        テキストは正規化（NFKC・空白の畳み込み）してから重複を除き、キャッシュに無いものだけを
+        BATCH_SIZE 件ずつ API に送る。結果は入力の各位置に配り戻す。
+
+        Args:
+            texts: Texts to embed (duplicates allowed)
+
+        Returns:
+            One vector per input text; None for empty texts or failed batches
+        """
+        normalized = [normalize_text(text) for text in texts]
+        unique = [text for text in dict.fromkeys(normalized) if text]
+        cache = self.cache
+        vectors: Dict[str, Any] = cache.get_many(self.model, unique) if cache is not None else {}
+        missing = [text for text in unique if text not in vectors]
+        if unique:
+            logger.debug(
+                "Embedding %d texts: %d distinct, %d cached, %d to fetch",
+                len(texts), len(unique), len(unique) - len(missing), len(missing),
+            )
+
+        # Process in batches
+        for batch_start in range(0, len(missing), self.BATCH_SIZE):
+            batch_end = min(batch_start + self.BATCH_SIZE, len(missing))
+            batch = missing[batch_start:batch_end]
+            try:
+                fetched = dict(zip(batch, self._get_batch_embeddings(batch)))
+            except (ConnectionError, TimeoutError, OSError, RuntimeError, ValueError) as e:
+                logger.exception("Error processing embedding batch %d-%d: %s", batch_start, batch_end, e)
+                continue
+            vectors.update(fetched)
+            if cache is not None:
+                cache.put_many(self.model, fetched)
+
+            # Small delay between batches to avoid rate limits
+            if batch_end < len(missing):
+                time.sleep(0.1)
+
+        return [vectors.get(text) for text in normalized]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding of a search query (cached, so repeated queries stay local)."""
+        normalized = normalize_text(text)
+        cache = self.cache
+        if cache is not None:
+            cached = cache.get(self.model, normalized)
+            if cached is not None:
+                return cached
+        embedding = self.get_embedding(normalized)
+        if cache is not None:
+            cache.put(self.model, normalized, embedding)
+        return embedding
+
     def add_items(self, items: List[Dict[str, Any]]) -> int:
         """
         Add items to the store with embeddings.
 
-        台帳データをEmbedding化して保存
+        台帳データをEmbedding化して保存（同じ名称は1回だけ Embedding 化する）
 
         Args:
             items: List of dicts with at least "name" field
@@ -160,74 +341,312 @@ class EmbeddingStore:
         if not items:
             return 0
 
-        added_count = 0
-
-        # Process in batches
-        for batch_start in range(0, len(items), self.BATCH_SIZE):
-            batch_end = min(batch_start + self.BATCH_SIZE, len(items))
-            batch_items = items[batch_start:batch_end]
-
-            # Extract names for embedding
-            names = [item.get("name", "") for item in batch_items]
+        # Skip empty names
+        valid_items = [item for item in items if item.get("name", "").strip()]
+        return self._append_embedded(valid_items, self.embed_texts([item["name"] for item in valid_items]))
 
-            # Skip empty names
-            valid_indices = [i for i, name in enumerate(names) if name.strip()]
-            if not valid_indices:
+    def _append_embedded(self, items: List[Dict[str, Any]], embeddings: List[Optional[Any]]) -> int:
+        added_count = 0
+        for item, embedding in zip(items, embeddings):
+            if embedding is None:
                 continue
+            # Extract metadata (everything except name)
+            metadata = {k: v for k, v in item.items() if k != "name"}
 
-            valid_names = [names[i] for i in valid_indices]
-            valid_items = [batch_items[i] for i in valid_indices]
-
-            # Get embeddings for batch
-            try:
-                embeddings = self._get_batch_embeddings(valid_names)
+            self.items.append({
+                "name": item["name"],
+                "embedding": embedding,
+                "metadata": metadata
+            })
+            added_count += 1
 
-                # Store items with embeddings
-                for item, name, embedding in zip(valid_items, valid_names, embeddings):
-                    # Extract metadata (everything except name)
-                    metadata = {k: v for k, v in item.items() if k != "name"}
+        return added_count
 
-                    self.items.append({
-                        "name": name,
-                        "embedding": embedding,
-                        "metadata": metadata
-                    })
-                    added_count += 1
+    # ------------------------------------------------------------------
+    # 並行取り込み（asyncio）
+    # ------------------------------------------------------------------
+
+    async def aadd_items(
+        self,
+        items: List[Dict[str, Any]],
+        checkpoint_path: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        limiter: Optional[AsyncTokenBucket] = None,
+    ) -> int:
+        """
+        Concurrent version of :meth:`add_items` for large ledgers.
 
-                # Small delay between batches to avoid rate limits
-                if batch_end < len(items):
-                    time.sleep(0.1)
+        Args:
+            items: Ledger rows with at least "name"
+            checkpoint_path: SQLite file that records every finished batch. 中断後に
+                同じ引数で再実行すると、記録済みの名称は API に送らない
+            concurrency: Batches in flight (default EMBEDDING_CONCURRENCY, 8)
+            limiter: Shared token bucket (default EMBEDDING_RPM requests/minute)
 
-            except (ConnectionError, TimeoutError, OSError, RuntimeError, ValueError) as e:
-                logger.exception("Error processing embedding batch %d-%d: %s", batch_start, batch_end, e)
+        Returns:
+            Number of items added
+        """
+        if not items:
+            return 0
+        valid_items = [item for item in items if item.get("name", "").strip()]
+        checkpoint = EmbeddingCache(Path(checkpoint_path), mem_items=0) if checkpoint_path else None
+        try:
+            embeddings = await self.aembed_texts(
+                [item["name"] for item in valid_items],
+                checkpoint=checkpoint, concurrency=concurrency, limiter=limiter,
+            )
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        return self._append_embedded(valid_items, embeddings)
+
+    async def aembed_texts(
+        self,
+        texts: List[str],
+        checkpoint: Optional[EmbeddingCache] = None,
+        concurrency: Optional[int] = None,
+        limiter: Optional[AsyncTokenBucket] = None,
+    ) -> List[Optional[Any]]:
+        """Concurrent version of :meth:`embed_texts` (same dedupe / cache / fan-out)."""
+        normalized = [normalize_text(text) for text in texts]
+        unique = [text for text in dict.fromkeys(normalized) if text]
+        stores = [c for c in (checkpoint, self.cache) if c is not None]
+        vectors: Dict[str, Any] = {}
+        for store in stores:
+            vectors.update(store.get_many(self.model, [t for t in unique if t not in vectors]))
+        missing = [text for text in unique if text not in vectors]
+        batches = [missing[i:i + self.BATCH_SIZE] for i in range(0, len(missing), self.BATCH_SIZE)]
+        logger.info(
+            "Embedding ingestion: %d texts, %d distinct, %d already embedded, %d batches to fetch",
+            len(texts), len(unique), len(unique) - len(missing), len(batches),
+        )
+        if not batches:
+            return [vectors.get(text) for text in normalized]
+
+        if limiter is None:
+            limiter = AsyncTokenBucket.per_minute(_int_env("EMBEDDING_RPM", 1500))
+        workers = max(1, min(concurrency or _int_env("EMBEDDING_CONCURRENCY", 8), len(batches)))
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for batch_no in range(len(batches)):
+            queue.put_nowait(batch_no)
+        started = time.monotonic()
+        progress = {"done": 0, "failed": 0}
+
+        async def worker() -> None:
+            while True:
+                try:
+                    batch_no = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                batch = batches[batch_no]
+                try:
+                    fetched = dict(zip(batch, await self._afetch_batch(batch, limiter)))
+                except Exception as e:  # 1バッチの失敗で取り込み全体を止めない
+                    progress["failed"] += 1
+                    logger.error("Embedding batch %d failed after retries: %s", batch_no, e)
+                    continue
+                vectors.update(fetched)
+                for store in stores:
+                    store.put_many(self.model, fetched)
+                progress["done"] += 1
+                if progress["done"] % 50 == 0:
+                    elapsed = time.monotonic() - started
+                    logger.info(
+                        "Embedding ingestion: %d/%d batches (%.1f batches/s)",
+                        progress["done"], len(batches), progress["done"] / max(elapsed, 1e-9),
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        logger.info(
+            "Embedding ingestion finished: %d batches fetched, %d failed in %.1fs",
+            progress["done"], progress["failed"], time.monotonic() - started,
+        )
+        return [vectors.get(text) for text in normalized]
+
+    async def _afetch_batch(self, texts: List[str], limiter: AsyncTokenBucket) -> List[Any]:
+        """One batch with retries; server back-off (Retry-After) pauses every worker."""
+        for attempt in range(self.INGEST_MAX_RETRIES):
+            await limiter.acquire()
+            try:
+                return await self._aget_batch_embeddings(texts)
+            except Exception as e:  # 再試行可否は is_retryable で判定
+                if not is_retryable(e) or attempt == self.INGEST_MAX_RETRIES - 1:
+                    raise
+                wait = retry_after_seconds(e)
+                if wait is None:
+                    wait = self.BASE_RETRY_WAIT * (2 ** attempt) * (0.5 + random.random())
+                logger.warning("Embedding batch retry in %.1fs (attempt %d): %s", wait, attempt + 1, e)
+                limiter.defer(wait)
+        raise RuntimeError(f"Failed to get batch embeddings after {self.INGEST_MAX_RETRIES} retries")
+
+    async def _aget_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Single ``embed_content`` call on the async client (retries are the caller's job)."""
+        from core.genai_client import get_async_client
+
+        client = get_async_client()
+        if client is None:
+            raise ValueError("認証情報が未設定（GOOGLE_GENAI_USE_VERTEXAI=True またはAPIキー）")
+        result = await client.models.embed_content(model=self.model, contents=texts)
+        return [e.values for e in result.embeddings]
+
+    @property
+    def is_json(self) -> bool:
+        """True when this store uses the legacy pretty-printed JSON file."""
+        return self.store_path.endswith(".json")
+
+    @property
+    def _base_path(self) -> str:
+        base = self.store_path
+        return base[:-4] if base.endswith(".npy") else base
+
+    @property
+    def matrix_path(self) -> str:
+        """Matrix file of the last save/load (before that, the unversioned ``<base>.npy``)."""
+        return self._matrix_file or self._base_path + ".npy"
+
+    def _matrix_path_for(self, meta: Dict[str, Any]) -> str:
+        name = meta.get("matrix")
+        if meta.get("format_version") == self._UNVERSIONED_FORMAT or not name:
+            return self._base_path + ".npy"
+        return os.path.join(os.path.dirname(self._base_path), os.path.basename(name))
+
+    def _remove_stale_matrices(self, keep: List[str]) -> None:
+        """Delete matrix files of older saves (直前の版は読み込み途中のワーカー用に残す)."""
+        directory = os.path.dirname(self._base_path) or "."
+        pattern = re.compile(re.escape(os.path.basename(self._base_path)) + r"(\.[0-9a-f]{16})?\.npy")
+        keep_names = {os.path.basename(path) for path in keep}
+        for name in os.listdir(directory):
+            if name in keep_names or not pattern.fullmatch(name):
                 continue
+            try:
+                # memmap 中のワーカーがいても POSIX では既存のマッピングは有効なまま
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
 
-        return added_count
+    @property
+    def meta_path(self) -> str:
+        return self._base_path + ".meta.json"
 
     def save(self) -> None:
         """
-        Save the store to JSON file.
+        Save the store (binary matrix + metadata sidecar, or JSON for ``.json`` paths).
+
+        行列は新しいファイル名（``<base>.<version>.npy``）に書き、それを指す meta を最後に
+        置き換える。他のワーカーが memmap している古いファイルは上書きしない（SIGBUS を避ける）。
+        直前の版の行列は、古い meta を読んだ直後のワーカーのために1世代だけ残す。
         """
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
 
-        data = {"items": self.items}
+        if self.is_json:
+            data = {"items": [_jsonable_item(item) for item in self.items]}
+            with open(self.store_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            return
 
-        with open(self.store_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        index = self.index
+        skipped = len(self.items) - len(index)
+        if skipped:
+            logger.warning("Embedding store: %d items without a usable embedding were not saved", skipped)
+        matrix_path = f"{self._base_path}.{uuid.uuid4().hex[:16]}.npy"
+        previous = self._current_matrix_path()
+        meta = {
+            "format_version": self.FORMAT_VERSION,
+            "model": self.model,
+            "matrix": os.path.basename(matrix_path),
+            "count": len(index),
+            "dim": index.dim,
+            "items": [
+                {"name": self.items[i].get("name", ""), "metadata": self.items[i].get("metadata", {})}
+                for i in index.rows.tolist()
+            ],
+        }
+        matrix = index.matrix if len(index) else np.zeros((0, 0), dtype=np.float32)
+        _atomic_write(matrix_path, lambda f: np.save(f, matrix, allow_pickle=False))
+        _atomic_write(
+            self.meta_path,
+            lambda f: f.write(json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+        )
+        self._matrix_file = matrix_path
+        self._remove_stale_matrices(keep=[matrix_path] + ([previous] if previous else []))
+
+    def _current_matrix_path(self) -> Optional[str]:
+        """Matrix file the meta on disk currently points to (None when there is none)."""
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return self._matrix_path_for(json.load(f))
+        except (OSError, ValueError):
+            return None
 
     def load(self) -> None:
         """
-        Load the store from JSON file.
+        Load the store (memory-mapped for the binary format).
+
+        バイナリが無く旧形式の ``<base>.json`` がある場合は、その場で変換して保存する。
         """
-        if not os.path.exists(self.store_path):
-            self.items = []
+        if self.is_json:
+            if not os.path.exists(self.store_path):
+                self.items = []
+                return
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.items = data.get("items", [])
             return
 
-        with open(self.store_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        self.items = data.get("items", [])
+        if not os.path.exists(self.meta_path):
+            legacy_path = self._base_path + ".json"
+            if os.path.exists(legacy_path):
+                migrate_json_store(legacy_path, self.store_path)
+            else:
+                self.items = []
+                return
+
+        # 別のワーカーの保存と重なった場合（古い meta が指す行列が消えた、旧形式で
+        # 行列と meta の置き換えの間に読んだ）は、meta から1回だけ読み直す
+        for attempt in range(2):
+            meta, matrix_path, matrix = self._read_binary()
+            entries = meta.get("items", [])
+            consistent = matrix is not None and matrix.shape[0] == len(entries) and (
+                not entries or matrix.shape[1] == meta.get("dim")
+            )
+            if consistent or attempt:
+                break
+        if matrix is None:
+            raise FileNotFoundError(f"Embedding store matrix not found: {matrix_path}")
+        if not consistent:
+            raise ValueError(
+                f"Embedding store files are inconsistent: {matrix_path} {matrix.shape}, "
+                f"{self.meta_path} count={len(entries)} dim={meta.get('dim')}"
+            )
+        if meta.get("model") and meta["model"] != self.model:
+            logger.warning(
+                "Embedding store %s was built with %s but EMBEDDING_MODEL is %s; "
+                "similarity scores across models are not comparable",
+                matrix_path, meta["model"], self.model,
+            )
+        self._matrix_file = matrix_path
+
+        # embedding は memmap 行のビュー（コピーしない）
+        self.items = [
+            {"name": entry.get("name", ""), "embedding": matrix[i], "metadata": entry.get("metadata", {})}
+            for i, entry in enumerate(entries)
+        ]
+        self._index = EmbeddingIndex.from_matrix(self._items, matrix)
+        self._index_key = (id(self._items), len(self._items))
+        self._maybe_build_ann(self._index)
+
+    def _read_binary(self) -> Tuple[Dict[str, Any], str, Optional[np.ndarray]]:
+        """Read the meta sidecar, then memory-map the matrix it points to (None if missing)."""
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") not in (self._UNVERSIONED_FORMAT, self.FORMAT_VERSION):
+            raise ValueError(f"Unsupported embedding store format: {meta.get('format_version')}")
+        matrix_path = self._matrix_path_for(meta)
+        try:
+            return meta, matrix_path, np.load(matrix_path, mmap_mode="r", allow_pickle=False)
+        except FileNotFoundError:
+            return meta, matrix_path, None
 
     def clear(self) -> None:
         """
@@ -239,13 +658,14 @@ class EmbeddingStore:
         """Return number of items in store."""
         return len(self.items)
 
-    def search_by_name(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def search_by_name(self, query: str, top_k: int = 5, exact: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar items by name.
 
         Args:
             query: Query text
             top_k: Number of results to return
+            exact: Scan every vector even when an ANN index is attached
 
         Returns:
             List of items with similarity scores
@@ -253,26 +673,19 @@ class EmbeddingStore:
         if not self.items:
             return []
 
-        # Get query embedding
-        query_embedding = self.get_embedding(query)
-
-        # Calculate cosine similarity
-        results = []
-        for item in self.items:
-            item_embedding = item.get("embedding", [])
-            if not item_embedding:
-                continue
-
-            similarity = self._cosine_similarity(query_embedding, item_embedding)
-            results.append({
-                "name": item["name"],
-                "metadata": item.get("metadata", {}),
-                "similarity": similarity
-            })
+        # Get query embedding (キャッシュ済みならAPIを呼ばない)
+        query_embedding = self.embed_query(query)
 
-        # Sort by similarity (descending) and return top_k
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:top_k]
+        # 正規化済み行列との積1回（近似索引があれば候補リストのみ）で上位top_k件を取り出す
+        index = self.index
+        return [
+            {
+                "name": self._items[i]["name"],
+                "metadata": self._items[i].get("metadata", {}),
+                "similarity": similarity,
+            }
+            for i, similarity in index.search(query_embedding, top_k, exact=exact)
+        ]
 
     @staticmethod
     def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -299,17 +712,63 @@ class EmbeddingStore:
         return dot_product / (magnitude1 * magnitude2)
 
 
+def _jsonable_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    embedding = item.get("embedding")
+    if isinstance(embedding, np.ndarray):
+        item = {**item, "embedding": embedding.tolist()}
+    return item
+
+
+def _atomic_write(path: str, write: Any) -> None:
+    """Write via a temp file in the same directory, then ``os.replace``."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def migrate_json_store(json_path: str, store_path: Optional[str] = None) -> int:
+    """
+    Convert a legacy JSON embedding store to the binary format (one-shot).
+
+    Args:
+        json_path: Existing ``{"items": [...]}`` JSON file
+        store_path: Binary store base path (default: json_path without ``.json``)
+
+    Returns:
+        Number of items written
+    """
+    if store_path is None:
+        store_path = json_path[:-5] if json_path.endswith(".json") else json_path
+    if store_path.endswith(".json"):
+        raise ValueError(f"store_path must not be a .json file: {store_path}")
+
+    legacy = EmbeddingStore(store_path=json_path)
+    legacy.load()
+    store = EmbeddingStore(store_path=store_path)
+    store.items = legacy.items
+    store.save()
+    logger.info("Migrated %d embeddings from %s to %s", len(store.index), json_path, store.matrix_path)
+    return len(store.index)
+
+
 # Convenience function for one-off embedding generation
 def generate_embeddings_for_ledger(
     ledger_items: List[Dict[str, Any]],
-    output_path: str = "data/embeddings.json"
+    output_path: str = "data/embeddings"
 ) -> int:
     """
     Generate embeddings for ledger items and save to file.
 
     Args:
         ledger_items: List of ledger entries with "name" field
-        output_path: Path to save embeddings JSON
+        output_path: Store base path (binary) or ``.json`` file (legacy format)
 
     Returns:
         Number of items processed
@@ -318,3 +777,38 @@ def generate_embeddings_for_ledger(
     count = store.add_items(ledger_items)
     store.save()
     return count
+
+
+def ingest_ledger(
+    ledger_items: List[Dict[str, Any]],
+    output_path: str = "data/embeddings",
+    checkpoint_path: Optional[str] = None,
+    concurrency: Optional[int] = None,
+) -> int:
+    """
+    Embed a (large) ledger concurrently and save it, resuming an interrupted run.
+
+    チェックポイント（既定: ``<output_path>.checkpoint.sqlite3``）は保存が成功したら削除する。
+    中断した場合は同じ引数で再実行すると、取得済みの名称を飛ばして続きから処理する。
+
+    Args:
+        ledger_items: List of ledger entries with "name" field
+        output_path: Store base path (binary) or ``.json`` file (legacy format)
+        checkpoint_path: Progress file for resuming
+        concurrency: Batches in flight (default EMBEDDING_CONCURRENCY)
+
+    Returns:
+        Number of items processed
+    """
+    if checkpoint_path is None:
+        base = output_path[:-5] if output_path.endswith(".json") else output_path
+        checkpoint_path = base + ".checkpoint.sqlite3"
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    store = EmbeddingStore(store_path=output_path)
+    count = asyncio.run(store.aadd_items(ledger_items, checkpoint_path=checkpoint_path, concurrency=concurrency))
+    store.save()
+    if count == sum(1 for item in ledger_items if item.get("name", "").strip()):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(checkpoint_path + suffix):
+                os.remove(checkpoint_path + suffix)
+    return count
@@ -0,0 +1,183 @@
+"""Bounded executors for blocking pipeline stages.
+
+FastAPI の async エンドポイント内で同期処理（PyMuPDF / pdfplumber / tesseract による
+PDF抽出、Gemini・Vertex AI Search の HTTP 呼び出し）を直接実行すると、
+その間ワーカーのイベントループ全体が止まり /health や小さな /classify も待たされる。
+
+- CPU 負荷の高い PDF 抽出 → プロセスプール（EXTRACT_WORKERS、既定 min(4, CPU数)）
+- ブロッキング I/O（Gemini / Vertex / 耐用年数推定）→ スレッドプール（IO_WORKERS、既定 16）
+
+EXTRACT_WORKERS=0 のときは抽出もスレッドプールで実行する（fork/spawn できない環境向け）。
+各プールの実行中・待機中の件数と待ち時間は :func:`executor_stats` で /health に公開する。
+スレッドプールには呼び出し元の contextvars（リクエストの期限など）をそのまま渡す。
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("fixed_asset_api")
+
+_DEFAULT_IO_WORKERS = 16
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[float, Any]:
+    """Run *fn* in the worker and report when it actually started.
+
+    time.time() を使うのはプロセスをまたいで比較するため（monotonic はプロセス依存）。
+    """
+    started = time.time()
+    return started, fn(*args, **kwargs)
+
+
+class _StagePool:
+    """One lazily-created executor plus queue/wait-time counters."""
+
+    def __init__(self, name: str, workers: int, use_processes: bool) -> None:
+        self.name = name
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    # spawn: uvicorn はマルチスレッドのため fork だとロック状態ごと複製される
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix=f"fa-{self.name}",
+                    )
+            return self._executor
+
+    def _reset_broken(self, executor: Executor) -> None:
+        """Drop a process pool whose worker died so the next call gets a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _on_done(self, submitted: float, future: "Future[Tuple[float, Any]]") -> None:
+        """Account for a finished task (runs when the worker is actually free again)."""
+        ok = not future.cancelled() and future.exception() is None
+        with self._lock:
+            self._in_flight -= 1
+            if ok:
+                started, _ = future.result()
+                wait = max(0.0, started - submitted)
+                self._completed += 1
+                self._wait_total += wait
+                self._wait_last = wait
+                self._wait_max = max(self._wait_max, wait)
+            else:
+                self._failed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        executor = self._get_executor()
+        call = functools.partial(_timed_call, fn, args, kwargs)
+        if not self.use_processes:
+            # asyncio.to_thread と同様にコンテキストを引き継ぐ（core.deadline 等）
+            call = functools.partial(contextvars.copy_context().run, call)
+        submitted = time.time()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            try:
+                future = executor.submit(call)
+            except BaseException:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._failed += 1
+                raise
+            # 件数はワーカー側の Future の完了で減らす。呼び出し側が asyncio.wait_for で
+            # 先に諦めても、実行中のタスクは終わるまでワーカーを占有しているため。
+            future.add_done_callback(functools.partial(self._on_done, submitted))
+            _, result = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            logger.error("%s pool broken (worker died); recreating on next call", self.name)
+            self._reset_broken(executor)
+            raise
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+            return {
+                "kind": "process" if self.use_processes else "thread",
+                "workers": self.workers,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "wait_ms_last": round(self._wait_last * 1000, 1),
+                "wait_ms_avg": round(self._wait_total / self._completed * 1000, 1) if self._completed else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 1),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _build_pools() -> Tuple[_StagePool, _StagePool]:
+    default_extract = min(4, os.cpu_count() or 1)
+    extract_workers = _int_env("EXTRACT_WORKERS", default_extract)
+    io_workers = _int_env("IO_WORKERS", _DEFAULT_IO_WORKERS)
+    if extract_workers > 0:
+        extract = _StagePool("extract", extract_workers, use_processes=True)
+    else:
+        extract = _StagePool("extract", default_extract, use_processes=False)
+    io = _StagePool("io", io_workers, use_processes=False)
+    return extract, io
+
+
+_EXTRACT_POOL, _IO_POOL = _build_pools()
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a CPU-bound, picklable callable (e.g. ``extract_pdf``) in the process pool."""
+    return await _EXTRACT_POOL.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking I/O callable (Gemini / Vertex / file work) in the thread pool."""
+    return await _IO_POOL.run(fn, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Any]:
+    """Queue depth / wait-time snapshot for /health."""
+    return {"extract": _EXTRACT_POOL.stats(), "io": _IO_POOL.stats()}
+
+
+def shutdown_executors() -> None:
+    """Shut down both pools (FastAPI shutdown hook)."""
+    _EXTRACT_POOL.shutdown()
+    _IO_POOL.shutdown()
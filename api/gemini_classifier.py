@@ -7,14 +7,25 @@ This module implements the Stop-first principle:
 - When confident: return CAPITAL_LIKE or EXPENSE_LIKE
 - When uncertain: return GUIDANCE (never guess)
 """
+import contextvars
+import hashlib
 import json
 import logging
 import os
 import re
+import sqlite3
+import threading
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
+from api.response_cache import MemoryResponseCache, SQLiteResponseCache, canonical_key
+from core.deadline import current_deadline, min_remote_seconds
+from core.genai_client import get_client, http_options
+
 logger = logging.getLogger("fixed_asset_api")
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
 
 def _bool_env(name: str, default: bool = False) -> bool:
     """Check environment variable for boolean flag."""
@@ -24,6 +35,13 @@ def _bool_env(name: str, default: bool = False) -> bool:
     return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 def _get_model_name() -> str:
     """Get model name from env or use default (flash for speed)."""
     return os.getenv("GEMINI_MODEL", "gemini-3-pro-preview")
@@ -248,12 +266,30 @@ def classify_with_gemini(
         }
 
     If feature is disabled or API fails, returns GUIDANCE (safe fallback).
+
+    明細が1回のプロンプトに収まらない場合（GEMINI_CHUNK_ITEMS 件 / _MAX_PROMPT_CHARS
+    文字を超える場合）は書類情報付きのチャンクに分割して並列に判定し、
+    line_item_analysis を明細順に、合計額を合算してまとめる。
     """
-    # Default safe response (Stop-first: when in doubt, stop)
-    default_response: Dict[str, Any] = {
+    # Feature flag check
+    if not _bool_env("GEMINI_ENABLED", False):
+        return _fallback_response(["Gemini機能が無効（GEMINI_ENABLED=1で有効化）"], ["gemini_disabled"])
+
+    # Normalize input: legacy str → list conversion
+    normalized_items = _normalize_line_items(line_items)
+
+    chunks = _chunk_line_items(normalized_items, context, document_info)
+    if len(chunks) > 1:
+        return _classify_chunked(chunks, len(normalized_items), context, document_info)
+    return _classify_single(normalized_items, context, document_info)
+
+
+def _fallback_response(reasons: List[str], flags: List[str]) -> Dict[str, Any]:
+    """Default safe response (Stop-first: when in doubt, stop)."""
+    return {
         "decision": "GUIDANCE",
         "confidence": 0.0,
-        "reasons": ["Gemini API未使用（フォールバック）"],
+        "reasons": reasons,
         "reasoning": "",
         "line_item_analysis": [],
         "acquisition_cost_total": 0,
@@ -267,40 +303,45 @@ def classify_with_gemini(
         "similar_case": None,
         "evidence": [],
         "useful_life": None,
-        "flags": ["gemini_fallback"],
+        "flags": flags,
     }
 
-    # Feature flag check
-    if not _bool_env("GEMINI_ENABLED", False):
-        default_response["reasons"] = ["Gemini機能が無効（GEMINI_ENABLED=1で有効化）"]
-        default_response["flags"] = ["gemini_disabled"]
-        return default_response
 
+def _classify_single(
+    normalized_items: List[Dict[str, Any]],
+    context: str = "",
+    document_info: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """One Gemini call for items that fit in a single prompt."""
     try:
-        # Import only when feature is enabled
-        from google import genai
-        from google.genai import types
-
-        # Initialize client (RISK-003: timeout 30s)
-        _http_opts = types.HttpOptions(timeout=_GEMINI_TIMEOUT_MS)
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-            client = genai.Client(http_options=_http_opts)
-        elif api_key:
-            client = genai.Client(api_key=api_key, http_options=_http_opts)
-        else:
-            default_response["reasons"] = ["認証情報が未設定（Vertex AI環境変数またはAPIキー）"]
-            default_response["flags"] = ["missing_credentials"]
-            return default_response
-
         model_name = _get_model_name()
 
-        # Normalize input: legacy str → list conversion
-        normalized_items = _normalize_line_items(line_items)
-
         # Build user prompt
         user_prompt = _build_user_prompt(normalized_items, context, document_info)
 
+        # 同一プロンプト（同じ明細・書類情報・モデル・プロンプト版）ならキャッシュを返す
+        cache = get_response_cache()
+        cache_key = _response_cache_key(model_name, user_prompt)
+        if cache is not None:
+            cached = cache.get(_RESPONSE_CACHE_NAMESPACE, cache_key)
+            if cached is not None:
+                logger.info("Gemini classification cache hit (%s)", cache_key[:12])
+                return cached
+
+        # リクエストの残り時間が足りなければ呼ばずに Stop-first（呼び出し側はルールへフォールバック）
+        deadline = current_deadline()
+        if not deadline.has(min_remote_seconds()):
+            logger.warning("Gemini classification skipped: request deadline nearly exhausted (%r)", deadline)
+            return _fallback_response(["処理時間の上限に達したため Gemini 判定を省略"], ["deadline_exceeded"])
+
+        # Import only when feature is enabled
+        from google.genai import types
+
+        # 共有クライアント（接続を使い回す）
+        client = get_client()
+        if client is None:
+            return _fallback_response(["認証情報が未設定（Vertex AI環境変数またはAPIキー）"], ["missing_credentials"])
+
         # Generate response
         response = client.models.generate_content(
             model=model_name,
@@ -310,27 +351,258 @@ def classify_with_gemini(
                 response_mime_type="application/json",
                 temperature=0.1,
                 thinking_config=types.ThinkingConfig(thinking_level="MEDIUM"),
+                # RISK-003: timeout 30s（リクエストの残り時間が短ければそちらに合わせる）
+                http_options=http_options(deadline.timeout_ms(_GEMINI_TIMEOUT_MS)),
             ),
         )
 
         # Parse response
-        return _parse_gemini_response(response.text)
+        result = _parse_gemini_response(response.text)
+        if cache is not None and "parse_error" not in result["flags"]:
+            cache.put(_RESPONSE_CACHE_NAMESPACE, cache_key, result)
+        return result
 
     except ImportError:
-        default_response["reasons"] = ["google-genaiライブラリ未インストール"]
-        default_response["flags"] = ["library_not_installed"]
-        return default_response
+        return _fallback_response(["google-genaiライブラリ未インストール"], ["library_not_installed"])
 
     except json.JSONDecodeError:
-        default_response["reasons"] = ["Gemini レスポンス解析エラー"]
-        default_response["flags"] = ["parse_error"]
-        return default_response
+        return _fallback_response(["Gemini レスポンス解析エラー"], ["parse_error"])
 
     except (ConnectionError, TimeoutError, OSError, RuntimeError, ValueError) as e:
         logger.exception("Gemini API error: %s", e)
-        default_response["reasons"] = [f"Gemini API エラー: {type(e).__name__}"]
-        default_response["flags"] = ["api_error"]
-        return default_response
+        return _fallback_response([f"Gemini API エラー: {type(e).__name__}"], ["api_error"])
+
+
+# ---------------------------------------------------------------------------
+# 大量明細のチャンク分割（書類情報を各チャンクに付けて並列判定）
+# ---------------------------------------------------------------------------
+
+# 1ドキュメントで Gemini に送る明細の上限（超過分は GUIDANCE のまま残す）
+_MAX_TOTAL_LINE_ITEMS = 1000
+
+_CHUNK_FAILURE_FLAGS = frozenset({
+    "missing_credentials", "library_not_installed", "parse_error", "api_error", "deadline_exceeded",
+})
+
+
+def _chunk_context(context: str, start: int, end: int, total: int) -> str:
+    note = f"この明細一覧は全{total}件の書類の一部（{start}〜{end}件目）です。各明細を個別に判定してください。"
+    return f"{context}\n{note}" if context else note
+
+
+def _chunk_line_items(
+    items: List[Dict[str, Any]],
+    context: str = "",
+    document_info: Optional[Dict[str, Any]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Split items so every chunk fits GEMINI_CHUNK_ITEMS and _MAX_PROMPT_CHARS.
+
+    書類情報・追加コンテキスト・指示部分は全チャンク共通なので、その長さを差し引いた
+    残りに明細行を詰める。
+    """
+    max_items = max(1, min(_int_env("GEMINI_CHUNK_ITEMS", _MAX_LINE_ITEMS), _MAX_LINE_ITEMS))
+    items = items[:_MAX_TOTAL_LINE_ITEMS]
+    if len(items) <= max_items:
+        line_chars = sum(len(_format_item_line(i, item)) + 1 for i, item in enumerate(items, 1))
+        if len(_build_user_prompt([], context, document_info)) + line_chars <= _MAX_PROMPT_CHARS:
+            return [items]
+
+    longest_note = _chunk_context(context, _MAX_TOTAL_LINE_ITEMS, _MAX_TOTAL_LINE_ITEMS, _MAX_TOTAL_LINE_ITEMS)
+    budget = _MAX_PROMPT_CHARS - len(_build_user_prompt([], longest_note, document_info))
+    if budget <= 0:
+        # 共通部分だけで上限を超える場合は件数だけで分割する（各プロンプトは切り詰められる）
+        budget = _MAX_PROMPT_CHARS * max_items
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        # 番号はチャンク内で 1 から振られる
+        line_len = len(_format_item_line(len(current) + 1, item)) + 1
+        if current and (len(current) >= max_items or used + line_len > budget):
+            chunks.append(current)
+            current, used = [], 0
+            line_len = len(_format_item_line(1, item)) + 1
+        current.append(item)
+        used += line_len
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _align_chunk_analysis(chunk: List[Dict[str, Any]], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return exactly one analysis per chunk item, in item order.
+
+    件数が一致すれば順序どおりに対応付ける。Gemini が明細を落とした場合は品名で
+    対応付け、見つからない明細は GUIDANCE（取得価額に含めない）とする。
+    """
+    lia = [a for a in result.get("line_item_analysis") or [] if isinstance(a, dict)]
+    if len(lia) == len(chunk):
+        return lia
+    by_desc = {a.get("description"): a for a in lia if a.get("description")}
+    aligned = []
+    for item in chunk:
+        desc = item.get("description", "")
+        if desc in by_desc:
+            aligned.append(by_desc[desc])
+        else:
+            aligned.append({
+                "description": desc,
+                "classification": "GUIDANCE",
+                "confidence": 0.0,
+                "included_in_acquisition_cost": False,
+                "reason": "Gemini判定結果なし（要確認）",
+                "flags": list(result.get("flags") or []) or ["gemini_item_missing"],
+            })
+    return aligned
+
+
+def _unique(values: List[Any]) -> List[Any]:
+    out: List[Any] = []
+    for v in values:
+        if v not in out:
+            out.append(v)
+    return out
+
+
+def _merge_chunk_results(
+    chunks: List[List[Dict[str, Any]]],
+    results: List[Dict[str, Any]],
+    total_items: int,
+) -> Dict[str, Any]:
+    """Merge per-chunk responses back into one classify_with_gemini result."""
+    succeeded = [r for r in results if not _CHUNK_FAILURE_FLAGS.intersection(r.get("flags") or [])]
+    if not succeeded:
+        return results[0]
+
+    line_item_analysis: List[Dict[str, Any]] = []
+    for chunk, result in zip(chunks, results):
+        line_item_analysis.extend(_align_chunk_analysis(chunk, result))
+
+    decisions = {r.get("decision", "GUIDANCE") for r in results}
+    if len(succeeded) < len(results) or "GUIDANCE" in decisions:
+        decision = "GUIDANCE"
+    elif decisions == {"EXPENSE_LIKE"}:
+        decision = "EXPENSE_LIKE"
+    else:
+        # 資産明細を含む書類は資産寄り（明細ごとの判定は line_item_analysis 側）
+        decision = "CAPITAL_LIKE"
+
+    # 耐用年数・資産区分は取得価額が最も大きいチャンクの提示を採用する
+    main = max(succeeded, key=lambda r: r.get("acquisition_cost_total") or 0)
+    flags = _unique([f for r in results for f in r.get("flags") or []] + ["gemini_chunked"])
+    if total_items > sum(len(c) for c in chunks):
+        flags.append("gemini_items_truncated")
+
+    return {
+        "decision": decision,
+        "confidence": min(float(r.get("confidence") or 0.0) for r in results),
+        "reasons": _unique([reason for r in results for reason in r.get("reasons") or []]),
+        "reasoning": "\n".join(r.get("reasoning") for r in succeeded if r.get("reasoning")),
+        "line_item_analysis": line_item_analysis,
+        "acquisition_cost_total": sum(int(r.get("acquisition_cost_total") or 0) for r in succeeded),
+        "expense_total": sum(int(r.get("expense_total") or 0) for r in succeeded),
+        "excluded_total": sum(int(r.get("excluded_total") or 0) for r in succeeded),
+        "estimated_useful_life_years": main.get("estimated_useful_life_years", 0),
+        "useful_life_basis": main.get("useful_life_basis", ""),
+        "asset_category": main.get("asset_category", ""),
+        "missing_fields": _unique([f for r in results for f in r.get("missing_fields") or []]),
+        "why_missing_matters": _unique([w for r in results for w in r.get("why_missing_matters") or []]),
+        "similar_case": next((r["similar_case"] for r in succeeded if r.get("similar_case")), None),
+        "evidence": [e for r in succeeded for e in r.get("evidence") or []],
+        "useful_life": main.get("useful_life"),
+        "flags": flags,
+    }
+
+
+def _classify_chunked(
+    chunks: List[List[Dict[str, Any]]],
+    total_items: int,
+    context: str = "",
+    document_info: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Classify chunks concurrently (at most GEMINI_CHUNK_CONCURRENCY in flight)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    total = sum(len(c) for c in chunks)
+    jobs = []
+    start = 1
+    for chunk in chunks:
+        jobs.append((chunk, _chunk_context(context, start, start + len(chunk) - 1, total)))
+        start += len(chunk)
+
+    workers = max(1, min(_int_env("GEMINI_CHUNK_CONCURRENCY", 6), len(chunks)))
+    logger.info("Gemini classification split into %d chunks (%d items, %d concurrent)", len(chunks), total, workers)
+    # 各スレッドに呼び出し元のコンテキスト（リクエストの期限）を引き継ぐ
+    contexts = [contextvars.copy_context() for _ in jobs]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fa-gemini-chunk") as pool:
+        results = list(pool.map(
+            lambda ctx, job: ctx.run(_classify_single, job[0], job[1], document_info), contexts, jobs,
+        ))
+    return _merge_chunk_results(chunks, results, total_items)
+
+
+# ---------------------------------------------------------------------------
+# レスポンスキャッシュ
+# ---------------------------------------------------------------------------
+
+# プロンプト構築・レスポンス解析の意味を変えたら上げる（古いキャッシュを無効化）
+PROMPT_VERSION = 1
+_RESPONSE_CACHE_NAMESPACE = "gemini_classify"
+_SYSTEM_PROMPT_SHA = hashlib.sha256(CLASSIFICATION_SYSTEM_PROMPT.encode("utf-8")).hexdigest()
+
+_UNSET: Any = object()
+_response_cache: Any = _UNSET
+_response_cache_lock = threading.Lock()
+
+
+def _response_cache_key(model_name: str, user_prompt: str) -> str:
+    """Key on exactly what is sent to Gemini.
+
+    user_prompt は正規化済み明細・書類情報・コンテキストから決定的に組み立てられる
+    ため、プロンプトに現れない明細フィールド（evidence 等）の違いではキーが割れない。
+    """
+    return canonical_key(_RESPONSE_CACHE_NAMESPACE, PROMPT_VERSION, model_name, _SYSTEM_PROMPT_SHA, user_prompt)
+
+
+def _default_response_cache() -> Optional[Any]:
+    if not _bool_env("GEMINI_CACHE_ENABLED", True):
+        return None
+    ttl_seconds = _int_env("GEMINI_CACHE_TTL_HOURS", 720) * 3600
+    max_items = _int_env("GEMINI_CACHE_MAX_ITEMS", 5000)
+    if os.getenv("GEMINI_CACHE_BACKEND", "sqlite").strip().lower() == "memory":
+        return MemoryResponseCache(max_items=max_items, ttl_seconds=ttl_seconds)
+    path = os.getenv("GEMINI_CACHE_PATH") or str(PROJECT_ROOT / "data" / "cache" / "gemini_responses.sqlite3")
+    try:
+        return SQLiteResponseCache(Path(path), max_items=max_items, ttl_seconds=ttl_seconds)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Gemini response cache unavailable at %s, using memory: %s", path, e)
+        return MemoryResponseCache(max_items=max_items, ttl_seconds=ttl_seconds)
+
+
+def get_response_cache() -> Optional[Any]:
+    """Return the active response cache (created on first use; None when disabled)."""
+    global _response_cache
+    if _response_cache is _UNSET:
+        with _response_cache_lock:
+            if _response_cache is _UNSET:
+                _response_cache = _default_response_cache()
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[Any]) -> None:
+    """Swap the cache implementation (tests, or a shared backend). None disables caching."""
+    global _response_cache
+    _response_cache = cache
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    """Counters for /health (``{"enabled": False}`` when disabled)."""
+    cache = _response_cache
+    if cache is _UNSET:
+        return {"enabled": _bool_env("GEMINI_CACHE_ENABLED", True), "initialized": False}
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
 
 
 # ---------------------------------------------------------------------------
@@ -386,6 +658,25 @@ def _sanitize_text(text: str) -> str:
 # プロンプト構築
 # ---------------------------------------------------------------------------
 
+def _format_item_line(i: int, item: Dict[str, Any]) -> str:
+    """One numbered line of the 明細一覧 block."""
+    desc = _sanitize_text(item.get("description", ""))
+    amount = item.get("amount", 0)
+    amount_str = f"¥{int(amount):,}" if amount else "金額不明"
+    line = f"{i}. {desc} — {amount_str}"
+    # Add extra fields if present
+    extras = []
+    if item.get("quantity"):
+        extras.append(f"数量:{item['quantity']}")
+    if item.get("unit"):
+        extras.append(f"単位:{item['unit']}")
+    if item.get("remarks"):
+        extras.append(f"備考:{_sanitize_text(str(item['remarks']))}")
+    if extras:
+        line += f"  ({', '.join(extras)})"
+    return line
+
+
 def _build_user_prompt(
     line_items: List[Dict[str, Any]],
     context: str = "",
@@ -421,21 +712,7 @@ def _build_user_prompt(
         parts.append(f"（※ 全{len(line_items)}件中、先頭{_MAX_LINE_ITEMS}件を表示）")
     parts.append("```")
     for i, item in enumerate(display_items, 1):
-        desc = _sanitize_text(item.get("description", ""))
-        amount = item.get("amount", 0)
-        amount_str = f"¥{int(amount):,}" if amount else "金額不明"
-        line = f"{i}. {desc} — {amount_str}"
-        # Add extra fields if present
-        extras = []
-        if item.get("quantity"):
-            extras.append(f"数量:{item['quantity']}")
-        if item.get("unit"):
-            extras.append(f"単位:{item['unit']}")
-        if item.get("remarks"):
-            extras.append(f"備考:{_sanitize_text(str(item['remarks']))}")
-        if extras:
-            line += f"  ({', '.join(extras)})"
-        parts.append(line)
+        parts.append(_format_item_line(i, item))
 
     # NOTE: 明細合計は表示しない（合計ベース判定のバイアス防止）
     parts.append("```")
@@ -101,18 +101,15 @@ def detect_document_boundaries(
 
     try:
         # Import only when needed
-        from google import genai
         from google.genai import types
         from PIL import Image
         import io
 
-        # Configure API (Vertex AI or AI Studio)
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-            client = genai.Client()
-        elif api_key:
-            client = genai.Client(api_key=api_key)
-        else:
+        from core.genai_client import get_client
+
+        # Shared client (Vertex AI or AI Studio)
+        client = get_client()
+        if client is None:
             default_response[0]["error"] = "認証情報が未設定"
             return default_response
 
@@ -1,7 +1,43 @@
 # -*- coding: utf-8 -*-
-"""履歴ベースの類似検索（API不要版）"""
+"""履歴ベースの類似検索（API不要版）
+
+判定履歴が数万件になっても明細ごとの検索が対話的な速さで返るよう、
+:class:`HistoryIndex` が名称を一度だけ正規化し、文字単位と文字 bigram / trigram の転置索引を持つ。
+類似検索はクエリと文字を共有する名称（類似度 > 0 になりうる全名称）を候補にし、
+SequenceMatcher.quick_ratio と同じ上限で閾値に届かない名称を落としてから、従来どおり
+SequenceMatcher で採点する。上限による絞り込みで真の一致が落ちることはない。
+判定が追加されたら :meth:`HistoryIndex.add` で索引に追記する（作り直し不要）。
+
+``search_similar_from_history`` / ``search_by_keywords`` には履歴リストをそのまま
+渡してよい。同じリストに対する索引はモジュール内に保持し、末尾に追加された分だけ追記する。
+"""
+from collections import Counter, OrderedDict
 from difflib import SequenceMatcher
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+# 1クエリで SequenceMatcher にかける候補数の上限。上限を通過した候補がこれを超える場合だけ
+# n-gram の重なり（Dice 係数）が大きい順に切るため、その場合の結果は近似になる
+MAX_CANDIDATES = 500
+# 索引を保持する履歴リストの数（Streamlit のセッションごとに1つ）
+_INDEX_CACHE_SIZE = 8
+
+
+def normalize_name(s: str) -> str:
+    """正規化（小文字化、空白除去）. 履歴の索引・重複判定で共通に使う."""
+    return s.lower().replace(" ", "").replace("　", "")
+
+
+def _ngrams(s: str) -> Set[str]:
+    """Character bigrams and trigrams (1文字の名称はその文字自体)."""
+    if len(s) < 2:
+        return {s} if s else set()
+    grams = {s[i:i + 2] for i in range(len(s) - 1)}
+    grams.update(s[i:i + 3] for i in range(len(s) - 2))
+    return grams
+
+
+def _is_placeholder(name: str) -> bool:
+    return name.startswith("明細(") or name.startswith("明細（")
 
 
 def calculate_similarity(s1: str, s2: str) -> float:
@@ -11,15 +47,188 @@ def calculate_similarity(s1: str, s2: str) -> float:
     """
     if not s1 or not s2:
         return 0.0
-    # 正規化（小文字化、空白除去）
-    s1_normalized = s1.lower().replace(" ", "").replace("　", "")
-    s2_normalized = s2.lower().replace(" ", "").replace("　", "")
-    return SequenceMatcher(None, s1_normalized, s2_normalized).ratio()
+    return SequenceMatcher(None, normalize_name(s1), normalize_name(s2)).ratio()
+
+
+def _result(entry: Dict[str, Any], name: str, similarity: float) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "similarity": similarity,
+        "decision": entry.get("decision", ""),
+        "amount": entry.get("amount"),
+        "category": entry.get("category", ""),
+        "useful_life_years": entry.get("useful_life_years", ""),
+        "metadata": {
+            "source": entry.get("source", ""),
+            "timestamp": entry.get("timestamp", ""),
+        }
+    }
+
+
+class HistoryIndex:
+    """
+    N-gram inverted index over the names in a decision history.
+
+    同じ名称は最初に現れた履歴エントリで代表する（従来の線形走査と同じ結果）。
+    """
+
+    def __init__(self, history: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        self.names: List[str] = []
+        self.entries: List[Dict[str, Any]] = []
+        self._normalized: List[str] = []
+        self._gram_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        # 文字 -> [(doc id, 名称中の出現回数)]（quick_ratio の上限計算用）
+        self._char_postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._ids: Dict[str, int] = {}
+        self.size = 0  # add() に渡された履歴エントリ数（重複・除外分を含む）
+        if history is not None:
+            self.extend(history)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        """Index one history entry (判定を履歴に追加したときに呼ぶ)."""
+        self.size += 1
+        name = entry.get("description", "") or entry.get("name", "")
+        if not name or name in self._ids or _is_placeholder(name):
+            return
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+        doc_id = len(self.names)
+        self._ids[name] = doc_id
+        self.names.append(name)
+        self.entries.append(entry)
+        self._normalized.append(normalized)
+        grams = _ngrams(normalized)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(doc_id)
+        for char, count in Counter(normalized).items():
+            self._char_postings.setdefault(char, []).append((doc_id, count))
+
+    def extend(self, history: Iterable[Dict[str, Any]]) -> None:
+        for entry in history:
+            self.add(entry)
+
+    def _overlap(self, grams: Iterable[str]) -> Counter:
+        """doc id -> number of shared n-grams."""
+        counts: Counter = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings:
+                counts.update(postings)
+        return counts
+
+    def search_similar(self, query: str, top_k: int = 3, threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """文字を共有する名称を上限で絞り、SequenceMatcher で採点する（完全一致は除外）."""
+        if not query or not self.names:
+            return []
+        normalized_query = normalize_name(query)
+        query_len = len(normalized_query)
+        if not query_len:
+            return []
+
+        # 共通文字数（多重集合の共通部分）= SequenceMatcher.quick_ratio の分子。ratio はこれを超えない
+        common: Dict[int, int] = {}
+        for char, query_count in Counter(normalized_query).items():
+            for doc_id, count in self._char_postings.get(char, ()):
+                common[doc_id] = common.get(doc_id, 0) + min(count, query_count)
+
+        candidates = [
+            doc_id for doc_id, shared in common.items()
+            if 2.0 * shared / (query_len + len(self._normalized[doc_id])) >= threshold
+        ]
+        if len(candidates) > MAX_CANDIDATES:
+            # 上限を通過した候補が多すぎるときだけ n-gram の Dice 係数で切る（近似）
+            query_grams = _ngrams(normalized_query)
+            overlap = self._overlap(query_grams)
+            dice = {
+                doc_id: 2.0 * overlap.get(doc_id, 0) / (len(query_grams) + self._gram_counts[doc_id] or 1)
+                for doc_id in candidates
+            }
+            candidates.sort(key=lambda doc_id: (-dice[doc_id], doc_id))
+            candidates = candidates[:MAX_CANDIDATES]
+
+        # 従来の calculate_similarity と同じ向き（クエリ, 名称）で採点する
+        matcher = SequenceMatcher(None)
+        matcher.set_seq1(normalized_query)
+        scored = []
+        for doc_id in candidates:
+            matcher.set_seq2(self._normalized[doc_id])
+            similarity = matcher.ratio()
+            if similarity >= threshold and similarity < 1.0:  # 完全一致は除外
+                scored.append((similarity, doc_id))
+
+        # 類似度降順（同点は履歴順）で上位K件を返す
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [_result(self.entries[i], self.names[i], sim) for sim, i in scored[:top_k]]
+
+    def search_by_keywords(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """部分一致（クエリ ⊂ 名称 または 名称 ⊂ クエリ）を n-gram の包含で絞り込む."""
+        if not query or not self.names:
+            return []
+        query_lower = normalize_name(query)
+        if not query_lower:
+            return []
+        query_grams = _ngrams(query_lower)
+        overlap = self._overlap(query_grams | set(query_lower))
+        matches: Set[int] = set()
+        for doc_id, shared in overlap.items():
+            # 名称の n-gram がすべてクエリに含まれる（名称 ⊂ クエリの候補）
+            if shared >= self._gram_counts[doc_id] and len(self._normalized[doc_id]) <= len(query_lower):
+                matches.add(doc_id)
+            # クエリの n-gram がすべて名称に含まれる（クエリ ⊂ 名称の候補）
+            elif len(query_lower) > 1 and shared >= len(query_grams):
+                matches.add(doc_id)
+        if len(query_lower) == 1:
+            # 1文字のクエリは n-gram では引けないので走査する
+            matches.update(i for i, name in enumerate(self._normalized) if query_lower in name)
+
+        scored = []
+        for doc_id in matches:
+            name_lower = self._normalized[doc_id]
+            if not (query_lower in name_lower or name_lower in query_lower):
+                continue
+            # 類似度は部分一致の割合で計算
+            similarity = len(query_lower) / max(len(name_lower), 1)
+            if similarity > 1.0:
+                similarity = len(name_lower) / len(query_lower)
+            scored.append((min(similarity, 0.99), doc_id))  # 最大0.99
+
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [_result(self.entries[i], self.names[i], sim) for sim, i in scored[:top_k]]
+
+
+HistoryLike = Union[List[Dict[str, Any]], HistoryIndex]
+
+# id(list) -> (list, index)。リストへの参照を持つので id が別のリストに再利用されることはない
+_indexes: "OrderedDict[int, Tuple[List[Dict[str, Any]], HistoryIndex]]" = OrderedDict()
+
+
+def get_history_index(history: HistoryLike) -> HistoryIndex:
+    """Index for ``history``, reused across calls and extended when entries were appended."""
+    if isinstance(history, HistoryIndex):
+        return history
+    cached = _indexes.get(id(history))
+    if cached is not None and cached[0] is history and cached[1].size <= len(history):
+        index = cached[1]
+        if index.size < len(history):
+            index.extend(history[index.size:])
+        _indexes.move_to_end(id(history))
+        return index
+    index = HistoryIndex(history)
+    _indexes[id(history)] = (history, index)
+    while len(_indexes) > _INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
 
 
 def search_similar_from_history(
     query: str,
-    history: List[Dict[str, Any]],
+    history: HistoryLike,
     top_k: int = 3,
     threshold: float = 0.5,
 ) -> List[Dict[str, Any]]:
@@ -28,7 +237,7 @@ def search_similar_from_history(
 
     Args:
         query: 検索クエリ（資産名）
-        history: 判定履歴リスト
+        history: 判定履歴リスト（または HistoryIndex）
         top_k: 上位何件を返すか
         threshold: 類似度の閾値（デフォルト0.5）
 
@@ -39,41 +248,12 @@ def search_similar_from_history(
     """
     if not query or not history:
         return []
-
-    results = []
-    seen_names = set()  # 重複除去用
-
-    for entry in history:
-        name = entry.get("description", "") or entry.get("name", "")
-        if not name or name in seen_names:
-            continue
-        if name.startswith("明細(") or name.startswith("明細（"):
-            continue
-
-        similarity = calculate_similarity(query, name)
-        if similarity >= threshold and similarity < 1.0:  # 完全一致は除外
-            seen_names.add(name)
-            results.append({
-                "name": name,
-                "similarity": similarity,
-                "decision": entry.get("decision", ""),
-                "amount": entry.get("amount"),
-                "category": entry.get("category", ""),
-                "useful_life_years": entry.get("useful_life_years", ""),
-                "metadata": {
-                    "source": entry.get("source", ""),
-                    "timestamp": entry.get("timestamp", ""),
-                }
-            })
-
-    # 類似度降順でソート、上位K件を返す
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:top_k]
+    return get_history_index(history).search_similar(query, top_k=top_k, threshold=threshold)
 
 
 def search_by_keywords(
     query: str,
-    history: List[Dict[str, Any]],
+    history: HistoryLike,
     top_k: int = 3,
 ) -> List[Dict[str, Any]]:
     """
@@ -83,40 +263,4 @@ def search_by_keywords(
     """
     if not query or not history:
         return []
-
-    query_lower = query.lower().replace(" ", "").replace("　", "")
-    results = []
-    seen_names = set()
-
-    for entry in history:
-        name = entry.get("description", "") or entry.get("name", "")
-        if not name or name in seen_names:
-            continue
-        if name.startswith("明細(") or name.startswith("明細（"):
-            continue
-
-        name_lower = name.lower().replace(" ", "").replace("　", "")
-
-        # 部分一致チェック
-        if query_lower in name_lower or name_lower in query_lower:
-            seen_names.add(name)
-            # 類似度は部分一致の割合で計算
-            similarity = len(query_lower) / max(len(name_lower), 1)
-            if similarity > 1.0:
-                similarity = len(name_lower) / len(query_lower)
-
-            results.append({
-                "name": name,
-                "similarity": min(similarity, 0.99),  # 最大0.99
-                "decision": entry.get("decision", ""),
-                "amount": entry.get("amount"),
-                "category": entry.get("category", ""),
-                "useful_life_years": entry.get("useful_life_years", ""),
-                "metadata": {
-                    "source": entry.get("source", ""),
-                    "timestamp": entry.get("timestamp", ""),
-                }
-            })
-
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:top_k]
+    return get_history_index(history).search_by_keywords(query, top_k=top_k)
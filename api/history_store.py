@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent decision history (SQLite).
+
+判定履歴をブラウザセッション（``st.session_state``）ではなくローカル SQLite に保存し、
+UI と API の両方から同じ履歴を使えるようにする。
+
+- 取引先・金額・日時・正規化済み名称に索引を張り、条件検索はキーセット方式でページングする
+- 重複請求書チェックは（取引先, ファイル名, 合計金額）のハッシュ ``invoice_key`` を索引で引く
+- CSV エクスポートは行をまとめて読みながら少しずつ書き出す（全件をメモリに載せない）
+- 類似事例検索は api.history_search.HistoryIndex を保存済みの全履歴に対して保持し、
+  新しく追加された行だけ追記する
+
+I/O スレッドプールから並行に呼ばれるため、1本の接続をロックで直列化する（response_cache と同じ）。
+"""
+import csv
+import io
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from api.history_search import HistoryIndex, normalize_name
+from api.response_cache import canonical_key
+
+logger = logging.getLogger("fixed_asset_api")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# CSV の列（従来の UI エクスポートと同じ順。vendor は末尾に追加）
+CSV_FIELDS = [
+    "timestamp", "source", "description", "amount",
+    "decision", "confidence", "category", "useful_life_years", "vendor",
+]
+# 1ページの最大件数
+MAX_PAGE_SIZE = 500
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_COLUMNS = (
+    "id", "timestamp", "source", "vendor", "description", "amount",
+    "decision", "confidence", "category", "useful_life_years", "invoice_key",
+)
+
+
+def invoice_key(source: str, total_amount: Optional[float], vendor: str = "") -> str:
+    """Hash identifying one invoice (同じ取引先・ファイル名・合計金額なら同じキー)."""
+    amount = None if total_amount is None else round(float(total_amount), 2)
+    return canonical_key("invoice", normalize_name(vendor or ""), normalize_name(source or ""), amount)
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryStore:
+    """Decision history persisted in a local SQLite file."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS decisions (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp         TEXT NOT NULL,
+            source            TEXT NOT NULL DEFAULT '',
+            vendor            TEXT NOT NULL DEFAULT '',
+            description       TEXT NOT NULL DEFAULT '',
+            normalized        TEXT NOT NULL DEFAULT '',
+            amount            REAL,
+            decision          TEXT NOT NULL DEFAULT '',
+            confidence        REAL,
+            category          TEXT NOT NULL DEFAULT '',
+            useful_life_years INTEGER,
+            invoice_key       TEXT
+        )
+    """
+    _INDEXES = (
+        "CREATE INDEX IF NOT EXISTS decisions_vendor ON decisions (vendor, id)",
+        "CREATE INDEX IF NOT EXISTS decisions_amount ON decisions (amount)",
+        "CREATE INDEX IF NOT EXISTS decisions_timestamp ON decisions (timestamp)",
+        "CREATE INDEX IF NOT EXISTS decisions_normalized ON decisions (normalized)",
+        "CREATE INDEX IF NOT EXISTS decisions_invoice_key ON decisions (invoice_key)",
+    )
+
+    _INSERT = (
+        "INSERT INTO decisions (timestamp, source, vendor, description, normalized, amount, "
+        "decision, confidence, category, useful_life_years, invoice_key) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(self._SCHEMA)
+        for statement in self._INDEXES:
+            self._conn.execute(statement)
+        self._index: Optional[HistoryIndex] = None
+        self._indexed_id = 0
+
+    # ------------------------------------------------------------------
+    # 追加
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _row(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+        description = entry.get("description", "") or ""
+        useful_life = entry.get("useful_life_years")
+        return (
+            entry.get("timestamp") or datetime.now().strftime(TIMESTAMP_FORMAT),
+            entry.get("source", "") or "",
+            entry.get("vendor", "") or "",
+            description,
+            normalize_name(description),
+            entry.get("amount"),
+            entry.get("decision", "") or "",
+            entry.get("confidence"),
+            entry.get("category", "") or "",
+            _int_or_none(useful_life),
+            entry.get("invoice_key"),
+        )
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        """Append one decision; returns its id."""
+        with self._lock:
+            cursor = self._conn.execute(self._INSERT, self._row(entry))
+            return int(cursor.lastrowid)
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Append decisions in one transaction; returns the number written."""
+        rows = [self._row(entry) for entry in entries]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(self._INSERT, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # 検索
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _where(
+        vendor: Optional[str] = None,
+        decision: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        description: Optional[str] = None,
+    ) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if vendor is not None:
+            clauses.append("vendor = ?")
+            params.append(vendor)
+        if decision is not None:
+            clauses.append("decision = ?")
+            params.append(decision)
+        if min_amount is not None:
+            clauses.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            clauses.append("amount <= ?")
+            params.append(max_amount)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if description:
+            # 正規化済み名称の前方一致（範囲条件にして索引を使う）
+            prefix = normalize_name(description)
+            clauses.append("normalized >= ? AND normalized < ?")
+            params.extend([prefix, prefix + "\U0010ffff"])
+        return clauses, params
+
+    @staticmethod
+    def _entry(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        entry = dict(zip(_COLUMNS, row))
+        if entry["useful_life_years"] is None:
+            entry["useful_life_years"] = ""
+        return entry
+
+    def query(self, limit: int = 50, cursor: Optional[int] = None, **filters: Any) -> Dict[str, Any]:
+        """
+        Newest-first page of decisions matching ``filters``.
+
+        Args:
+            limit: Page size (max MAX_PAGE_SIZE)
+            cursor: ``next_cursor`` of the previous page (キーセット方式。OFFSET を使わない)
+            **filters: vendor / decision / min_amount / max_amount / since / until /
+                description（正規化済み名称の前方一致）
+
+        Returns:
+            {"items": [...], "next_cursor": int or None}
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses, params = self._where(**filters)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM decisions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit + 1]).fetchall()
+        items = [self._entry(row) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def count(self, **filters: Any) -> int:
+        clauses, params = self._where(**filters)
+        sql = "SELECT COUNT(*) FROM decisions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            (total,) = self._conn.execute(sql, params).fetchone()
+        return int(total)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def iter_entries(self, after_id: int = 0, batch_size: int = 1000, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Oldest-first iteration in ``batch_size`` reads (ロックは1バッチごとに手放す)."""
+        clauses, params = self._where(**filters)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM decisions WHERE id > ?"
+        if clauses:
+            sql += " AND " + " AND ".join(clauses)
+        sql += " ORDER BY id LIMIT ?"
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, [last_id, *params, batch_size]).fetchall()
+            for row in rows:
+                yield self._entry(row)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def has_invoice(self, key: str) -> bool:
+        """True when a decision with this :func:`invoice_key` was already recorded."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM decisions WHERE invoice_key = ? LIMIT 1", (key,)).fetchone()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # エクスポート・類似検索
+    # ------------------------------------------------------------------
+
+    def iter_csv(self, batch_size: int = 1000, **filters: Any) -> Iterator[str]:
+        """CSV text in chunks (先頭に Excel 用の BOM)."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        buffer.write("\ufeff")
+        writer.writeheader()
+        rows = 0
+        for entry in self.iter_entries(batch_size=batch_size, **filters):
+            writer.writerow(entry)
+            rows += 1
+            if rows % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def export_csv(self, path: Path, **filters: Any) -> None:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for chunk in self.iter_csv(**filters):
+                f.write(chunk)
+
+    def history_index(self) -> HistoryIndex:
+        """N-gram index over every stored decision (新しい行だけ追記する)."""
+        with self._lock:
+            if self._index is None:
+                self._index = HistoryIndex()
+                self._indexed_id = 0
+            index = self._index
+            after_id = self._indexed_id
+        for entry in self.iter_entries(after_id=after_id):
+            with self._lock:
+                if index is not self._index or entry["id"] <= self._indexed_id:
+                    continue
+                index.add(entry)
+                self._indexed_id = entry["id"]
+        return index
+
+    def search_similar(self, query: str, top_k: int = 3, threshold: float = 0.5) -> List[Dict[str, Any]]:
+        return self.history_index().search_similar(query, top_k=top_k, threshold=threshold)
+
+    def clear(self) -> None:
+        """Delete every decision (管理用: UI の全セッションと /history API で共有する履歴が消える)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM decisions")
+            self._index = None
+            self._indexed_id = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": str(self.path), "items": self.count()}
+
+
+_history_store: Optional[HistoryStore] = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Return the process-wide store (HISTORY_DB_PATH, default data/history/decisions.sqlite3)."""
+    global _history_store
+    if _history_store is None:
+        with _history_store_lock:
+            if _history_store is None:
+                path = os.getenv("HISTORY_DB_PATH") or str(PROJECT_ROOT / "data" / "history" / "decisions.sqlite3")
+                _history_store = HistoryStore(Path(path))
+                logger.info("Decision history store: %s", path)
+    return _history_store
+
+
+def set_history_store(store: Optional[HistoryStore]) -> None:
+    """Swap the process-wide store (tests, or another file)."""
+    global _history_store
+    _history_store = store
@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import tempfile
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from fastapi import Depends, FastAPI, Header, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # --- Structured Logging Setup ---
@@ -31,19 +34,35 @@ logger.setLevel(logging.INFO)
 logger.addHandler(_handler)
 
 from core.adapter import adapt_opal_to_v1
+from core import extraction_cache
 from core.classifier import classify_document
-from core.pdf_extract import extract_pdf, extraction_to_opal
-from core.policy import load_policy
+from core.deadline import Deadline, DeadlineExceeded, current_deadline, min_remote_seconds, set_deadline
+from core.extraction_cache import extraction_options
+from core.genai_client import client_stats, get_async_client, get_client, http_options
+from core.pdf_extract import (
+    DEADLINE_SKIPPED_CODE,
+    extract_page_shard,
+    extract_pdf,
+    extraction_to_opal,
+    merge_page_shards,
+    plan_page_shards,
+)
+from core.policy import CompiledPolicy, load_policy
+from api.executor_pool import executor_stats, run_cpu, run_io, shutdown_executors
+from api.history_store import MAX_PAGE_SIZE as HISTORY_MAX_PAGE_SIZE, get_history_store, invoice_key
 
 # 耐用年数判定（フラグ制御）
 try:
-    from api.useful_life_estimator import estimate_useful_life
+    from api.useful_life_estimator import estimate_useful_life, estimate_useful_life_batch
     USEFUL_LIFE_AVAILABLE = True
 except ImportError:
     USEFUL_LIFE_AVAILABLE = False
     def estimate_useful_life(*args, **kwargs):
         return {"useful_life_years": 0, "source": "not_available"}
 
+    def estimate_useful_life_batch(items, *args, **kwargs):
+        return [estimate_useful_life() for _ in items]
+
 # Optional: Vertex AI Search integration (feature-flagged)
 try:
     from api.vertex_search import get_citations_for_guidance
@@ -57,7 +76,7 @@ except ImportError:
 # Enabled with GEMINI_ENABLED=1
 GEMINI_ENABLED = os.environ.get("GEMINI_ENABLED", "0") == "1"
 try:
-    from api.gemini_classifier import classify_with_gemini, classify_line_items
+    from api.gemini_classifier import classify_with_gemini, classify_line_items, response_cache_stats
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
@@ -65,6 +84,8 @@ except ImportError:
         return {"decision": "GUIDANCE", "confidence": 0.0, "reasoning": "Gemini未インストール", "flags": ["not_installed"]}
     def classify_line_items(*args, **kwargs):
         return []
+    def response_cache_stats():
+        return {"enabled": False}
 
 
 def _bool_env(name: str, default: bool = False) -> bool:
@@ -75,6 +96,20 @@ def _bool_env(name: str, default: bool = False) -> bool:
     return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 
@@ -113,9 +148,48 @@ def _validate_policy_path(policy_path: Optional[str]) -> Optional[str]:
     return str(resolved)
 
 
+def _load_request_policy(policy_path: Optional[str]) -> CompiledPolicy:
+    """Validate *policy_path* and load it, defaulting to policies/company_default.json.
+
+    load_policy caches the compiled policy per path/mtime, so this costs a
+    single ``stat`` per request once the policy has been read.
+    """
+    validated = _validate_policy_path(policy_path)
+    if not validated:
+        default_policy = PROJECT_ROOT / "policies" / "company_default.json"
+        if default_policy.exists():
+            validated = str(default_policy)
+    return load_policy(validated)
+
+
 # --- C-03: Upload Validation ---
 _MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
 _MAX_BATCH_FILES = 20
+_BATCH_ITEM_TIMEOUT = 30.0  # 1ファイルあたりの処理タイムアウト（秒）
+_BATCH_STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+_REQUEST_DEADLINE_DEFAULT = 60.0  # /classify・/classify_pdf 全体の処理時間上限（秒）
+
+
+def _start_request_deadline(name: str = "REQUEST_DEADLINE_SECONDS", default: float = _REQUEST_DEADLINE_DEFAULT) -> Deadline:
+    """Create this request's deadline and make it current (0 以下で無期限)。
+
+    リクエストごとに別タスク（別コンテキスト）で処理されるため、ここで設定した期限は
+    他のリクエストに漏れない。各ステージは core.deadline.current_deadline() で参照する。
+    """
+    deadline = Deadline(_float_env(name, default))
+    set_deadline(deadline)
+    return deadline
+
+
+def _deadline_exceeded_http(e: DeadlineExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=504,
+        detail={
+            "error": "DEADLINE_EXCEEDED",
+            "message": f"Processing time limit reached during {e.stage}",
+            "how_to_enable": None,
+        },
+    )
 
 
 async def _validate_pdf_upload(file: UploadFile) -> bytes:
@@ -139,6 +213,172 @@ async def _validate_pdf_upload(file: UploadFile) -> bytes:
     return content
 
 
+def _slice_pdf_pages(
+    pdf_path: Path,
+    start_page: Optional[int],
+    end_page: Optional[int],
+) -> Tuple[Path, int]:
+    """指定ページ範囲（1始まり）だけを含む一時PDFを作成する（ブロッキング処理）。
+
+    Returns:
+        (切り出したPDFのパス, 元PDFの総ページ数)
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "PYMUPDF_NOT_INSTALLED",
+                "message": "PyMuPDF (fitz) is required for page range extraction",
+            },
+        )
+
+    doc = fitz.open(pdf_path)
+    try:
+        total_pages = len(doc)
+
+        # デフォルト値の設定（1始まり → 0始まりに変換）
+        actual_start = (start_page - 1) if start_page is not None else 0
+        actual_end = (end_page - 1) if end_page is not None else (total_pages - 1)
+
+        # バリデーション
+        if actual_start < 0:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "INVALID_PAGE_RANGE",
+                    "message": "start_page must be >= 1",
+                },
+            )
+        if actual_end >= total_pages:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "INVALID_PAGE_RANGE",
+                    "message": f"end_page ({end_page}) exceeds total pages ({total_pages})",
+                },
+            )
+        if actual_start > actual_end:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "INVALID_PAGE_RANGE",
+                    "message": "start_page must be <= end_page",
+                },
+            )
+
+        # 指定ページのみを含む新しいPDFを作成
+        new_doc = fitz.open()
+        try:
+            new_doc.insert_pdf(doc, from_page=actual_start, to_page=actual_end)
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as extracted_tmp:
+                extracted_pdf_path = Path(extracted_tmp.name)
+            new_doc.save(str(extracted_pdf_path))
+        finally:
+            new_doc.close()
+    finally:
+        doc.close()
+    return extracted_pdf_path, total_pages
+
+
+def _write_temp_pdf(content: bytes) -> Path:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        tmp_file.write(content)
+    return Path(tmp_file.name)
+
+
+def _remove_temp_files(*paths: Optional[Path]) -> None:
+    for path in paths:
+        if path and path.exists():
+            path.unlink()
+
+
+async def _extract_sharded(
+    pdf_path: Path,
+    shards: List[Tuple[int, int]],
+    options: Dict[str, Any],
+) -> Dict[str, Any]:
+    """ページ単位のシャードを共有の抽出プール（run_cpu）に投入し、ページ順に結合する。
+
+    ワーカー内で別のプロセスプールを作らない（入れ子にするとプロセス数が
+    EXTRACT_WORKERS × PDF_PAGE_WORKERS になり、終了時にも回収されない）。
+    1リクエストが同時に占有するワーカーは PDF_PAGE_WORKERS まで。
+    """
+    limit = asyncio.Semaphore(max(1, _int_env("PDF_PAGE_WORKERS", 1)))
+
+    async def _run_shard(first: int, last: int) -> List[Any]:
+        async with limit:
+            return await run_cpu(
+                extract_page_shard, str(pdf_path), first, last, options["ocr_threshold"], options["use_ocr"]
+            )
+
+    shard_results = await asyncio.gather(*(_run_shard(first, last) for first, last in shards))
+    return await run_io(merge_page_shards, pdf_path, shard_results)
+
+
+async def _extract_upload(
+    content: bytes,
+    trace_steps: List[str],
+    force_gemini: bool,
+    start_page: Optional[int] = None,
+    end_page: Optional[int] = None,
+) -> Dict[str, Any]:
+    """アップロードPDFを抽出する（PDFの sha256 + 抽出オプションをキーにキャッシュ）。
+
+    キャッシュの参照はこのプロセス内で行い、ミス時のみ一時ファイルに書き出して
+    プロセスプールで extract_pdf を実行する。キャッシュ（ディスク層の JSON 読み書き・
+    退避）と一時ファイルの読み書きは I/O プールで行い、イベントループを止めない。
+    """
+    options = extraction_options(use_gemini_vision=force_gemini)
+    if start_page is not None or end_page is not None:
+        options["pages"] = [start_page, end_page]
+    content_sha256 = hashlib.sha256(content).hexdigest()
+    cached = await run_io(extraction_cache.lookup, content_sha256, options)
+    if cached is not None:
+        trace_steps.append("extract_cache")
+        return cached
+
+    tmp_path = await run_io(_write_temp_pdf, content)
+    extracted_pdf_path: Optional[Path] = None
+    try:
+        # ページ範囲が指定された場合、該当ページのみを抽出
+        if start_page is not None or end_page is not None:
+            extracted_pdf_path, total_pages = await run_io(_slice_pdf_pages, tmp_path, start_page, end_page)
+            trace_steps.append(f"page_extract:{start_page or 1}-{end_page or total_pages}")
+
+        pdf_path = extracted_pdf_path or tmp_path
+        # ページ並列はローカル抽出のみ（Gemini Vision / DocAI は1タスクで実行）
+        shards: List[Tuple[int, int]] = []
+        if _int_env("PDF_PAGE_WORKERS", 1) > 1 and not (options["use_gemini_vision"] or options["use_docai"]):
+            shards = await run_io(plan_page_shards, pdf_path)
+
+        # プロセスプールには contextvars が渡らないため期限は時刻で渡す
+        deadline = current_deadline()
+        try:
+            if shards:
+                pending = _extract_sharded(pdf_path, shards, options)
+            else:
+                pending = run_cpu(
+                    extract_pdf,
+                    pdf_path,
+                    use_gemini_vision=force_gemini,
+                    deadline_at=deadline.wall_time(),
+                )
+            extraction = await asyncio.wait_for(pending, timeout=deadline.timeout())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("extract")
+        trace_steps.append("extract_gemini" if force_gemini else "extract")
+    finally:
+        # Clean up temporary files
+        await run_io(_remove_temp_files, tmp_path, extracted_pdf_path)
+
+    # 期限切れで Gemini Vision / DocAI を省略した結果はキャッシュしない（次回は予算があるかもしれない）
+    if not any(w.get("code") == DEADLINE_SKIPPED_CODE for w in extraction.get("meta", {}).get("warnings", [])):
+        await run_io(extraction_cache.store, content_sha256, options, extraction)
+    return extraction
+
+
 def _get_guidance_citations(
     classified: Dict[str, Any],
     missing_fields: List[str],
@@ -248,7 +488,7 @@ class ClassifyResponse(BaseModel):
     why_missing_matters: List[str]
     # Google Cloud: Legal citations (Vertex AI Search)
     citations: List[Dict[str, Any]] = []
-    # 耐用年数判定（CAPITAL_LIKEの場合のみ）
+    # 耐用年数判定（CAPITAL_LIKEの場合のみ。明細ごとの結果は line_items[].useful_life）
     useful_life: Optional[Dict[str, Any]] = None
     # 明細一覧（UIで金額・内容を表示用）
     line_items: List[Dict[str, Any]] = []
@@ -272,36 +512,55 @@ def _add_ai_hints_for_guidance(
 ) -> None:
     """GUIDANCE明細にAI参考判定(ai_hint)を付与する（in-place更新）。
 
-    Phase 1: Gemini APIで参考判定を取得（15秒タイムアウト）。
+    Phase 1: Gemini APIで参考判定を取得（8秒タイムアウト）。
     Phase 2 (fallback): flagsからヒューリスティックに推定。
     """
+    _apply_ai_hints(classified, _compute_ai_hints(classified), trace_steps)
+
+
+def _apply_ai_hints(
+    classified: Dict[str, Any],
+    outcome: Tuple[Dict[int, Dict[str, Any]], List[str]],
+    trace_steps: List[str],
+) -> None:
+    """Write hints from :func:`_compute_ai_hints` onto the line items."""
+    hints, steps = outcome
     line_items = classified.get("line_items", [])
-    guidance_items = [
-        item for item in line_items
+    for index, hint in hints.items():
+        line_items[index]["ai_hint"] = hint
+    trace_steps.extend(steps)
+
+
+def _compute_ai_hints(
+    classified: Dict[str, Any],
+    use_gemini: bool = True,
+) -> Tuple[Dict[int, Dict[str, Any]], List[str]]:
+    """Compute ai_hint for GUIDANCE items without touching ``classified``.
+
+    ワーカースレッドで実行されタイムアウト後も走り続けることがあるため、明細は
+    書き換えずに ``({line_items の index: ai_hint}, trace_steps)`` を返す。
+    """
+    line_items = classified.get("line_items", [])
+    guidance = [
+        (index, item) for index, item in enumerate(line_items)
         if isinstance(item, dict) and item.get("classification") == "GUIDANCE"
     ]
-    if not guidance_items:
-        return
+    hints: Dict[int, Dict[str, Any]] = {}
+    steps: List[str] = []
+    if not guidance:
+        return hints, steps
 
     # Phase 1: Gemini APIで参考判定
     gemini_succeeded = False
-    if GEMINI_ENABLED and GEMINI_AVAILABLE:
+    if use_gemini and GEMINI_ENABLED and GEMINI_AVAILABLE and current_deadline().has(min_remote_seconds()):
         try:
-            from google import genai
             from google.genai import types
 
-            api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-            if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-                client = genai.Client(http_options=types.HttpOptions(timeout=8_000))
-            elif api_key:
-                client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=8_000))
-            else:
-                client = None
-
+            client = get_client()
             if client:
                 items_text = "\n".join(
                     f"- {item.get('description', '')} ({item.get('amount', 0):,}円)"
-                    for item in guidance_items
+                    for _, item in guidance
                 )
                 prompt = (
                     "以下の明細について、固定資産(CAPITAL_LIKE)か経費(EXPENSE_LIKE)か参考判定してください。\n"
@@ -316,30 +575,31 @@ def _add_ai_hints_for_guidance(
                     config=types.GenerateContentConfig(
                         response_mime_type="application/json",
                         temperature=0.1,
+                        http_options=http_options(current_deadline().timeout_ms(8_000)),
                     ),
                 )
-                hints = json.loads(response.text)
-                if not isinstance(hints, list):
-                    hints = [hints]
+                raw_hints = json.loads(response.text)
+                if not isinstance(raw_hints, list):
+                    raw_hints = [raw_hints]
 
-                hints_by_desc = {h.get("description", ""): h for h in hints if isinstance(h, dict)}
-                for i, item in enumerate(guidance_items):
+                hints_by_desc = {h.get("description", ""): h for h in raw_hints if isinstance(h, dict)}
+                for i, (index, item) in enumerate(guidance):
                     h = None
-                    if i < len(hints) and isinstance(hints[i], dict):
-                        h = hints[i]
+                    if i < len(raw_hints) and isinstance(raw_hints[i], dict):
+                        h = raw_hints[i]
                     elif item.get("description") and item["description"] in hints_by_desc:
                         h = hints_by_desc[item["description"]]
 
                     if h:
                         suggestion = h.get("suggestion", "GUIDANCE")
-                        item["ai_hint"] = {
+                        hints[index] = {
                             "suggestion": suggestion,
                             "suggestion_label": _AI_HINT_LABEL.get(suggestion, "不明"),
                             "confidence": h.get("confidence", 0.5),
                             "reasoning": h.get("reasoning", ""),
                         }
                 gemini_succeeded = True
-                trace_steps.append("ai_hint")
+                steps.append("ai_hint")
         except Exception as e:
             logger.warning("AI hint (Gemini) failed, using heuristic fallback: %s", e)
 
@@ -349,38 +609,38 @@ def _add_ai_hints_for_guidance(
         # 既にclassify_line_itemで分析されたflagsから推定
         _EXPENSE_FLAGS = {"撤去", "廃棄", "処分", "解体", "除却", "原状回復"}
         _CAPITAL_FLAGS = {"新設", "設置", "導入", "構築", "整備", "購入", "増設", "改修"}
-        for item in guidance_items:
-            if item.get("ai_hint"):
+        for index, item in guidance:
+            if index in hints or item.get("ai_hint"):
                 continue  # Already set by Gemini
             desc = item.get("description", "")
-            flags = item.get("flags", [])
             # flagsからキーワード推定
             has_expense_kw = any(kw in desc for kw in _EXPENSE_FLAGS)
             has_capital_kw = any(kw in desc for kw in _CAPITAL_FLAGS)
             if has_expense_kw and not has_capital_kw:
-                item["ai_hint"] = {
+                hints[index] = {
                     "suggestion": schema.EXPENSE_LIKE,
                     "suggestion_label": "費用寄り",
                     "confidence": 0.6,
                     "reasoning": "「" + "・".join(kw for kw in _EXPENSE_FLAGS if kw in desc) + "」を含むため費用の可能性",
                 }
             elif has_capital_kw and not has_expense_kw:
-                item["ai_hint"] = {
+                hints[index] = {
                     "suggestion": schema.CAPITAL_LIKE,
                     "suggestion_label": "資産寄り",
                     "confidence": 0.6,
                     "reasoning": "「" + "・".join(kw for kw in _CAPITAL_FLAGS if kw in desc) + "」を含むため資産の可能性",
                 }
             elif has_expense_kw and has_capital_kw:
-                item["ai_hint"] = {
+                hints[index] = {
                     "suggestion": "GUIDANCE",
                     "suggestion_label": "判定困難",
                     "confidence": 0.3,
                     "reasoning": "資産・費用の両方のキーワードが混在",
                 }
             # キーワードなしの場合はai_hintなし（情報不足）
-        if any(item.get("ai_hint") for item in guidance_items):
-            trace_steps.append("ai_hint_heuristic")
+        if hints or any(item.get("ai_hint") for _, item in guidance):
+            steps.append("ai_hint_heuristic")
+    return hints, steps
 
 
 def _format_classify_response(
@@ -622,6 +882,8 @@ def _format_classify_response(
                 formatted_item["flags"] = item["flags"]
             if item.get("ai_hint"):
                 formatted_item["ai_hint"] = item["ai_hint"]
+            if item.get("useful_life"):
+                formatted_item["useful_life"] = item["useful_life"]
             formatted_line_items.append(formatted_item)
 
     # 免責表示
@@ -662,9 +924,11 @@ async def startup_gemini_check():
         logger.info("Gemini disabled or unavailable, skipping startup connection test")
         return
     try:
-        from google import genai
-        client = genai.Client()
-        list(client.models.list(config={"page_size": 1}))
+        client = get_async_client()
+        if client is None:
+            raise ValueError("認証情報が未設定（Vertex AI環境変数またはAPIキー）")
+        # 共有クライアントの接続をここで確立しておく（初回リクエストのハンドシェイクを省く）
+        await client.models.list(config={"page_size": 1})
         _gemini_connection_ok = True
         logger.info("Startup Gemini connection test: SUCCESS")
     except Exception as e:
@@ -673,6 +937,12 @@ async def startup_gemini_check():
         logger.warning("Startup Gemini connection test FAILED: %s", e)
 
 
+@app.on_event("shutdown")
+async def shutdown_executor_pools():
+    """Stop the extraction / I/O worker pools."""
+    shutdown_executors()
+
+
 @app.get("/healthz")
 @app.get("/health")
 @limiter.limit("30/minute")
@@ -683,6 +953,10 @@ async def healthz(request: Request) -> Dict[str, Any]:
         "gemini_available": GEMINI_AVAILABLE,
         "gemini_enabled": GEMINI_ENABLED,
         "gemini_connected": _gemini_connection_ok,
+        "executors": executor_stats(),
+        "extraction_cache": extraction_cache.cache_stats(),
+        "gemini_cache": response_cache_stats(),
+        "genai_clients": client_stats(),
     }
 
 @app.get("/")
@@ -692,6 +966,223 @@ async def root(request: Request) -> Dict[str, str]:
     return {"message": "Fixed Asset Classification API", "version": "1.0.0"}
 
 
+# Gemini に渡す明細フィールド（ルール判定結果は渡さない）
+_GEMINI_ITEM_FIELDS = frozenset({"description", "amount", "quantity", "unit", "unit_price", "remarks"})
+
+_LABEL_JA = {
+    "CAPITAL_LIKE": "資産寄り",
+    "EXPENSE_LIKE": "費用寄り",
+    "GUIDANCE": "要確認（判定しません）",
+}
+
+
+def _gemini_context(doc_info: Dict[str, Any], item_count: int, note: str = "") -> str:
+    """Build the context string sent with line items to classify_with_gemini.
+
+    NOTE: 合計金額は渡さない（個別明細の金額で判定させるため）
+    """
+    context_parts = []
+    if doc_info.get("title"):
+        context_parts.append(f"書類タイトル: {doc_info['title']}")
+    if doc_info.get("vendor"):
+        context_parts.append(f"取引先: {doc_info['vendor']}")
+    context_parts.append(f"明細件数: {item_count}")
+    if note:
+        context_parts.append(note)
+    return "\n".join(context_parts)
+
+
+def _merge_gemini_analysis(line_items: List[Dict[str, Any]], gemini_result: Dict[str, Any]) -> None:
+    """Write Gemini's line_item_analysis onto line_items (in-place, index match first)."""
+    lia = gemini_result.get("line_item_analysis", [])
+    # Build description-based lookup for fallback matching
+    lia_by_desc = {}
+    for a in lia:
+        if isinstance(a, dict) and a.get("description"):
+            lia_by_desc[a["description"]] = a
+
+    doc_confidence = gemini_result.get("confidence", 0.0)
+    doc_flags = gemini_result.get("flags", [])
+    for i, item in enumerate(line_items):
+        # Index-based match first, description-based fallback
+        analysis = None
+        if i < len(lia) and isinstance(lia[i], dict):
+            analysis = lia[i]
+        elif item.get("description") and item["description"] in lia_by_desc:
+            analysis = lia_by_desc[item["description"]]
+
+        if analysis:
+            item["classification"] = analysis.get("classification", "GUIDANCE")
+            item["included_in_acquisition_cost"] = analysis.get("included_in_acquisition_cost", False)
+            item["rationale_ja"] = analysis.get("reason", "")
+            # Per-item confidence/flags, fallback to document-level
+            item["confidence"] = analysis.get("confidence", doc_confidence)
+            item["flags"] = analysis.get("flags", doc_flags)
+        else:
+            item["classification"] = "GUIDANCE"
+            item["rationale_ja"] = ""
+            item["confidence"] = doc_confidence
+            item["flags"] = doc_flags
+        item["label_ja"] = _LABEL_JA.get(item["classification"], "要確認")
+
+
+async def _classify_cascade(
+    normalized: Dict[str, Any],
+    policy: Any,
+    trace_steps: List[str],
+) -> Tuple[Dict[str, Any], bool]:
+    """Rules first; only GUIDANCE / low-confidence items are sent to Gemini.
+
+    ルールで CAPITAL_LIKE / EXPENSE_LIKE かつ確信度が GEMINI_CASCADE_MIN_CONFIDENCE
+    （既定 0.85）以上の明細はそのまま採用する。Gemini が失敗した場合はルール結果を
+    そのまま返す（AI参考判定は呼び出し側の :func:`_enrich` で付与する）。
+
+    Returns:
+        (classified document, whether Gemini results were merged)
+    """
+    classified = classify_document(normalized, policy)
+    trace_steps.append("rules")
+    threshold = _float_env("GEMINI_CASCADE_MIN_CONFIDENCE", 0.85)
+    line_items = classified.get("line_items", [])
+    uncertain = [
+        item for item in line_items
+        if isinstance(item, dict)
+        and (item.get("classification") == "GUIDANCE" or float(item.get("confidence") or 0.0) < threshold)
+    ]
+    if not uncertain:
+        trace_steps.append("cascade_rules_only")
+        return classified, False
+
+    trace_steps.append("gemini")
+    doc_info = classified.get("document_info", {})
+    note = f"（全{len(line_items)}件中、ルールで判定できなかった{len(uncertain)}件のみ）"
+    try:
+        gemini_result = await run_io(
+            classify_with_gemini,
+            [{k: v for k, v in item.items() if k in _GEMINI_ITEM_FIELDS} for item in uncertain],
+            _gemini_context(doc_info, len(uncertain), note),
+            document_info={"title": doc_info.get("title", ""), "vendor": doc_info.get("vendor", "")},
+        )
+    except Exception as e:
+        logger.exception("Gemini cascade call failed, keeping rule-based results: %s", e)
+        gemini_result = {}
+
+    if not gemini_result.get("line_item_analysis"):
+        trace_steps.append("gemini_fallback")
+        return classified, False
+
+    _merge_gemini_analysis(uncertain, gemini_result)
+    # 合計額はルール確定分を含まないため gemini_*_total は設定しない（明細から再計算される）
+    classified["gemini_decision"] = gemini_result.get("decision", "GUIDANCE")
+    classified["gemini_confidence_document"] = gemini_result.get("confidence", 0.0)
+    classified["gemini_missing_fields"] = gemini_result.get("missing_fields", [])
+    classified["gemini_why_missing_matters"] = gemini_result.get("why_missing_matters", [])
+    trace_steps.append(f"cascade_gemini:{len(uncertain)}/{len(line_items)}")
+    return classified, True
+
+
+async def _enrich_step(name: str, cap: float, fn: Any, *args: Any, **kwargs: Any) -> Tuple[bool, Any]:
+    """Run one enrichment lookup on the I/O pool with its own timeout.
+
+    タイムアウトは ``cap`` 秒とリクエストの残り時間（core.deadline）の短い方。
+
+    Returns:
+        (succeeded, value) — タイムアウト・例外時は (False, None)。スレッド自体は
+        止められないため、``fn`` は引数を書き換えない純粋な関数であること。
+    """
+    timeout = current_deadline().timeout(cap)
+    try:
+        return True, await asyncio.wait_for(run_io(fn, *args, **kwargs), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Enrichment step %s timed out after %.1fs", name, timeout)
+    except Exception as e:
+        logger.warning("Enrichment step %s failed: %s", name, e)
+    return False, None
+
+
+async def _enrich(
+    classified: Dict[str, Any],
+    initial_response: ClassifyResponse,
+    trace_steps: List[str],
+    *,
+    hints: bool,
+    useful_life: bool,
+    gemini_used: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """AI参考判定・法令検索・耐用年数判定を並行実行する。
+
+    3つとも分類結果を読むだけで互いに依存しないため、直列に待つと各外部 API の
+    レイテンシが足し算になる。ここでは必要なものだけを同時に起動し、それぞれ
+    ENRICH_*_TIMEOUT 秒（リクエストの残り時間がそれより短ければ残り時間）で打ち切る
+    （遅い1件がリクエスト全体を止めない）。
+    結果の反映（ai_hint・明細ごとの useful_life の付与、trace の追記）は順序を固定して
+    ここでまとめて行う。
+
+    Returns:
+        (citations, useful_life_result) — useful_life_result は最初の CAPITAL_LIKE 明細の結果
+    """
+    line_items = classified.get("line_items", [])
+    tasks: Dict[str, Any] = {}
+
+    if hints and any(
+        isinstance(item, dict) and item.get("classification") == "GUIDANCE" for item in line_items
+    ):
+        tasks["ai_hint"] = _enrich_step(
+            "ai_hint", _float_env("ENRICH_HINTS_TIMEOUT", 10.0), _compute_ai_hints, classified,
+        )
+
+    if initial_response.decision == "GUIDANCE":
+        tasks["vertex_search"] = _enrich_step(
+            "vertex_search",
+            _float_env("ENRICH_CITATIONS_TIMEOUT", 10.0),
+            _get_guidance_citations,
+            classified,
+            missing_fields=initial_response.missing_fields,
+            gemini_used=gemini_used,
+        )
+
+    # 耐用年数判定（CAPITAL_LIKEの場合のみ、全CAPITAL_LIKE明細をまとめて1回で推定）
+    capital_indexes: List[int] = []
+    if useful_life and USEFUL_LIFE_AVAILABLE and initial_response.decision == "CAPITAL_LIKE":
+        capital_indexes = [
+            index for index, item in enumerate(line_items)
+            if isinstance(item, dict) and item.get("classification") == "CAPITAL_LIKE"
+        ]
+        if capital_indexes:
+            tasks["useful_life"] = _enrich_step(
+                "useful_life",
+                _float_env("ENRICH_USEFUL_LIFE_TIMEOUT", 20.0),
+                estimate_useful_life_batch,
+                [{"description": line_items[index].get("description", "")} for index in capital_indexes],
+            )
+
+    results = dict(zip(tasks, await asyncio.gather(*tasks.values()))) if tasks else {}
+
+    if "ai_hint" in results:
+        ok, outcome = results["ai_hint"]
+        if not ok:
+            # Gemini が間に合わなければヒューリスティック推定だけ付ける
+            outcome = _compute_ai_hints(classified, use_gemini=False)
+        _apply_ai_hints(classified, outcome, trace_steps)
+
+    citations: List[Dict[str, Any]] = []
+    ok, value = results.get("vertex_search", (False, None))
+    if ok and value:
+        citations = value
+        trace_steps.append("vertex_search")
+
+    useful_life_result: Optional[Dict[str, Any]] = None
+    ok, value = results.get("useful_life", (False, None))
+    if ok and value:
+        for index, estimate in zip(capital_indexes, value):
+            line_items[index]["useful_life"] = estimate
+        useful_life_result = value[0]
+        if any(estimate.get("useful_life_years", 0) > 0 for estimate in value):
+            trace_steps.append("useful_life")
+
+    return citations, useful_life_result
+
+
 @app.post("/classify", response_model=ClassifyResponse)
 @limiter.limit("10/minute")
 async def classify(request: Request, body: ClassifyRequest, _auth: None = Depends(verify_api_key)) -> ClassifyResponse:
@@ -704,9 +1195,13 @@ async def classify(request: Request, body: ClassifyRequest, _auth: None = Depend
     Gemini Integration (GEMINI_ENABLED=1):
     - First attempts classification with Gemini API
     - Falls back to rule-based classifier on failure
+    - GEMINI_CASCADE=1: rules first, only GUIDANCE / low-confidence items go to Gemini
+    - REQUEST_DEADLINE_SECONDS (default 60): Gemini / 法令検索 / AI参考判定は残り時間内で
+      打ち切り、間に合わなければルールベース判定で返す
     """
     req_id = str(uuid.uuid4())[:8]
     logger.info("POST /classify start", extra={"request_id": req_id})
+    _start_request_deadline()
     try:
         trace_steps = ["extract"]
         # Use existing pipeline functions
@@ -717,78 +1212,36 @@ async def classify(request: Request, body: ClassifyRequest, _auth: None = Depend
         trace_steps.append("parse")
 
         # Load policy (default to company_default.json if not provided)
-        policy_path = _validate_policy_path(body.policy_path)
-        if not policy_path:
-            default_policy = PROJECT_ROOT / "policies" / "company_default.json"
-            if default_policy.exists():
-                policy_path = str(default_policy)
-
-        policy = load_policy(policy_path)
+        policy = _load_request_policy(body.policy_path)
 
         # Classify: Gemini or rule-based
         classified = None
         gemini_used = False
 
-        if GEMINI_ENABLED and GEMINI_AVAILABLE:
+        if GEMINI_ENABLED and GEMINI_AVAILABLE and _bool_env("GEMINI_CASCADE", False):
+            # ルール優先カスケード: 確信度の低い明細だけを Gemini に送る
+            classified, gemini_used = await _classify_cascade(normalized, policy, trace_steps)
+
+        elif GEMINI_ENABLED and GEMINI_AVAILABLE:
             try:
                 trace_steps.append("gemini")
                 line_items = normalized.get("line_items", [])
                 doc_info = normalized.get("document_info", {})
-
-                # Build context string with document metadata
-                # NOTE: 合計金額は渡さない（個別明細の金額で判定させるため）
                 title = doc_info.get("title", "")
                 vendor = doc_info.get("vendor", "")
-                context_parts = []
-                if title:
-                    context_parts.append(f"書類タイトル: {title}")
-                if vendor:
-                    context_parts.append(f"取引先: {vendor}")
-                context_parts.append(f"明細件数: {len(line_items)}")
-                context_str = "\n".join(context_parts)
 
                 # Single batch call to Gemini (new SDK: list input)
-                gemini_result = classify_with_gemini(
+                gemini_result = await run_io(
+                    classify_with_gemini,
                     line_items,
-                    context_str,
+                    _gemini_context(doc_info, len(line_items)),
                     document_info={"title": title, "vendor": vendor},
                 )
+                if "deadline_exceeded" in (gemini_result.get("flags") or []):
+                    raise DeadlineExceeded("gemini")
 
                 # Merge line_item_analysis into line_items
-                lia = gemini_result.get("line_item_analysis", [])
-                # Build description-based lookup for fallback matching
-                lia_by_desc = {}
-                for a in lia:
-                    if isinstance(a, dict) and a.get("description"):
-                        lia_by_desc[a["description"]] = a
-
-                doc_confidence = gemini_result.get("confidence", 0.0)
-                doc_flags = gemini_result.get("flags", [])
-                for i, item in enumerate(line_items):
-                    # Index-based match first, description-based fallback
-                    analysis = None
-                    if i < len(lia) and isinstance(lia[i], dict):
-                        analysis = lia[i]
-                    elif item.get("description") and item["description"] in lia_by_desc:
-                        analysis = lia_by_desc[item["description"]]
-
-                    if analysis:
-                        item["classification"] = analysis.get("classification", "GUIDANCE")
-                        item["included_in_acquisition_cost"] = analysis.get("included_in_acquisition_cost", False)
-                        item["rationale_ja"] = analysis.get("reason", "")
-                        # Per-item confidence/flags, fallback to document-level
-                        item["confidence"] = analysis.get("confidence", doc_confidence)
-                        item["flags"] = analysis.get("flags", doc_flags)
-                    else:
-                        item["classification"] = "GUIDANCE"
-                        item["rationale_ja"] = ""
-                        item["confidence"] = doc_confidence
-                        item["flags"] = doc_flags
-                    item["label_ja"] = {
-                        "CAPITAL_LIKE": "資産寄り",
-                        "EXPENSE_LIKE": "費用寄り",
-                        "GUIDANCE": "要確認（判定しません）",
-                    }.get(item["classification"], "要確認")
+                _merge_gemini_analysis(line_items, gemini_result)
 
                 # Store Gemini document-level results (reference only, not used for final decision)
                 normalized["gemini_decision"] = gemini_result.get("decision", "GUIDANCE")
@@ -808,6 +1261,12 @@ async def classify(request: Request, body: ClassifyRequest, _auth: None = Depend
                 gemini_used = True
                 trace_steps.append("gemini_success")
 
+            except DeadlineExceeded:
+                # 残り時間不足で Gemini を呼ばなかった - ルールベースで返す
+                logger.warning("Gemini classification skipped (request deadline), using rule-based")
+                trace_steps.append("gemini_fallback")
+                classified = None
+
             except Exception as e:
                 # Gemini failed - fall back to rule-based
                 logger.exception("Gemini classification failed, falling back to rule-based: %s", e)
@@ -819,27 +1278,19 @@ async def classify(request: Request, body: ClassifyRequest, _auth: None = Depend
             classified = classify_document(normalized, policy)
             trace_steps.append("rules")
 
-            # AI参考判定: GUIDANCE明細がある場合、Geminiで参考判定を取得
-            _add_ai_hints_for_guidance(classified, trace_steps)
-
         # Format initial response
         initial_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
-        
-        # Google Cloud: Vertex AI Search for legal citations (GUIDANCE時に法令検索)
-        citations: List[Dict[str, Any]] = []
-        if initial_response.decision == "GUIDANCE":
-            citations = _get_guidance_citations(
-                classified,
-                missing_fields=initial_response.missing_fields,
-                gemini_used=gemini_used,
-            )
-            if citations:
-                trace_steps.append("vertex_search")
-                initial_response = _format_classify_response(
-                    classified,
-                    trace_steps=trace_steps.copy(),
-                    citations=citations,
-                )
+
+        # AI参考判定（Gemini未使用時のGUIDANCE明細）と Vertex AI Search 法令検索を並行実行
+        citations, _ = await _enrich(
+            classified, initial_response, trace_steps,
+            hints=not gemini_used, useful_life=False, gemini_used=gemini_used,
+        )
+        initial_response = _format_classify_response(
+            classified,
+            trace_steps=trace_steps.copy(),
+            citations=citations,
+        )
         
         # WIN+1: Minimal agentic loop - if GUIDANCE and answers provided, try rerun
         if initial_response.decision == "GUIDANCE" and body.answers and initial_response.missing_fields:
@@ -898,9 +1349,13 @@ async def classify_pdf(
         estimate_useful_life_flag: "1" to estimate useful life for CAPITAL_LIKE items
         start_page: 開始ページ番号（1始まり、オプショナル）
         end_page: 終了ページ番号（1始まり、オプショナル）
+
+    処理全体の上限は REQUEST_DEADLINE_SECONDS（既定 60秒）。Gemini Vision / 法令検索 /
+    耐用年数推定は残り時間内で打ち切り、抽出自体が間に合わない場合は 504 を返す。
     """
     req_id = str(uuid.uuid4())[:8]
     logger.info("POST /classify_pdf start file=%s", file.filename, extra={"request_id": req_id})
+    _start_request_deadline()
 
     # Feature flag check
     if not _bool_env("PDF_CLASSIFY_ENABLED", False):
@@ -917,178 +1372,65 @@ async def classify_pdf(
     try:
         trace_steps = ["pdf_upload"]
 
-        # Validate and save uploaded PDF to temporary file
+        # Validate uploaded PDF
         content = await _validate_pdf_upload(file)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_path = Path(tmp_file.name)
-            tmp_path.write_bytes(content)
 
-        # ページ範囲が指定された場合、該当ページのみを抽出
-        extracted_pdf_path: Optional[Path] = None
-        if start_page is not None or end_page is not None:
-            try:
-                import fitz  # PyMuPDF
-
-                doc = fitz.open(tmp_path)
-                total_pages = len(doc)
-
-                # デフォルト値の設定（1始まり → 0始まりに変換）
-                actual_start = (start_page - 1) if start_page is not None else 0
-                actual_end = (end_page - 1) if end_page is not None else (total_pages - 1)
-
-                # バリデーション
-                if actual_start < 0:
-                    doc.close()
-                    raise HTTPException(
-                        status_code=400,
-                        detail={
-                            "error": "INVALID_PAGE_RANGE",
-                            "message": "start_page must be >= 1",
-                        },
-                    )
-                if actual_end >= total_pages:
-                    doc.close()
-                    raise HTTPException(
-                        status_code=400,
-                        detail={
-                            "error": "INVALID_PAGE_RANGE",
-                            "message": f"end_page ({end_page}) exceeds total pages ({total_pages})",
-                        },
-                    )
-                if actual_start > actual_end:
-                    doc.close()
-                    raise HTTPException(
-                        status_code=400,
-                        detail={
-                            "error": "INVALID_PAGE_RANGE",
-                            "message": "start_page must be <= end_page",
-                        },
-                    )
-
-                # 指定ページのみを含む新しいPDFを作成
-                new_doc = fitz.open()
-                for page_num in range(actual_start, actual_end + 1):
-                    new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
-
-                # 一時ファイルに保存
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as extracted_tmp:
-                    extracted_pdf_path = Path(extracted_tmp.name)
-                    new_doc.save(str(extracted_pdf_path))
-
-                new_doc.close()
-                doc.close()
-
-                trace_steps.append(f"page_extract:{start_page or 1}-{end_page or total_pages}")
-
-            except ImportError:
-                raise HTTPException(
-                    status_code=500,
-                    detail={
-                        "error": "PYMUPDF_NOT_INSTALLED",
-                        "message": "PyMuPDF (fitz) is required for page range extraction",
-                    },
-                )
+        # Extract PDF (sha256 + 抽出オプションでキャッシュ。ページ範囲指定時は該当ページのみ)
+        # Pass use_gemini_vision flag if requested via query param
+        force_gemini = use_gemini_vision == "1"
+        extraction = await _extract_upload(content, trace_steps, force_gemini, start_page, end_page)
 
-        # 処理対象のPDFパスを決定
-        pdf_to_process = extracted_pdf_path if extracted_pdf_path else tmp_path
+        # Convert extraction to Opal-like format
+        opal_like = extraction_to_opal(extraction)
+        trace_steps.append("extraction_to_opal")
+        
+        # Normalize using adapter
+        normalized = adapt_opal_to_v1(opal_like)
+        trace_steps.append("parse")
+        
+        # Load policy
+        policy = _load_request_policy(policy_path)
+        
+        # Classify
+        classified = classify_document(normalized, policy)
+        trace_steps.append("rules")
 
-        try:
-            # Extract PDF using core functions (core/* not modified, only imported)
-            # Pass use_gemini_vision flag if requested via query param
-            force_gemini = use_gemini_vision == "1"
-            extraction = extract_pdf(pdf_to_process, use_gemini_vision=force_gemini)
-            trace_steps.append("extract_gemini" if force_gemini else "extract")
-            
-            # Convert extraction to Opal-like format
-            opal_like = extraction_to_opal(extraction)
-            trace_steps.append("extraction_to_opal")
-            
-            # Normalize using adapter
-            normalized = adapt_opal_to_v1(opal_like)
-            trace_steps.append("parse")
-            
-            # Load policy
-            validated_policy_path = _validate_policy_path(policy_path)
-            if not validated_policy_path:
-                default_policy = PROJECT_ROOT / "policies" / "company_default.json"
-                if default_policy.exists():
-                    validated_policy_path = str(default_policy)
-
-            policy = load_policy(validated_policy_path)
-            
-            # Classify
-            classified = classify_document(normalized, policy)
-            trace_steps.append("rules")
+        # Add warnings from extraction
+        warnings = extraction.get("meta", {}).get("warnings", [])
+        if warnings:
+            if "warnings" not in classified:
+                classified["warnings"] = []
+            classified["warnings"].extend(warnings)
+        
+        # Format response (same as /classify)
+        initial_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
 
-            # AI参考判定: GUIDANCE明細がある場合、Geminiで参考判定を取得
-            _add_ai_hints_for_guidance(classified, trace_steps)
-
-            # Add warnings from extraction
-            warnings = extraction.get("meta", {}).get("warnings", [])
-            if warnings:
-                if "warnings" not in classified:
-                    classified["warnings"] = []
-                classified["warnings"].extend(warnings)
-            
-            # Format response (same as /classify)
-            initial_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
-            
-            # Google Cloud: Vertex AI Search citations (GUIDANCE時に法令検索)
-            citations: List[Dict[str, Any]] = []
-            if initial_response.decision == "GUIDANCE":
-                citations = _get_guidance_citations(
-                    classified,
-                    missing_fields=initial_response.missing_fields,
-                )
-                if citations:
-                    trace_steps.append("vertex_search")
-                    initial_response = _format_classify_response(
-                        classified,
-                        trace_steps=trace_steps.copy(),
-                        citations=citations,
-                    )
-            
-            # 耐用年数判定（CAPITAL_LIKEの場合のみ、フラグ有効時）
-            useful_life_result: Optional[Dict[str, Any]] = None
-            should_estimate = (
-                estimate_useful_life_flag == "1" or
-                _bool_env("USEFUL_LIFE_ENABLED", False)
-            )
-            if should_estimate and USEFUL_LIFE_AVAILABLE:
-                # 判定結果を先に取得
-                temp_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
-                if temp_response.decision == "CAPITAL_LIKE":
-                    # 最初のCAPITAL_LIKE明細のdescriptionで耐用年数を判定
-                    capital_items = [
-                        item for item in classified.get("line_items", [])
-                        if isinstance(item, dict) and item.get("classification") == "CAPITAL_LIKE"
-                    ]
-                    if capital_items:
-                        desc = capital_items[0].get("description", "")
-                        useful_life_result = estimate_useful_life(desc)
-                        if useful_life_result and useful_life_result.get("useful_life_years", 0) > 0:
-                            trace_steps.append("useful_life")
-
-            trace_steps.append("format")
-            response = _format_classify_response(
-                classified,
-                trace_steps=trace_steps,
-                citations=citations,
-                useful_life=useful_life_result,
-            )
-            logger.info("POST /classify_pdf done decision=%s file=%s", response.decision, file.filename, extra={"request_id": req_id})
-            return response
+        # AI参考判定・Vertex AI Search 法令検索・耐用年数判定（CAPITAL_LIKE、フラグ有効時）を並行実行
+        should_estimate = (
+            estimate_useful_life_flag == "1" or
+            _bool_env("USEFUL_LIFE_ENABLED", False)
+        )
+        citations, useful_life_result = await _enrich(
+            classified, initial_response, trace_steps,
+            hints=True, useful_life=should_estimate,
+        )
 
-        finally:
-            # Clean up temporary files
-            if tmp_path.exists():
-                tmp_path.unlink()
-            if extracted_pdf_path and extracted_pdf_path.exists():
-                extracted_pdf_path.unlink()
+        trace_steps.append("format")
+        response = _format_classify_response(
+            classified,
+            trace_steps=trace_steps,
+            citations=citations,
+            useful_life=useful_life_result,
+        )
+        logger.info("POST /classify_pdf done decision=%s file=%s", response.decision, file.filename, extra={"request_id": req_id})
+        return response
 
     except HTTPException:
         # Re-raise HTTPException (validation errors) without wrapping
         raise
+    except DeadlineExceeded as e:
+        logger.warning("POST /classify_pdf deadline exceeded: %s", e, extra={"request_id": req_id})
+        raise _deadline_exceeded_http(e)
     except ValueError as e:
         logger.error("POST /classify_pdf ValueError: %s", e, extra={"request_id": req_id})
         raise HTTPException(
@@ -1129,6 +1471,14 @@ class BatchResponse(BaseModel):
     failed: int
 
 
+def _format_batch_event(mode: str, event: str, payload: Dict[str, Any]) -> str:
+    """ストリーミング応答の1イベントを NDJSON 行または SSE フレームに整形する。"""
+    data = json.dumps(payload, ensure_ascii=False)
+    if mode == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return json.dumps({"type": event, **payload}, ensure_ascii=False) + "\n"
+
+
 @app.post("/classify_batch", response_model=BatchResponse)
 @limiter.limit("5/minute")
 async def classify_batch(
@@ -1137,13 +1487,14 @@ async def classify_batch(
     policy_path: Optional[str] = None,
     use_gemini_vision: Optional[str] = None,
     estimate_useful_life_flag: Optional[str] = None,
+    stream: Optional[str] = None,
     _auth: None = Depends(verify_api_key),
-) -> BatchResponse:
+) -> Union[BatchResponse, StreamingResponse]:
     """
     Classify multiple PDF files in batch.
 
-    複数のPDFファイルを一括でアップロードし、順次処理する。
-    エラーが発生したファイルはスキップして続行する。
+    複数のPDFファイルを一括でアップロードし、BATCH_CONCURRENCY（既定4）件ずつ並行処理する。
+    エラーが発生したファイルはスキップして続行する。結果はアップロード順に並ぶ。
 
     Feature-flagged: Only active when PDF_CLASSIFY_ENABLED=1.
 
@@ -1151,11 +1502,14 @@ async def classify_batch(
         policy_path: Path to policy file (optional)
         use_gemini_vision: "1" to force Gemini Vision extraction
         estimate_useful_life_flag: "1" to estimate useful life for CAPITAL_LIKE items
+        stream: "ndjson" or "sse" to emit each BatchResultItem as soon as it
+            finishes (``{"type": "result", "index": i, ...}``), followed by a
+            ``summary`` event with total/success/failed
 
     Returns:
         BatchResponse with results for each file and summary counts
+        (or a streaming response when ``stream`` is set)
     """
-    import asyncio
 
     # Feature flag check (same as classify_pdf)
     if not _bool_env("PDF_CLASSIFY_ENABLED", False):
@@ -1176,71 +1530,120 @@ async def classify_batch(
             detail=f"Too many files: {len(files)}. Maximum is {_MAX_BATCH_FILES}.",
         )
 
-    results: List[BatchResultItem] = []
-    success_count = 0
-    failed_count = 0
+    if stream is not None and stream not in _BATCH_STREAM_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid stream mode: {stream}. Use 'ndjson' or 'sse'.",
+        )
 
+    # アップロード内容はここで読み切る（ストリーミング応答中にリクエストのファイルが閉じられるため）
+    prepared: List[Tuple[str, Optional[bytes], Optional[HTTPException]]] = []
     for upload_file in files:
         filename = upload_file.filename or "unknown.pdf"
-
         try:
-            # タイムアウト30秒で処理
-            result = await asyncio.wait_for(
-                _process_single_pdf(
-                    upload_file,
-                    policy_path,
-                    use_gemini_vision,
-                    estimate_useful_life_flag,
-                ),
-                timeout=30.0,
-            )
+            prepared.append((filename, await _validate_pdf_upload(upload_file), None))
+        except HTTPException as e:
+            prepared.append((filename, None, e))
+
+    semaphore = asyncio.Semaphore(max(1, _int_env("BATCH_CONCURRENCY", 4)))
+    # バッチ全体の期限（既定は無期限。ファイルごとの上限は _BATCH_ITEM_TIMEOUT）
+    batch_deadline = _start_request_deadline("BATCH_DEADLINE_SECONDS", 0.0)
+
+    async def run_one(
+        index: int,
+        filename: str,
+        content: Optional[bytes],
+        upload_error: Optional[HTTPException],
+    ) -> Tuple[int, BatchResultItem]:
+        if upload_error is not None:
+            return index, BatchResultItem(filename=filename, success=False, error=str(upload_error.detail))
+
+        async with semaphore:
+            # 1ファイル30秒（バッチ全体の期限が先に来ればそちら）。セマフォ待ちの時間は含めない。
+            # 各ファイルは別タスク（別コンテキスト）なので期限はファイルごとに独立する
+            item_deadline = batch_deadline.child(_BATCH_ITEM_TIMEOUT)
+            set_deadline(item_deadline)
+            try:
+                result = await asyncio.wait_for(
+                    _process_single_pdf(
+                        content,
+                        policy_path,
+                        use_gemini_vision,
+                        estimate_useful_life_flag,
+                    ),
+                    timeout=item_deadline.timeout(),
+                )
+                return index, BatchResultItem(
+                    filename=filename,
+                    success=True,
+                    decision=result.decision,
+                    confidence=result.confidence,
+                    reasons=result.reasons[:3],  # 最初の3つの理由のみ
+                )
 
-            results.append(BatchResultItem(
-                filename=filename,
-                success=True,
-                decision=result.decision,
-                confidence=result.confidence,
-                reasons=result.reasons[:3],  # 最初の3つの理由のみ
-            ))
-            success_count += 1
+            except asyncio.TimeoutError:  # DeadlineExceeded（抽出が間に合わない）を含む
+                return index, BatchResultItem(
+                    filename=filename,
+                    success=False,
+                    error=f"処理がタイムアウトしました（{_BATCH_ITEM_TIMEOUT:.0f}秒）"
+                    if not batch_deadline.expired else "バッチ全体の処理時間上限に達しました",
+                )
 
-        except asyncio.TimeoutError:
-            results.append(BatchResultItem(
-                filename=filename,
-                success=False,
-                error="処理がタイムアウトしました（30秒）",
-            ))
-            failed_count += 1
+            except HTTPException as e:
+                # HTTPExceptionの詳細メッセージを抽出
+                error_msg = str(e.detail) if hasattr(e, 'detail') else str(e)
+                return index, BatchResultItem(
+                    filename=filename,
+                    success=False,
+                    error=error_msg,
+                )
 
-        except HTTPException as e:
-            # HTTPExceptionの詳細メッセージを抽出
-            error_msg = str(e.detail) if hasattr(e, 'detail') else str(e)
-            results.append(BatchResultItem(
-                filename=filename,
-                success=False,
-                error=error_msg,
-            ))
-            failed_count += 1
+            except Exception as e:
+                logger.exception("Batch item '%s' failed unexpectedly: %s", filename, e)
+                return index, BatchResultItem(
+                    filename=filename,
+                    success=False,
+                    error=f"処理中にエラーが発生: {str(e)}",
+                )
 
-        except Exception as e:
-            logger.exception("Batch item '%s' failed unexpectedly: %s", filename, e)
-            results.append(BatchResultItem(
-                filename=filename,
-                success=False,
-                error=f"処理中にエラーが発生: {str(e)}",
-            ))
-            failed_count += 1
-
-    return BatchResponse(
-        results=results,
-        total=len(files),
-        success=success_count,
-        failed=failed_count,
-    )
+    tasks = [asyncio.ensure_future(run_one(i, *item)) for i, item in enumerate(prepared)]
+
+    if stream is None:
+        results = [item for _, item in await asyncio.gather(*tasks)]
+        success_count = sum(1 for r in results if r.success)
+        return BatchResponse(
+            results=results,
+            total=len(files),
+            success=success_count,
+            failed=len(results) - success_count,
+        )
+
+    async def event_stream():
+        success_count = 0
+        failed_count = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, item = await next_done
+                if item.success:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                yield _format_batch_event(stream, "result", {"index": index, **item.model_dump()})
+            yield _format_batch_event(
+                stream,
+                "summary",
+                {"total": len(files), "success": success_count, "failed": failed_count},
+            )
+        finally:
+            # クライアント切断時は残りの処理を打ち切る
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type=_BATCH_STREAM_MEDIA_TYPES[stream])
 
 
 async def _process_single_pdf(
-    file: UploadFile,
+    content: bytes,
     policy_path: Optional[str],
     use_gemini_vision: Optional[str],
     estimate_useful_life_flag: Optional[str],
@@ -1248,95 +1651,169 @@ async def _process_single_pdf(
     """
     単一PDFファイルを処理する内部関数。
     classify_pdf と同じロジックを使用。
+
+    Args:
+        content: 検証済み（_validate_pdf_upload）のPDFバイト列
     """
     trace_steps = ["pdf_upload"]
 
-    # Validate and save uploaded PDF to temporary file
-    content = await _validate_pdf_upload(file)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_path = Path(tmp_file.name)
-        tmp_path.write_bytes(content)
+    # Extract PDF (sha256 + 抽出オプションでキャッシュ)
+    force_gemini = use_gemini_vision == "1"
+    extraction = await _extract_upload(content, trace_steps, force_gemini)
 
-    try:
-        # Extract PDF using core functions
-        force_gemini = use_gemini_vision == "1"
-        extraction = extract_pdf(tmp_path, use_gemini_vision=force_gemini)
-        trace_steps.append("extract_gemini" if force_gemini else "extract")
+    # Convert extraction to Opal-like format
+    opal_like = extraction_to_opal(extraction)
+    trace_steps.append("extraction_to_opal")
 
-        # Convert extraction to Opal-like format
-        opal_like = extraction_to_opal(extraction)
-        trace_steps.append("extraction_to_opal")
+    # Normalize using adapter
+    normalized = adapt_opal_to_v1(opal_like)
+    trace_steps.append("parse")
 
-        # Normalize using adapter
-        normalized = adapt_opal_to_v1(opal_like)
-        trace_steps.append("parse")
+    # Load policy
+    policy = _load_request_policy(policy_path)
 
-        # Load policy
-        actual_policy_path = _validate_policy_path(policy_path)
-        if not actual_policy_path:
-            default_policy = PROJECT_ROOT / "policies" / "company_default.json"
-            if default_policy.exists():
-                actual_policy_path = str(default_policy)
+    # Classify
+    classified = classify_document(normalized, policy)
+    trace_steps.append("rules")
 
-        policy = load_policy(actual_policy_path)
+    # Add warnings from extraction
+    warnings = extraction.get("meta", {}).get("warnings", [])
+    if warnings:
+        if "warnings" not in classified:
+            classified["warnings"] = []
+        classified["warnings"].extend(warnings)
 
-        # Classify
-        classified = classify_document(normalized, policy)
-        trace_steps.append("rules")
+    # Format response
+    initial_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
 
-        # Add warnings from extraction
-        warnings = extraction.get("meta", {}).get("warnings", [])
-        if warnings:
-            if "warnings" not in classified:
-                classified["warnings"] = []
-            classified["warnings"].extend(warnings)
+    # Vertex AI Search 法令検索と耐用年数判定（CAPITAL_LIKEの場合のみ）を並行実行
+    should_estimate = (
+        estimate_useful_life_flag == "1" or
+        _bool_env("USEFUL_LIFE_ENABLED", False)
+    )
+    citations, useful_life_result = await _enrich(
+        classified, initial_response, trace_steps,
+        hints=False, useful_life=should_estimate,
+    )
 
-        # Format response
-        initial_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
+    trace_steps.append("format")
+    return _format_classify_response(
+        classified,
+        trace_steps=trace_steps,
+        citations=citations,
+        useful_life=useful_life_result,
+    )
 
-        # Google Cloud: Vertex AI Search citations (GUIDANCE時に法令検索)
-        citations: List[Dict[str, Any]] = []
-        if initial_response.decision == "GUIDANCE":
-            citations = _get_guidance_citations(
-                classified,
-                missing_fields=initial_response.missing_fields,
-            )
-            if citations:
-                trace_steps.append("vertex_search")
-                initial_response = _format_classify_response(
-                    classified,
-                    trace_steps=trace_steps.copy(),
-                    citations=citations,
-                )
 
-        # 耐用年数判定（CAPITAL_LIKEの場合のみ）
-        useful_life_result: Optional[Dict[str, Any]] = None
-        should_estimate = (
-            estimate_useful_life_flag == "1" or
-            _bool_env("USEFUL_LIFE_ENABLED", False)
-        )
-        if should_estimate and USEFUL_LIFE_AVAILABLE:
-            temp_response = _format_classify_response(classified, trace_steps=trace_steps.copy())
-            if temp_response.decision == "CAPITAL_LIKE":
-                capital_items = [
-                    item for item in classified.get("line_items", [])
-                    if isinstance(item, dict) and item.get("classification") == "CAPITAL_LIKE"
-                ]
-                if capital_items:
-                    desc = capital_items[0].get("description", "")
-                    useful_life_result = estimate_useful_life(desc)
-                    if useful_life_result and useful_life_result.get("useful_life_years", 0) > 0:
-                        trace_steps.append("useful_life")
+# --- 判定履歴（UI と共有する SQLite ストア） ---
 
-        trace_steps.append("format")
-        return _format_classify_response(
-            classified,
-            trace_steps=trace_steps,
-            citations=citations,
-            useful_life=useful_life_result,
-        )
+class HistoryEntry(BaseModel):
+    """履歴1件（明細単位）"""
+    description: str = ""
+    amount: Optional[float] = None
+    decision: str = ""
+    confidence: Optional[float] = None
+    category: str = ""
+    useful_life_years: Optional[int] = None
+    timestamp: Optional[str] = None
 
-    finally:
-        # Clean up temporary file
-        if tmp_path.exists():
-            tmp_path.unlink()
+
+class HistoryAppendRequest(BaseModel):
+    """1書類分の判定結果を履歴に追加するリクエスト"""
+    source: str = ""
+    vendor: str = ""
+    total_amount: Optional[float] = None
+    entries: List[HistoryEntry]
+
+
+@app.post("/history")
+@limiter.limit("30/minute")
+async def append_history(
+    request: Request, body: HistoryAppendRequest, _auth: None = Depends(verify_api_key),
+) -> Dict[str, Any]:
+    """Record one document's decisions; reports whether the same invoice was seen before."""
+    store = get_history_store()
+    key = invoice_key(body.source, body.total_amount, body.vendor)
+    duplicate = await run_io(store.has_invoice, key)
+    rows = [
+        {**entry.model_dump(), "source": body.source, "vendor": body.vendor, "invoice_key": key}
+        for entry in body.entries
+    ]
+    added = await run_io(store.append_many, rows)
+    return {"added": added, "duplicate": duplicate}
+
+
+@app.get("/history")
+@limiter.limit("60/minute")
+async def list_history(
+    request: Request,
+    vendor: Optional[str] = None,
+    decision: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    description: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    _auth: None = Depends(verify_api_key),
+) -> Dict[str, Any]:
+    """
+    Page through decisions, newest first.
+
+    次のページは前回の ``next_cursor`` を ``cursor`` に渡す。limit の上限は 500。
+    description は正規化済み名称の前方一致、since / until は "YYYY-MM-DD[ HH:MM:SS]"。
+    """
+    filters = dict(
+        vendor=vendor, decision=decision, min_amount=min_amount, max_amount=max_amount,
+        since=since, until=until, description=description,
+    )
+    store = get_history_store()
+    return await run_io(store.query, limit=min(limit, HISTORY_MAX_PAGE_SIZE), cursor=cursor, **filters)
+
+
+@app.get("/history/export")
+@limiter.limit("10/minute")
+async def export_history(
+    request: Request,
+    vendor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    _auth: None = Depends(verify_api_key),
+) -> StreamingResponse:
+    """Stream the history as CSV (UTF-8 BOM, Excel 対応)."""
+    chunks = get_history_store().iter_csv(vendor=vendor, since=since, until=until)
+    return StreamingResponse(
+        (chunk.encode("utf-8") for chunk in chunks),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="history.csv"'},
+    )
+
+
+@app.get("/history/similar")
+@limiter.limit("60/minute")
+async def similar_history(
+    request: Request,
+    q: str,
+    top_k: int = 3,
+    threshold: float = 0.5,
+    _auth: None = Depends(verify_api_key),
+) -> Dict[str, Any]:
+    """Similar past decisions for an item name (n-gram index over the whole history)."""
+    store = get_history_store()
+    results = await run_io(store.search_similar, q, top_k=max(1, min(top_k, 20)), threshold=threshold)
+    return {"query": q, "results": results}
+
+
+@app.get("/history/duplicate")
+@limiter.limit("60/minute")
+async def duplicate_invoice(
+    request: Request,
+    source: str,
+    total_amount: Optional[float] = None,
+    vendor: str = "",
+    _auth: None = Depends(verify_api_key),
+) -> Dict[str, bool]:
+    """True when the same invoice (vendor, file name, total) was already recorded."""
+    store = get_history_store()
+    return {"duplicate": await run_io(store.has_invoice, invoice_key(source, total_amount, vendor))}
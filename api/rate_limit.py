@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Client-side rate limiting for bulk API calls.
+
+台帳の一括 Embedding 化のように多数のリクエストを並行に投げる処理で、
+プロジェクトのクォータ（リクエスト/分）を超えないように送信ペースを揃える。
+
+- :class:`AsyncTokenBucket`: 並行タスク間で共有するトークンバケット。
+  429 を受けたら :meth:`AsyncTokenBucket.defer` で全タスクをまとめて待たせる
+- :func:`retry_after_seconds`: サーバーが返した待ち時間（``Retry-After`` ヘッダ、
+  または google.rpc.RetryInfo の ``retryDelay``）を取り出す
+- :func:`is_retryable`: 429 / 5xx / 接続エラーなど、再試行してよい失敗かを判定する
+"""
+import asyncio
+import email.utils
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+# 再試行してよい HTTP ステータス
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+_RETRYABLE_STATUSES = frozenset({"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"})
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+
+class AsyncTokenBucket:
+    """Token bucket shared by the coroutines of one event loop.
+
+    ``rate`` トークン/秒で補充し、最大 ``capacity`` トークンまで貯める。
+    1リクエスト = 1トークン（呼び出し側で重みを変えてもよい）。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate must be positive: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, **kwargs: Any) -> "AsyncTokenBucket":
+        """Bucket for an RPM quota (バーストは最大1秒分)."""
+        rate = requests_per_minute / 60.0
+        return cls(rate, capacity=max(1.0, rate), **kwargs)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until ``tokens`` are available (and any server back-off has passed)."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # ロックを持ったまま待つことで、先に来たタスクから順に送信する
+        async with self._lock:
+            while self._clock() < self._paused_until:
+                await self._sleep(max(self._paused_until - self._clock(), 1e-3))
+            self._refill(max(self._clock(), self._updated))
+            if self._tokens < tokens:
+                await self._sleep((tokens - self._tokens) / self.rate)
+                self._refill(max(self._clock(), self._updated))
+            # 浮動小数の誤差でわずかに足りなくても待ち直さない（不足分は次回の補充で相殺される）
+            self._tokens -= tokens
+
+    def defer(self, seconds: float) -> None:
+        """Hold every caller back for ``seconds`` (server asked us to slow down)."""
+        if seconds <= 0:
+            return
+        now = self._clock()
+        self._paused_until = max(self._paused_until, now + seconds)
+        # 待機明けに溜まったトークンで一斉に送らないよう空にする
+        self._refill(now)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after_seconds(exc: BaseException, now: Optional[float] = None) -> Optional[float]:
+    """Server-provided back-off for ``exc``, in seconds (None when absent).
+
+    ``Retry-After`` ヘッダ（秒数または HTTP 日付）を優先し、無ければ
+    google-genai の ``APIError.details`` に含まれる RetryInfo ``retryDelay``（"12s"）を見る。
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = None
+    if headers is not None:
+        try:
+            value = headers.get("Retry-After") or headers.get("retry-after")
+        except AttributeError:
+            value = None
+    if value:
+        value = str(value).strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            when = None
+        if when is not None:
+            return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        details = (details.get("error") or details).get("details")
+    if isinstance(details, list):
+        for detail in details:
+            if not isinstance(detail, dict) or not str(detail.get("@type", "")).endswith("RetryInfo"):
+                continue
+            match = _DURATION_RE.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for rate limiting, transient server errors and connection problems."""
+    code = _status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    if str(getattr(exc, "status", "") or "").upper() in _RETRYABLE_STATUSES:
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    error_str = str(exc).lower()
+    return "429" in error_str or "rate" in error_str or "quota" in error_str
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+TTL + size-bounded cache for LLM responses.
+
+同じ明細（毎年の保守契約の見積書など）を再アップロードしたときに Gemini を
+再度呼ばないよう、呼び出し側が作った決定的なキーでレスポンス（JSON 化できる
+dict）をキャッシュする。
+
+- ``MemoryResponseCache``: プロセス内 LRU（再起動で消える）
+- ``SQLiteResponseCache``: ローカル SQLite ファイル（再起動後もヒットする）
+
+どちらも ``namespace`` ごとにキーを分け、TTL を過ぎたエントリは読み出し時に
+捨て、件数が ``max_items`` を超えたら最終利用が古い順に削除する。
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("fixed_asset_api")
+
+
+def canonical_key(*parts: Any) -> str:
+    """sha256 of the canonical JSON of ``parts`` (dict key order does not matter)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryResponseCache:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(
+        self,
+        max_items: int = 1000,
+        ttl_seconds: float = 0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_items = max(0, max_items)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            expires_at, payload = entry
+            if expires_at and expires_at <= self._clock():
+                del self._entries[(namespace, key)]
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self._counters["hits"] += 1
+        return json.loads(payload)
+
+    def put(self, namespace: str, key: str, value: Dict[str, Any]) -> None:
+        if self.max_items <= 0:
+            return
+        payload = json.dumps(value, ensure_ascii=False)
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            self._entries[(namespace, key)] = (expires_at, payload)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._counters["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "items": len(self._entries), **self._counters}
+
+
+class SQLiteResponseCache:
+    """Response cache persisted in a local SQLite file.
+
+    I/O スレッドプールから並行に呼ばれるため、1本の接続をロックで直列化する。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            namespace   TEXT NOT NULL,
+            key         TEXT NOT NULL,
+            value       TEXT NOT NULL,
+            expires_at  REAL NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_items: int = 5000,
+        ttl_seconds: float = 0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.max_items = max(0, max_items)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(self._SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM responses WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                if row is None:
+                    self._counters["misses"] += 1
+                    return None
+                payload, expires_at = row
+                if expires_at and expires_at <= now:
+                    self._conn.execute("DELETE FROM responses WHERE namespace = ? AND key = ?", (namespace, key))
+                    self._counters["expired"] += 1
+                    self._counters["misses"] += 1
+                    return None
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+                self._counters["hits"] += 1
+            except sqlite3.Error as e:
+                logger.warning("Response cache read failed: %s", e)
+                return None
+        try:
+            return json.loads(payload)
+        except ValueError:
+            logger.warning("Response cache entry %s is corrupt; ignoring", key[:12])
+            return None
+
+    def put(self, namespace: str, key: str, value: Dict[str, Any]) -> None:
+        if self.max_items <= 0:
+            return
+        payload = json.dumps(value, ensure_ascii=False)
+        now = self._clock()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (namespace, key, value, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, payload, expires_at, now),
+                )
+                self._counters["stores"] += 1
+                self._evict(now)
+            except sqlite3.Error as e:
+                logger.warning("Response cache write failed: %s", e)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires_at > 0 AND expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_items
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+            self._counters["evictions"] += excess
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            try:
+                (items,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            except sqlite3.Error:
+                items = None
+            return {"backend": "sqlite", "path": str(self.path), "items": items, **self._counters}
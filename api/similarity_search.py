@@ -2,12 +2,20 @@
 """
 Similarity search module using cosine similarity with numpy.
 Provides Top-K search functionality for embedding-based retrieval.
+
+検索は :class:`EmbeddingIndex`（行ごとに正規化済みの連続した float32 行列）に対する
+行列×ベクトル積1回で行い、上位K件は ``argpartition`` で選ぶ（全件ソートしない）。
+``search_similar`` / ``batch_search_similar`` にアイテムのリストを渡した場合は呼び出しごとに
+行列を組み立てるため、同じ台帳を繰り返し検索するときは EmbeddingIndex（または
+``EmbeddingStore.index``）を渡して使い回す。
 """
-import math
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
+# batch_search で一度に掛け合わせるクエリ数（スコア行列 クエリ数×件数 のメモリ上限）
+_BATCH_QUERY_ROWS = 256
+
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """
@@ -47,11 +55,195 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     return float(np.clip(similarity, -1.0, 1.0))
 
 
+class EmbeddingIndex:
+    """Pre-normalized float32 matrix over the items that have an embedding.
+
+    ``items`` の順序はそのまま保持し、embedding が無い・次元が異なるアイテムは
+    行列に含めない（検索対象外）。ゼロベクトルは類似度0として扱う。
+    末尾への追加は :meth:`extend`、それ以外で ``items`` を書き換えた場合は作り直すこと。
+
+    :meth:`build_ann` で IVF 近似索引（api.ann_index）を付けると、``exact=False``
+    の検索はクエリに近いリストだけを走査する。
+    """
+
+    def __init__(self, items: Sequence[Dict[str, Any]]) -> None:
+        self.items = items
+        self.dim = 0
+        self.ann: Optional[Any] = None
+        rows, vectors = self._collect(0)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        if vectors:
+            matrix = np.asarray(vectors, dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self.matrix = np.ascontiguousarray(_normalize_rows(matrix))
+
+    @classmethod
+    def from_matrix(cls, items: Sequence[Dict[str, Any]], matrix: np.ndarray) -> "EmbeddingIndex":
+        """Wrap an already row-normalized float32 matrix (one row per item) without copying.
+
+        ``np.load(..., mmap_mode="r")`` の memmap をそのまま渡せば、複数ワーカーが
+        同じページキャッシュを共有する。
+        """
+        if matrix.ndim != 2 or matrix.shape[0] != len(items):
+            raise ValueError(f"matrix shape {matrix.shape} does not match {len(items)} items")
+        index = cls.__new__(cls)
+        index.items = items
+        index.rows = np.arange(len(items), dtype=np.int64)
+        index.dim = int(matrix.shape[1]) if len(items) else 0
+        index.ann = None
+        index.matrix = matrix if matrix.dtype == np.float32 else np.ascontiguousarray(matrix, dtype=np.float32)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _collect(self, start: int) -> Tuple[List[int], List[Any]]:
+        """Rows / raw vectors of ``items[start:]`` that match the index dimension."""
+        rows: List[int] = []
+        vectors: List[Any] = []
+        for i in range(start, len(self.items)):
+            item = self.items[i]
+            embedding = item.get("embedding") if isinstance(item, dict) else None
+            if embedding is None or len(embedding) == 0:
+                continue
+            if not self.dim:
+                self.dim = len(embedding)
+            elif len(embedding) != self.dim:
+                continue
+            rows.append(i)
+            vectors.append(embedding)
+        return rows, vectors
+
+    def extend(self, start: int) -> int:
+        """Index ``items[start:]`` (appended after this index was built) in place.
+
+        行列は容量を倍々に確保したバッファに追記し、近似索引があればそこにも追加する。
+
+        Returns:
+            Number of rows added
+        """
+        rows, vectors = self._collect(start)
+        if not rows:
+            return 0
+        new = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        n, m = len(self.rows), len(rows)
+        buffer = getattr(self, "_buffer", None)
+        if buffer is None or buffer.shape[0] < n + m or buffer.shape[1] != self.dim:
+            buffer = np.empty((max(n + m, 2 * n, 16), self.dim), dtype=np.float32)
+            if n:
+                buffer[:n] = self.matrix
+            self._buffer = buffer
+        buffer[n:n + m] = new
+        self.matrix = buffer[:n + m]
+        self.rows = np.concatenate([self.rows, np.asarray(rows, dtype=np.int64)])
+        if self.ann is not None:
+            self.ann.add(new, np.arange(n, n + m))
+        return m
+
+    def build_ann(self, n_lists: Optional[int] = None, n_probe: int = 8, **kwargs: Any) -> Any:
+        """Train an IVF index over the current matrix (see api.ann_index.IVFIndex)."""
+        from api.ann_index import IVFIndex, default_n_lists
+
+        ann = IVFIndex(n_lists or default_n_lists(len(self)), n_probe=n_probe, **kwargs)
+        if len(self):
+            ann.train(self.matrix)
+            ann.add(self.matrix, np.arange(len(self)))
+        self.ann = ann
+        return ann
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        threshold: Optional[float] = None,
+        exact: bool = False,
+    ) -> List[Tuple[int, float]]:
+        """Top-k ``(index into items, cosine similarity)`` for one query."""
+        return self.batch_search([query_embedding], top_k, threshold, exact)[0]
+
+    def batch_search(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        top_k: int = 5,
+        threshold: Optional[float] = None,
+        exact: bool = False,
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k per query from one matrix-matrix product per block of queries.
+
+        近似索引があり ``exact`` が False の場合は IVF で候補リストだけを走査する。
+        """
+        if not len(query_embeddings):
+            return []
+        results: List[List[Tuple[int, float]]] = [[] for _ in query_embeddings]
+        if not len(self) or top_k <= 0:
+            return results
+
+        use_ann = self.ann is not None and self.ann.is_trained and not exact
+        valid = [i for i, q in enumerate(query_embeddings) if q is not None and len(q) == self.dim]
+        for start in range(0, len(valid), _BATCH_QUERY_ROWS):
+            block = valid[start:start + _BATCH_QUERY_ROWS]
+            queries = _normalize_rows(np.asarray([query_embeddings[i] for i in block], dtype=np.float32))
+            if use_ann:
+                for query_index, (ids, scores) in zip(block, self.ann.search(queries, top_k)):
+                    results[query_index] = self._hits(ids, np.clip(scores, -1.0, 1.0), threshold)
+                continue
+            scores = np.clip(queries @ self.matrix.T, -1.0, 1.0)
+            for row, query_index in enumerate(block):
+                results[query_index] = self._top_k(scores[row], top_k, threshold)
+        return results
+
+    def _top_k(self, scores: np.ndarray, top_k: int, threshold: Optional[float]) -> List[Tuple[int, float]]:
+        n = scores.shape[0]
+        if top_k < n:
+            # argpartition は k 番目と同点の行を任意に選ぶので、同点の行をすべて候補に戻す
+            kth_score = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+            candidates = np.flatnonzero(scores >= kth_score)
+        else:
+            candidates = np.arange(n)
+        # 類似度降順、同点は items の順（従来の安定ソートと同じ並び）
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:top_k]
+        return self._hits(order, scores[order], threshold)
+
+    def _hits(self, positions: np.ndarray, scores: np.ndarray, threshold: Optional[float]) -> List[Tuple[int, float]]:
+        """Map matrix positions (already in result order) to ``(item index, score)``."""
+        if threshold is not None:
+            keep = scores >= threshold
+            positions, scores = positions[keep], scores[keep]
+        return [(int(self.rows[p]), float(score)) for p, score in zip(positions, scores)]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place (zero rows stay zero)."""
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _as_index(stored_items: Union[List[Dict[str, Any]], EmbeddingIndex]) -> EmbeddingIndex:
+    return stored_items if isinstance(stored_items, EmbeddingIndex) else EmbeddingIndex(stored_items)
+
+
+def _format_hits(index: EmbeddingIndex, hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    results = []
+    for item_index, similarity in hits:
+        item = index.items[item_index]
+        results.append({
+            "name": item.get("name", ""),
+            "similarity": round(similarity, 4),  # 小数点4桁で丸める
+            "metadata": item.get("metadata", {}),
+        })
+    return results
+
+
 def search_similar(
     query_embedding: List[float],
-    stored_items: List[Dict[str, Any]],
+    stored_items: Union[List[Dict[str, Any]], EmbeddingIndex],
     top_k: int = 5,
-    threshold: float = 0.7
+    threshold: float = 0.7,
+    exact: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     類似アイテムを検索する。
@@ -61,7 +253,8 @@ def search_similar(
 
     Args:
         query_embedding: クエリのEmbeddingベクトル
-        stored_items: 保存されたアイテムのリスト。各アイテムは以下の構造:
+        stored_items: 保存されたアイテムのリスト、または構築済みの EmbeddingIndex。
+            各アイテムは以下の構造:
             {
                 "name": str,           # アイテム名
                 "embedding": List[float],  # Embeddingベクトル
@@ -69,6 +262,7 @@ def search_similar(
             }
         top_k: 上位何件を返すか（デフォルト: 5）
         threshold: 類似度の閾値（デフォルト: 0.7）。これ以上の類似度を持つアイテムのみ返却
+        exact: True なら近似索引（EmbeddingIndex.build_ann）があっても全件を計算する
 
     Returns:
         類似アイテムのリスト。類似度降順でソート済み:
@@ -90,64 +284,37 @@ def search_similar(
         >>> len(results) >= 1
         True
     """
-    if not stored_items:
-        return []
-
-    if not query_embedding:
+    if not query_embedding or not len(stored_items):
         return []
 
-    # 各アイテムとの類似度を計算
-    scored_items: List[Dict[str, Any]] = []
-
-    for item in stored_items:
-        # embeddingキーが存在しない場合はスキップ
-        if "embedding" not in item or not item["embedding"]:
-            continue
-
-        # 類似度計算
-        similarity = cosine_similarity(query_embedding, item["embedding"])
-
-        # 閾値以上のもののみ追加
-        if similarity >= threshold:
-            result_item = {
-                "name": item.get("name", ""),
-                "similarity": round(similarity, 4),  # 小数点4桁で丸める
-                "metadata": item.get("metadata", {})
-            }
-            scored_items.append(result_item)
-
-    # 類似度降順でソート
-    scored_items.sort(key=lambda x: x["similarity"], reverse=True)
-
-    # 上位K件を返却
-    return scored_items[:top_k]
+    index = _as_index(stored_items)
+    return _format_hits(index, index.search(query_embedding, top_k, threshold, exact))
 
 
 def batch_search_similar(
     query_embeddings: List[List[float]],
-    stored_items: List[Dict[str, Any]],
+    stored_items: Union[List[Dict[str, Any]], EmbeddingIndex],
     top_k: int = 5,
-    threshold: float = 0.7
+    threshold: float = 0.7,
+    exact: bool = False,
 ) -> List[List[Dict[str, Any]]]:
     """
-    複数のクエリに対して一括で類似検索を行う。
+    複数のクエリに対して一括で類似検索を行う（行列×行列積で全クエリをまとめて計算）。
 
     Args:
         query_embeddings: クエリのEmbeddingベクトルのリスト
-        stored_items: 保存されたアイテムのリスト
+        stored_items: 保存されたアイテムのリスト、または構築済みの EmbeddingIndex
         top_k: 各クエリに対して上位何件を返すか
         threshold: 類似度の閾値
+        exact: True なら近似索引があっても全件を計算する
 
     Returns:
         各クエリに対する検索結果のリスト
     """
-    results = []
-    for query_embedding in query_embeddings:
-        result = search_similar(
-            query_embedding=query_embedding,
-            stored_items=stored_items,
-            top_k=top_k,
-            threshold=threshold
-        )
-        results.append(result)
-    return results
+    if not query_embeddings:
+        return []
+    if not len(stored_items):
+        return [[] for _ in query_embeddings]
+
+    index = _as_index(stored_items)
+    return [_format_hits(index, hits) for hits in index.batch_search(query_embeddings, top_k, threshold, exact)]
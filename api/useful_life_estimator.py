@@ -6,10 +6,31 @@ Estimates the legal useful life (耐用年数) of fixed assets based on
 Japanese tax depreciation rules.
 
 Feature-flagged: Set GEMINI_API_KEY environment variable to enable.
+
+マスタ照合は全キーワードから作った Aho-Corasick オートマトンで説明文を1回走査し、
+最も長く一致したキーワード（「ノートパソコン」>「パソコン」）を採用する。キーワード数が
+別表の全項目（数千件）になっても照合時間は説明文の長さにしか比例しない。
+
+マスタに無い資産の Gemini 推定結果は、正規化済みの説明文をキーに
+api.response_cache（既定はローカル SQLite）へ保存し、同じ資産で再度 API を呼ばない。
+
+:func:`estimate_useful_life_batch` は書類の全明細・台帳の全行をまとめて推定する。
+マスタ照合・保存済みの推定で決まらなかった説明文だけを重複排除し、
+USEFUL_LIFE_BATCH_ITEMS 件ずつ1回の構造化リクエストにまとめて番号で結果を戻す。
 """
+import contextvars
 import json
+import logging
 import os
-from typing import Any, Dict, List, Optional
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.response_cache import MemoryResponseCache, SQLiteResponseCache, canonical_key
+from core.deadline import current_deadline, min_remote_seconds
+from core.genai_client import get_client, http_options
 
 # Optional: Google Generative AI (Gemini)
 try:
@@ -21,6 +42,24 @@ except ImportError:
     genai = None
     types = None
 
+logger = logging.getLogger("fixed_asset_api")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
 
 # ============================================================================
 # 主要な法定耐用年数マスタ（減価償却資産の耐用年数等に関する省令より）
@@ -79,38 +118,110 @@ USEFUL_LIFE_MASTER = {
 
 def _normalize_description(description: str) -> str:
     """Normalize asset description for matching."""
-    # 全角→半角、小文字化、空白除去
-    normalized = description.lower()
-    normalized = normalized.replace("　", " ").strip()
-    return normalized
+    # 全角→半角（NFKC）、小文字化、空白の揺れを吸収
+    normalized = unicodedata.normalize("NFKC", description).lower()
+    return " ".join(normalized.split())
 
 
-def _lookup_master(description: str) -> Optional[Dict[str, Any]]:
+class KeywordMatcher:
     """
-    Look up useful life from master data.
-    Returns match if found, None otherwise.
+    Aho-Corasick automaton returning the longest keyword found in a text.
+
+    同じ長さのキーワードが複数見つかった場合は、説明文の先に現れたもの、
+    それも同じならマスタで先に定義されたものを返す。
     """
-    normalized = _normalize_description(description)
-
-    for keyword, data in USEFUL_LIFE_MASTER.items():
-        if keyword.lower() in normalized:
-            return {
-                "useful_life_years": data["years"],
-                "category": data["category"],
-                "subcategory": data["subcategory"],
-                "legal_basis": data["basis"],
-                "confidence": 0.95,  # High confidence for master match
-                "source": "master_lookup",
-            }
 
-    return None
+    def __init__(self, keywords: List[str]) -> None:
+        self.keywords = keywords
+        self._goto: List[Dict[str, int]] = [{}]
+        # 状態ごとの「そこで終わる最長のキーワード」(長さ, キーワード番号)。無ければ (0, -1)
+        self._best: List[Tuple[int, int]] = [(0, -1)]
+        for number, keyword in enumerate(keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._best.append((0, -1))
+                state = nxt
+            if self._best[state][1] < 0:  # 重複キーワードは先勝ち
+                self._best[state] = (len(keyword), number)
+
+        # 幅優先で失敗遷移を張り、接尾辞で終わるキーワードを引き継ぐ
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._best[nxt][1] < 0:
+                    self._best[nxt] = self._best[self._fail[nxt]]
+                queue.append(nxt)
+
+    def longest(self, text: str) -> int:
+        """Index of the longest keyword occurring in ``text``, or -1 (one left-to-right pass)."""
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found: Tuple[int, int, int] = (0, 0, 0)  # (長さ, -開始位置, -番号) の最大
+        result = -1
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            length, number = best[state]
+            if number >= 0:
+                candidate = (length, -(position - length + 1), -number)
+                if candidate > found:
+                    found, result = candidate, number
+        return result
 
 
-def _build_gemini_prompt(asset_description: str, asset_category: Optional[str] = None) -> str:
-    """Build prompt for Gemini API."""
+_matcher: Optional[Tuple[KeywordMatcher, List[str]]] = None
+_matcher_key: Optional[Tuple[int, int]] = None
+_matcher_lock = threading.Lock()
+
+
+def _master_matcher() -> Tuple[KeywordMatcher, List[str]]:
+    """Matcher over USEFUL_LIFE_MASTER (マスタの差し替え・追加を検知して作り直す)."""
+    global _matcher, _matcher_key
+    key = (id(USEFUL_LIFE_MASTER), len(USEFUL_LIFE_MASTER))
+    with _matcher_lock:
+        if _matcher is None or _matcher_key != key:
+            keys = list(USEFUL_LIFE_MASTER)
+            _matcher = (KeywordMatcher([_normalize_description(k) for k in keys]), keys)
+            _matcher_key = key
+        return _matcher
 
-    # Include reference table in prompt
-    reference_examples = """
+
+def _lookup_master(description: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up useful life from master data.
+    Returns the most specific (longest) keyword match, None otherwise.
+    """
+    matcher, keys = _master_matcher()
+    number = matcher.longest(_normalize_description(description))
+    if number < 0:
+        return None
+    data = USEFUL_LIFE_MASTER[keys[number]]
+    return {
+        "useful_life_years": data["years"],
+        "category": data["category"],
+        "subcategory": data["subcategory"],
+        "legal_basis": data["basis"],
+        "confidence": 0.95,  # High confidence for master match
+        "source": "master_lookup",
+    }
+
+
+# Include reference table in prompt
+_REFERENCE_EXAMPLES = """
 【主要な法定耐用年数（参考）】
 - パソコン、ノートPC: 4年（器具及び備品・電子計算機）
 - サーバー: 5年（器具及び備品・電子計算機）
@@ -125,6 +236,11 @@ def _build_gemini_prompt(asset_description: str, asset_category: Optional[str] =
 - 消火設備: 8年（建物附属設備）
 """
 
+
+def _build_gemini_prompt(asset_description: str, asset_category: Optional[str] = None) -> str:
+    """Build prompt for Gemini API."""
+    reference_examples = _REFERENCE_EXAMPLES
+
     category_hint = f"\n資産カテゴリ: {asset_category}" if asset_category else ""
 
     prompt = f"""あなたは日本の税務に詳しい専門家です。
@@ -151,31 +267,170 @@ JSON形式のみで回答してください。"""
     return prompt
 
 
+def _build_batch_prompt(entries: List[Tuple[str, Optional[str]]]) -> str:
+    """Build one prompt for several assets (回答は番号で対応付ける)."""
+    lines = []
+    for index, (description, category) in enumerate(entries):
+        category_hint = f"（資産カテゴリ: {category}）" if category else ""
+        lines.append(f"{index}. {description}{category_hint}")
+    assets = "\n".join(lines)
+
+    return f"""あなたは日本の税務に詳しい専門家です。
+以下の{len(entries)}件の固定資産それぞれについて、減価償却資産の耐用年数等に関する省令に基づいて、法定耐用年数を推定してください。
+
+【資産の一覧（番号. 説明）】
+{assets}
+
+{_REFERENCE_EXAMPLES}
+
+以下のJSON形式で、全件について番号（index）を付けて回答してください。推測が困難な場合はconfidenceを低く設定してください。
+
+{{
+    "items": [
+        {{
+            "index": <資産の番号>,
+            "useful_life_years": <耐用年数（整数）>,
+            "category": "<資産区分（器具及び備品、車両運搬具、機械装置、建物附属設備、無形固定資産など）>",
+            "subcategory": "<細目>",
+            "legal_basis": "<法的根拠（別表第○など）>",
+            "confidence": <0.0-1.0の信頼度>,
+            "reasoning": "<判断理由の簡潔な説明>"
+        }}
+    ]
+}}
+
+JSON形式のみで回答してください。"""
+
+
+_GEMINI_TIMEOUT_MS = 20_000
+# まとめて推定するリクエストは出力が長いので待ち時間を延ばす（リクエストの残り時間が上限）
+_GEMINI_BATCH_TIMEOUT_MS = 60_000
+_GEMINI_MODEL = "gemini-3-pro-preview"
+# 1リクエストにまとめる資産数の上限
+_BATCH_MAX_ITEMS = 50
+
+# プロンプト・参考表の意味を変えたら上げる（古い推定結果を使わない）
+ESTIMATE_CACHE_VERSION = 1
+_ESTIMATE_CACHE_NAMESPACE = "useful_life"
+
+_UNSET: Any = object()
+_estimate_cache: Any = _UNSET
+_estimate_cache_lock = threading.Lock()
+
+
+def _default_estimate_cache() -> Optional[Any]:
+    if not _bool_env("USEFUL_LIFE_CACHE_ENABLED", True):
+        return None
+    ttl_seconds = _int_env("USEFUL_LIFE_CACHE_TTL_HOURS", 0) * 3600
+    max_items = _int_env("USEFUL_LIFE_CACHE_MAX_ITEMS", 20000)
+    path = os.getenv("USEFUL_LIFE_CACHE_PATH") or str(PROJECT_ROOT / "data" / "cache" / "useful_life.sqlite3")
+    try:
+        return SQLiteResponseCache(Path(path), max_items=max_items, ttl_seconds=ttl_seconds)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Useful-life cache unavailable at %s, using memory: %s", path, e)
+        return MemoryResponseCache(max_items=max_items, ttl_seconds=ttl_seconds)
+
+
+def get_estimate_cache() -> Optional[Any]:
+    """Cache of Gemini estimates (created on first use; None when disabled)."""
+    global _estimate_cache
+    if _estimate_cache is _UNSET:
+        with _estimate_cache_lock:
+            if _estimate_cache is _UNSET:
+                _estimate_cache = _default_estimate_cache()
+    return _estimate_cache
+
+
+def set_estimate_cache(cache: Optional[Any]) -> None:
+    """Swap the cache implementation (tests). None disables memoization."""
+    global _estimate_cache
+    _estimate_cache = cache
+
+
+def _estimate_cache_key(asset_description: str, asset_category: Optional[str]) -> str:
+    return canonical_key(
+        _ESTIMATE_CACHE_NAMESPACE, ESTIMATE_CACHE_VERSION, _GEMINI_MODEL,
+        _normalize_description(asset_description), _normalize_description(asset_category or ""),
+    )
+
+
+def _estimate_with_gemini(asset_description: str, asset_category: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Gemini estimate, memoized by normalized description (失敗・空の結果は保存しない)."""
+    cache = get_estimate_cache()
+    key = _estimate_cache_key(asset_description, asset_category)
+    if cache is not None:
+        cached = cache.get(_ESTIMATE_CACHE_NAMESPACE, key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    result = _call_gemini_api(_build_gemini_prompt(asset_description, asset_category))
+    if result and result.get("useful_life_years") and cache is not None:
+        cache.put(_ESTIMATE_CACHE_NAMESPACE, key, result)
+    return result
+
+
 def _call_gemini_api(prompt: str) -> Optional[Dict[str, Any]]:
     """
     Call Gemini API and parse response.
     Returns parsed JSON or None on failure.
     """
+    result = _generate_json(prompt, _GEMINI_TIMEOUT_MS)
+    if not isinstance(result, dict):
+        return None
+    result["source"] = "gemini_api"
+    return result
+
+
+def _call_gemini_batch(entries: List[Tuple[str, Optional[str]]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Estimate several assets with one request.
+    Returns one result per entry (None where the response had no usable answer).
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+    response = _generate_json(_build_batch_prompt(entries), _GEMINI_BATCH_TIMEOUT_MS)
+    if isinstance(response, dict):
+        response = response.get("items")
+    if not isinstance(response, list):
+        return results
+
+    answers = [a for a in response if isinstance(a, dict)]
+    for position, answer in enumerate(answers):
+        index = answer.pop("index", None)
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            # 番号が無ければ件数が一致する場合に限り並び順で対応付ける
+            index = position if len(answers) == len(entries) else -1
+        if 0 <= index < len(entries) and results[index] is None:
+            answer["source"] = "gemini_api"
+            results[index] = answer
+    return results
+
+
+def _generate_json(prompt: str, timeout_ms: int) -> Any:
+    """Send ``prompt`` to Gemini and return the decoded JSON (None on any failure)."""
     if not GENAI_AVAILABLE:
         return None
 
+    # リクエストの残り時間が足りなければ呼ばない（呼び出し側は既定値にフォールバック）
+    deadline = current_deadline()
+    if not deadline.has(min_remote_seconds()):
+        return None
+
     try:
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-            client = genai.Client()
-        elif api_key:
-            client = genai.Client(api_key=api_key)
-        else:
+        client = get_client()
+        if client is None:
             return None
 
         response = client.models.generate_content(
-            model="gemini-3-pro-preview",
+            model=_GEMINI_MODEL,
             contents=prompt,
             config=types.GenerateContentConfig(
                 system_instruction="あなたは日本の税務に詳しい専門家です。減価償却資産の耐用年数等に関する省令に基づいて、法定耐用年数を正確に推定してください。JSON形式のみで回答してください。",
                 response_mime_type="application/json",
                 temperature=0.1,
                 thinking_config=types.ThinkingConfig(thinking_level="HIGH"),
+                http_options=http_options(deadline.timeout_ms(timeout_ms)),
             )
         )
 
@@ -188,9 +443,7 @@ def _call_gemini_api(prompt: str) -> Optional[Dict[str, Any]]:
         elif "```" in text:
             text = text.split("```")[1].split("```")[0].strip()
 
-        result = json.loads(text)
-        result["source"] = "gemini_api"
-        return result
+        return json.loads(text)
 
     except json.JSONDecodeError:
         # JSON parsing failed
@@ -237,6 +490,20 @@ def estimate_useful_life(
             "source": "master_lookup"
         }
     """
+    local_result = _estimate_locally(asset_description, asset_category)
+    if local_result:
+        return local_result
+
+    # Stage 2: Gemini API (intelligent estimation, 同じ資産は保存済みの推定を使う)
+    gemini_result = _estimate_with_gemini(asset_description, asset_category)
+    if gemini_result and gemini_result.get("useful_life_years"):
+        return gemini_result
+
+    return _default_result()
+
+
+def _estimate_locally(asset_description: str, asset_category: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Input check and master lookup (Stage 1). None when Gemini is needed."""
     if not asset_description:
         return {
             "useful_life_years": 0,
@@ -259,13 +526,10 @@ def estimate_useful_life(
         if master_result:
             master_result["confidence"] = 0.85  # Slightly lower confidence
             return master_result
+    return None
 
-    # Stage 2: Gemini API (intelligent estimation)
-    prompt = _build_gemini_prompt(asset_description, asset_category)
-    gemini_result = _call_gemini_api(prompt)
-    if gemini_result and gemini_result.get("useful_life_years"):
-        return gemini_result
 
+def _default_result() -> Dict[str, Any]:
     # Fallback: Default values with low confidence
     return {
         "useful_life_years": 5,  # Common default
@@ -284,20 +548,78 @@ def estimate_useful_life_batch(
     """
     Estimate useful life for multiple items.
 
+    マスタで決まる明細はローカルで解決し、残りの説明文（正規化後に重複排除）だけを
+    USEFUL_LIFE_BATCH_ITEMS 件ずつ1回の Gemini リクエストにまとめる。
+    複数リクエストになる場合は USEFUL_LIFE_BATCH_CONCURRENCY 件まで並行に送る。
+
     Args:
         items: List of dicts with "description" and optional "category" keys
 
     Returns:
-        List of estimation results
+        List of estimation results (same order and length as ``items``)
     """
-    results = []
-    for item in items:
-        description = item.get("description", "")
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    groups: Dict[str, List[int]] = {}  # memo key -> items の index（同じ資産は1回だけ推定）
+    queries: Dict[str, Tuple[str, Optional[str]]] = {}
+    for index, item in enumerate(items):
+        description = item.get("description", "") or ""
         category = item.get("category")
-        result = estimate_useful_life(description, category)
-        result["original_description"] = description
-        results.append(result)
-    return results
+        local_result = _estimate_locally(description, category)
+        if local_result:
+            results[index] = local_result
+            continue
+        key = _estimate_cache_key(description, category)
+        groups.setdefault(key, []).append(index)
+        queries.setdefault(key, (description, category))
+
+    estimates: Dict[str, Optional[Dict[str, Any]]] = {}
+    cache = get_estimate_cache()
+    misses = []
+    for key in groups:
+        cached = cache.get(_ESTIMATE_CACHE_NAMESPACE, key) if cache is not None else None
+        if cached is not None:
+            estimates[key] = {**cached, "cached": True}
+        else:
+            misses.append(key)
+
+    if misses:
+        answers = _estimate_many([queries[key] for key in misses])
+        for key, answer in zip(misses, answers):
+            if answer and answer.get("useful_life_years"):
+                estimates[key] = answer
+                if cache is not None:
+                    cache.put(_ESTIMATE_CACHE_NAMESPACE, key, answer)
+
+    for key, indexes in groups.items():
+        estimate = estimates.get(key)
+        for index in indexes:
+            results[index] = dict(estimate) if estimate else _default_result()
+
+    for item, result in zip(items, results):
+        result["original_description"] = item.get("description", "")
+    return results  # type: ignore[return-value]
+
+
+def _estimate_many(entries: List[Tuple[str, Optional[str]]]) -> List[Optional[Dict[str, Any]]]:
+    """Gemini estimates for ``entries`` in chunks of USEFUL_LIFE_BATCH_ITEMS."""
+    if len(entries) == 1:
+        return [_call_gemini_api(_build_gemini_prompt(*entries[0]))]
+
+    size = max(1, min(_int_env("USEFUL_LIFE_BATCH_ITEMS", _BATCH_MAX_ITEMS), _BATCH_MAX_ITEMS))
+    chunks = [entries[start:start + size] for start in range(0, len(entries), size)]
+    if len(chunks) == 1:
+        return _call_gemini_batch(chunks[0])
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = max(1, min(_int_env("USEFUL_LIFE_BATCH_CONCURRENCY", 4), len(chunks)))
+    logger.info("Useful-life estimation split into %d requests (%d assets, %d concurrent)",
+                len(chunks), len(entries), workers)
+    # 各スレッドに呼び出し元のコンテキスト（リクエストの期限）を引き継ぐ
+    contexts = [contextvars.copy_context() for _ in chunks]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fa-useful-life") as pool:
+        chunk_results = list(pool.map(lambda ctx, chunk: ctx.run(_call_gemini_batch, chunk), contexts, chunks))
+    return [result for chunk_result in chunk_results for result in chunk_result]
 
 
 # ============================================================================
@@ -7,6 +7,8 @@ import logging
 import os
 from typing import Any, Dict, List, Optional
 
+from core.deadline import current_deadline, min_remote_seconds
+
 logger = logging.getLogger("fixed_asset_api")
 
 
@@ -18,6 +20,10 @@ def _bool_env(name: str, default: bool = False) -> bool:
     return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+# 1回の検索の上限（リクエストの残り時間が短ければそちらに合わせる）
+_SEARCH_TIMEOUT_SECONDS = 10.0
+
+
 def search_legal_citations(
     query: str,
     project_id: Optional[str] = None,
@@ -49,6 +55,11 @@ def search_legal_citations(
         data_store_id = os.getenv("DISCOVERY_ENGINE_DATA_STORE_ID")
     if not data_store_id:
         return []  # Graceful skip if not configured
+
+    deadline = current_deadline()
+    if not deadline.has(min_remote_seconds()):
+        logger.warning("Vertex AI Search skipped: request deadline nearly exhausted (%r)", deadline)
+        return []
     
     try:
         # Import only when feature is enabled (avoids dependency if not used)
@@ -72,7 +83,7 @@ def search_legal_citations(
         )
         
         # Execute search
-        response = client.search(request=request)
+        response = client.search(request=request, timeout=deadline.timeout(_SEARCH_TIMEOUT_SECONDS))
         
         # Format results
         citations: List[Dict[str, Any]] = []
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import re
-from typing import Any, Dict, List, Optional
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Pattern, Tuple
 
 from core import schema
 
@@ -111,16 +113,155 @@ def _merge_keywords(base: List[str], additions: List[str]) -> List[str]:
     return merged
 
 
-def _safe_policy(policy: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+# キーワードカテゴリ名（_KeywordMatcher.scan の返却キー）
+KW_CAPITAL = "capital"
+KW_EXPENSE = "expense"
+KW_MIXED = "mixed"
+KW_GUIDANCE = "guidance"
+KW_ASSET_INCLUSION = "asset_inclusion"
+KW_PRORATE = "prorate"
+
+
+class _KeywordMatcher:
+    """Combined-regex matcher that finds every keyword category in one pass.
+
+    ``scan(text)`` returns, for each category, exactly what
+    ``_find_keywords(text, keywords)`` would return for that category's list
+    (same hits, same order, duplicates preserved), but searches *text* with a
+    single compiled alternation instead of one substring test per keyword.
+
+    The alternation is ordered longest-first, so at every position it reports
+    the longest keyword starting there.  Any shorter keyword starting at the
+    same position is a substring of that match, so each match expands to the
+    precomputed set of keywords it contains; overlapping hits such as
+    「現場管理費」 / 「管理」 are therefore never lost.
+    """
+
+    __slots__ = ("keywords", "_pattern", "_contains", "_slots", "_always", "_categories")
+
+    def __init__(self, categories: Dict[str, List[str]]) -> None:
+        self.keywords: Dict[str, Tuple[str, ...]] = {cat: tuple(kws) for cat, kws in categories.items()}
+        self._categories = tuple(categories)
+        # keyword -> [(category, position in that category's list), ...]
+        self._slots: Dict[str, List[Tuple[str, int]]] = {}
+        for cat, keywords in categories.items():
+            for pos, kw in enumerate(keywords):
+                self._slots.setdefault(kw, []).append((cat, pos))
+        # 空文字キーワードは `"" in text` と同じく常にヒット扱い
+        self._always = tuple(kw for kw in self._slots if kw == "")
+
+        keywords = sorted((kw for kw in self._slots if kw), key=len, reverse=True)
+        self._contains: Dict[str, Tuple[str, ...]] = {
+            kw: tuple(other for other in keywords if other in kw) for kw in keywords
+        }
+        self._pattern = re.compile("|".join(re.escape(kw) for kw in keywords)) if keywords else None
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Return ``{category: hits}`` for every category in a single pass over *text*."""
+        found = set(self._always)
+        if self._pattern is not None:
+            search = self._pattern.search
+            contains = self._contains
+            m = search(text)
+            while m:
+                found.update(contains[m.group()])
+                m = search(text, m.start() + 1)
+
+        hits: Dict[str, List[str]] = {cat: [] for cat in self._categories}
+        if not found:
+            return hits
+        ranked: Dict[str, List[Tuple[int, str]]] = {}
+        for kw in found:
+            for cat, pos in self._slots[kw]:
+                ranked.setdefault(cat, []).append((pos, kw))
+        for cat, pairs in ranked.items():
+            pairs.sort()
+            hits[cat] = [kw for _, kw in pairs]
+        return hits
+
+
+def _keyword_tuple(value: Any) -> Tuple[str, ...]:
+    """Return the string elements of a policy keyword list as a hashable tuple."""
+    if not isinstance(value, (list, tuple)):
+        return ()
+    return tuple(v for v in value if isinstance(v, str))
+
+
+@lru_cache(maxsize=64)
+def _build_keyword_matcher(
+    asset_add: Tuple[str, ...] = (),
+    expense_add: Tuple[str, ...] = (),
+    guidance_add: Tuple[str, ...] = (),
+) -> _KeywordMatcher:
+    """Build (and memoize) the matcher for one set of policy keyword additions.
+
+    Args:
+        asset_add: ``policy.keywords.asset_add`` entries.
+        expense_add: ``policy.keywords.expense_add`` entries.
+        guidance_add: ``policy.keywords.guidance_add`` entries.
+
+    Returns:
+        A compiled :class:`_KeywordMatcher` covering all six categories.
+    """
+    return _KeywordMatcher({
+        KW_CAPITAL: _merge_keywords(CAPITAL_KEYWORDS, list(asset_add)),
+        KW_EXPENSE: _merge_keywords(EXPENSE_KEYWORDS, list(expense_add)),
+        KW_MIXED: list(MIXED_KEYWORDS),
+        KW_GUIDANCE: list(guidance_add),
+        KW_ASSET_INCLUSION: list(ASSET_INCLUSION_KEYWORDS),
+        KW_PRORATE: list(PRORATE_KEYWORDS),
+    })
+
+
+def _keyword_matcher_for(policy_cfg: Mapping) -> _KeywordMatcher:
+    """Return the matcher for *policy_cfg*'s keyword additions.
+
+    A :class:`core.policy.CompiledPolicy` already carries its matcher; plain
+    policy dicts go through the memoized builder.
+    """
+    matcher = getattr(policy_cfg, "keyword_matcher", None)
+    if matcher is not None:
+        return matcher
+    policy_keywords = policy_cfg.get("keywords")
+    if not isinstance(policy_keywords, Mapping):
+        return _build_keyword_matcher()
+    return _build_keyword_matcher(
+        _keyword_tuple(policy_keywords.get("asset_add")),
+        _keyword_tuple(policy_keywords.get("expense_add")),
+        _keyword_tuple(policy_keywords.get("guidance_add")),
+    )
+
+
+@lru_cache(maxsize=64)
+def _compile_always_guidance(pattern: str) -> Optional[Pattern[str]]:
+    """Compile a ``regex.always_guidance`` pattern once; ``None`` if it is invalid."""
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+def _always_guidance_regex(policy_cfg: Mapping) -> Optional[Pattern[str]]:
+    """Return the precompiled ``regex.always_guidance`` pattern of *policy_cfg*, if any."""
+    if hasattr(policy_cfg, "always_guidance_re"):
+        return policy_cfg.always_guidance_re
+    regex_cfg = policy_cfg.get("regex")
+    pattern = regex_cfg.get("always_guidance") if isinstance(regex_cfg, Mapping) else None
+    if isinstance(pattern, str) and pattern:
+        return _compile_always_guidance(pattern)
+    return None
+
+
+def _safe_policy(policy: Optional[Mapping]) -> Mapping:
     """Return *policy* if it is a dict, otherwise return an empty policy skeleton.
 
     Args:
-        policy: A policy configuration dict or ``None``.
+        policy: A policy configuration dict, a ``CompiledPolicy``, or ``None``.
 
     Returns:
-        A dict guaranteed to have ``keywords``, ``thresholds``, and ``regex`` keys.
+        A mapping guaranteed to have ``keywords``, ``thresholds``, and ``regex`` keys.
     """
-    return policy if isinstance(policy, dict) else {"keywords": {}, "thresholds": {}, "regex": {}}
+    return policy if isinstance(policy, Mapping) else {"keywords": {}, "thresholds": {}, "regex": {}}
 
 
 def _append_flag(flags: List[str], flag: str) -> None:
@@ -134,6 +275,10 @@ def _append_flag(flags: List[str], flag: str) -> None:
         flags.append(flag)
 
 
+# 税ルールの金額帯（_apply_tax_rules の分岐境界）。classify_frame で searchsorted に使う
+_TAX_BAND_EDGES = (100_000, 200_000, 300_000, 600_000)
+
+
 def _apply_tax_rules(
     amount: Optional[float],
     total_amount: Optional[float] = None,
@@ -228,7 +373,7 @@ def _calculate_confidence(
 
 def classify_line_item(
     item: Dict[str, Any],
-    policy: Optional[Dict[str, Any]] = None,
+    policy: Optional[Mapping] = None,
     doc: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """Classify a single line item as CAPITAL_LIKE, EXPENSE_LIKE, or GUIDANCE.
@@ -241,7 +386,8 @@ def classify_line_item(
 
     Args:
         item: A normalized line-item dict (must contain at least ``description``).
-        policy: Optional policy configuration for keyword/threshold overrides.
+        policy: Optional policy configuration for keyword/threshold overrides
+                (a plain dict or a precompiled ``core.policy.CompiledPolicy``).
         doc: The parent document dict (used to retrieve ``totals`` for tax rules).
 
     Returns:
@@ -254,17 +400,15 @@ def classify_line_item(
     # 両方を結合してキーワード検索対象とする
     search_text = f"{description} {source_text}"
     policy_cfg = _safe_policy(policy)
-    policy_keywords = policy_cfg.get("keywords") if isinstance(policy_cfg.get("keywords"), dict) else {}
-    capital_keywords = _merge_keywords(CAPITAL_KEYWORDS, policy_keywords.get("asset_add", [])) if isinstance(policy_keywords, dict) else CAPITAL_KEYWORDS
-    expense_keywords = _merge_keywords(EXPENSE_KEYWORDS, policy_keywords.get("expense_add", [])) if isinstance(policy_keywords, dict) else EXPENSE_KEYWORDS
-    guidance_keywords = policy_keywords.get("guidance_add", []) if isinstance(policy_keywords, dict) else []
-
-    cap_hits = _find_keywords(search_text, capital_keywords)
-    exp_hits = _find_keywords(search_text, expense_keywords)
-    mixed_hits = _find_keywords(search_text, MIXED_KEYWORDS)
-    guidance_hits = _find_keywords(search_text, guidance_keywords)
-    asset_inclusion_hits = _find_keywords(search_text, ASSET_INCLUSION_KEYWORDS)
-    prorate_hits = _find_keywords(search_text, PRORATE_KEYWORDS)
+
+    # 全カテゴリのキーワードを1パスで検出（ポリシーごとにマッチャーをキャッシュ）
+    hits = _keyword_matcher_for(policy_cfg).scan(search_text)
+    cap_hits = hits[KW_CAPITAL]
+    exp_hits = hits[KW_EXPENSE]
+    mixed_hits = hits[KW_MIXED]
+    guidance_hits = hits[KW_GUIDANCE]
+    asset_inclusion_hits = hits[KW_ASSET_INCLUSION]
+    prorate_hits = hits[KW_PRORATE]
 
     flags: List[str] = []
 
@@ -294,22 +438,17 @@ def classify_line_item(
         flags.append("no_keywords")
 
     # Stop-first: policy overrides only add more GUIDANCE reasons.
-    regex_cfg = policy_cfg.get("regex") if isinstance(policy_cfg.get("regex"), dict) else {}
-    always_guidance_pattern = regex_cfg.get("always_guidance") if isinstance(regex_cfg, dict) else None
-    if isinstance(always_guidance_pattern, str) and always_guidance_pattern:
-        try:
-            if re.search(always_guidance_pattern, description):
-                classification = schema.GUIDANCE
-                _append_flag(flags, "policy:always_guidance")
-        except re.error:
-            pass
+    always_guidance_re = _always_guidance_regex(policy_cfg)
+    if always_guidance_re is not None and always_guidance_re.search(description):
+        classification = schema.GUIDANCE
+        _append_flag(flags, "policy:always_guidance")
 
     if guidance_hits:
         classification = schema.GUIDANCE
         _append_flag(flags, f"policy:guidance_add:{guidance_hits[0]}")
 
-    thresholds_cfg = policy_cfg.get("thresholds") if isinstance(policy_cfg.get("thresholds"), dict) else {}
-    threshold_amount = thresholds_cfg.get("guidance_amount_jpy") if isinstance(thresholds_cfg, dict) else None
+    thresholds_cfg = policy_cfg.get("thresholds")
+    threshold_amount = thresholds_cfg.get("guidance_amount_jpy") if isinstance(thresholds_cfg, Mapping) else None
     amount_value = item.get("amount")
     if (
         classification == schema.GUIDANCE
@@ -422,7 +561,7 @@ def _prorate_items(line_items: List[Dict[str, Any]]) -> None:
         del item["_prorate"]
 
 
-def classify_document(doc: Dict[str, Any], policy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def classify_document(doc: Dict[str, Any], policy: Optional[Mapping] = None) -> Dict[str, Any]:
     """Classify every line item in a v1-schema document.
 
     Iterates over ``doc["line_items"]`` and applies :func:`classify_line_item`
@@ -453,3 +592,283 @@ def classify_document(doc: Dict[str, Any], policy: Optional[Dict[str, Any]] = No
     _prorate_items(line_items)
 
     return doc
+
+
+# ---------------------------------------------------------------------------
+# 列指向の一括判定（台帳エクスポート等の大量明細向け）
+# ---------------------------------------------------------------------------
+_CLS_CAPITAL, _CLS_EXPENSE, _CLS_GUIDANCE = 0, 1, 2
+_CLS_NAMES = (schema.CAPITAL_LIKE, schema.EXPENSE_LIKE, schema.GUIDANCE)
+
+
+def _frame_text(df: Any, column: str) -> Any:
+    """Return *column* as a str Series (missing column / None / NaN → ``""``)."""
+    import pandas as pd
+
+    if column not in df.columns:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    col = df[column]
+    return col.where(col.notna(), "").astype(str)
+
+
+def _frame_source_text(df: Any) -> Any:
+    """Return evidence.source_text per row from a ``source_text`` or ``evidence`` column."""
+    import pandas as pd
+
+    if "source_text" in df.columns:
+        return _frame_text(df, "source_text")
+    if "evidence" in df.columns:
+        ev = df["evidence"].map(lambda e: e.get("source_text") if isinstance(e, dict) else None)
+        return ev.where(ev.notna(), "").astype(str)
+    return pd.Series([""] * len(df), index=df.index, dtype=object)
+
+
+def _frame_numbers(df: Any, column: str) -> Tuple[Any, Any]:
+    """Return ``(values, raw)`` for a numeric column.
+
+    ``values`` is a float64 array with NaN wherever classify_line_item would not
+    treat the cell as a number (missing, NaN, bool, str); ``raw`` holds the
+    original Python scalars for message formatting.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(df)
+    if column not in df.columns:
+        return np.full(n, np.nan), np.full(n, None, dtype=object)
+    col = df[column]
+    raw = col.to_numpy(dtype=object)
+    if pd.api.types.is_bool_dtype(col.dtype):
+        return np.full(n, np.nan), raw
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(dtype=np.float64, na_value=np.nan), raw
+    values = np.array(
+        [float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in raw],
+        dtype=np.float64,
+    )
+    return values, raw
+
+
+def _first_hits(search: Any, keywords: Tuple[str, ...], contains: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """Vectorized ``_find_keywords`` summary for one keyword category.
+
+    Args:
+        search: Series of (unique) search texts.
+        keywords: Category keywords in list order.
+        contains: Per-keyword hit arrays shared across categories.
+
+    Returns:
+        ``(any_hit, first_hit, hit_count)`` arrays; ``first_hit`` is the first
+        matching keyword in list order (``None`` where nothing matched).
+    """
+    import numpy as np
+
+    n = len(search)
+    if not keywords:
+        return np.zeros(n, dtype=bool), np.full(n, None, dtype=object), np.zeros(n, dtype=np.int64)
+    for kw in keywords:
+        if kw not in contains:
+            contains[kw] = (
+                np.ones(n, dtype=bool) if kw == ""
+                else search.str.contains(kw, regex=False).to_numpy(dtype=bool)
+            )
+    matrix = np.column_stack([contains[kw] for kw in keywords])
+    any_hit = matrix.any(axis=1)
+    first = np.array(keywords, dtype=object)[matrix.argmax(axis=1)]
+    first[~any_hit] = None
+    return any_hit, first, matrix.sum(axis=1)
+
+
+def classify_frame(frame: Any, policy: Optional[Mapping] = None, *, by: Optional[str] = None) -> Any:
+    """Classify a table of line items with column-wise (vectorized) operations.
+
+    Equivalent to running :func:`classify_document` over the rows (as
+    ``{"line_items": rows}``) but without building a dict per row: keyword
+    hits, policy overrides, the 10/20/30/60万 amount bands (``np.searchsorted``
+    on :data:`_TAX_BAND_EDGES`), the unit-price <10万 downgrade and
+    :func:`_calculate_confidence` are all computed on whole columns.
+
+    Recognised columns: ``description``, ``source_text`` (or an ``evidence``
+    column of dicts), ``amount`` and ``unit_price``. Missing cells (None/NaN)
+    are treated as absent keys.
+
+    Args:
+        frame: A pandas DataFrame, or any table with ``to_pandas()`` (e.g. a
+               pyarrow Table).
+        policy: Optional policy (plain dict or ``CompiledPolicy``).
+        by: Optional column identifying the source document of each row.
+            諸経費の按分は同じ値を持つ行の中で行う。省略時は全行を1書類として扱う。
+
+    Returns:
+        A DataFrame on the same index with ``classification``, ``label_ja``,
+        ``rationale_ja``, ``flags``, ``confidence`` and the prorate columns
+        ``_prorate_capital`` / ``_prorate_expense`` (None when not prorated).
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = frame
+    if not isinstance(df, pd.DataFrame) and hasattr(df, "to_pandas"):
+        df = df.to_pandas()
+    n = len(df)
+    policy_cfg = _safe_policy(policy)
+    keywords = _keyword_matcher_for(policy_cfg).keywords
+
+    description = _frame_text(df, "description")
+    search = description + " " + _frame_source_text(df)
+    amount, amount_raw = _frame_numbers(df, "amount")
+    unit_price, unit_price_raw = _frame_numbers(df, "unit_price")
+    has_amount = ~np.isnan(amount)
+
+    # 台帳は同じ摘要の繰り返しが多いため、ユニークな検索文字列だけを走査して行に展開する
+    codes, uniques = pd.factorize(search)
+    unique_search = pd.Series(uniques, dtype=object)
+    contains: Dict[str, Any] = {}
+    hits = {
+        cat: tuple(arr[codes] for arr in _first_hits(unique_search, keywords[cat], contains))
+        for cat in (KW_CAPITAL, KW_EXPENSE, KW_MIXED, KW_GUIDANCE, KW_ASSET_INCLUSION, KW_PRORATE)
+    }
+    cap_any, cap_first, cap_count = hits[KW_CAPITAL]
+    exp_any, exp_first, exp_count = hits[KW_EXPENSE]
+    mixed_any, mixed_first, _ = hits[KW_MIXED]
+    guid_any, guid_first, _ = hits[KW_GUIDANCE]
+    incl_any, incl_first, incl_count = hits[KW_ASSET_INCLUSION]
+    pror_any, pror_first, _ = hits[KW_PRORATE]
+
+    none_col = np.full(n, None, dtype=object)
+
+    def _flag(mask: Any, prefix: str, values: Any = None) -> Any:
+        col = none_col.copy()
+        if values is None:
+            col[mask] = prefix
+        elif mask.any():
+            col[mask] = [prefix + str(v) for v in values[mask]]
+        return col
+
+    flag_cols: List[Any] = [_flag(pror_any, "prorate:", pror_first)]
+
+    # 運搬費等は資産取得価額に算入
+    inclusion = incl_any & ~exp_any
+    use_incl = inclusion & ~cap_any
+    cap_first = np.where(use_incl, incl_first, cap_first)
+    cap_count = np.where(use_incl, incl_count, cap_count)
+    cap_any = cap_any | use_incl
+    flag_cols.append(_flag(inclusion, "asset_inclusion:", incl_first))
+
+    conflicting = ~mixed_any & cap_any & exp_any
+    no_keywords = ~mixed_any & ~cap_any & ~exp_any
+    cls = np.select(
+        [mixed_any, conflicting, cap_any, exp_any],
+        [_CLS_GUIDANCE, _CLS_GUIDANCE, _CLS_CAPITAL, _CLS_EXPENSE],
+        default=_CLS_GUIDANCE,
+    )
+    base_flag = _flag(mixed_any, "mixed_keyword:", mixed_first)
+    base_flag[conflicting] = "conflicting_keywords"
+    base_flag[no_keywords] = "no_keywords"
+    flag_cols.append(base_flag)
+
+    # Stop-first: policy overrides only add more GUIDANCE reasons.
+    always_guidance_re = _always_guidance_regex(policy_cfg)
+    if always_guidance_re is not None:
+        always = description.map(lambda d: always_guidance_re.search(d) is not None).to_numpy(dtype=bool)
+        cls = np.where(always, _CLS_GUIDANCE, cls)
+        flag_cols.append(_flag(always, "policy:always_guidance"))
+
+    cls = np.where(guid_any, _CLS_GUIDANCE, cls)
+    flag_cols.append(_flag(guid_any, "policy:guidance_add:", guid_first))
+
+    thresholds_cfg = policy_cfg.get("thresholds")
+    threshold_amount = thresholds_cfg.get("guidance_amount_jpy") if isinstance(thresholds_cfg, Mapping) else None
+    if isinstance(threshold_amount, (int, float)) and not isinstance(threshold_amount, bool):
+        over = (cls == _CLS_GUIDANCE) & has_amount & (np.where(has_amount, amount, 0) >= threshold_amount)
+        flag_cols.append(_flag(over, "policy:amount_threshold"))
+
+    # Tax rules (10/20/30/60万): 金額帯ごとのルールは _apply_tax_rules から導出する
+    keyword_based = cls != _CLS_GUIDANCE
+    positive = has_amount & (np.where(has_amount, amount, 0) > 0)
+    band = np.searchsorted(np.asarray(_TAX_BAND_EDGES, dtype=np.float64), np.where(positive, amount, 0), side="right")
+    band_rules = [_apply_tax_rules(edge) for edge in (1,) + _TAX_BAND_EDGES]
+    max_rules = max(len(rules) for rules in band_rules)
+    for slot in range(max_rules):
+        table = np.array(
+            [f"tax_rule:{rules[slot]['rule_id']}:{rules[slot]['reason']}" if slot < len(rules) else None for rules in band_rules],
+            dtype=object,
+        )
+        col = table[band]
+        col[~positive] = None
+        flag_cols.append(col)
+    band_guidance = np.array([any(r.get("suggests_guidance") is True for r in rules) for rules in band_rules])
+    cls = np.where(positive & band_guidance[band] & ~keyword_based, _CLS_GUIDANCE, cls)
+
+    # 単価ベース判定: CAPITAL_LIKE でも単価10万円未満なら GUIDANCE（Stop-first原則）
+    has_unit = ~np.isnan(unit_price)
+    small_unit = (cls == _CLS_CAPITAL) & has_unit & (np.where(has_unit, unit_price, np.inf) < 100_000)
+    cls = np.where(small_unit, _CLS_GUIDANCE, cls)
+    unit_flag = none_col.copy()
+    for i in np.flatnonzero(small_unit):
+        unit_flag[i] = f"tax_rule:R-UNIT-PRICE-100k:単価{int(unit_price_raw[i]):,}円が10万円未満のため少額資産の可能性（要確認）"
+    flag_cols.append(unit_flag)
+
+    is_cap = cls == _CLS_CAPITAL
+    is_exp = cls == _CLS_EXPENSE
+    rationale = np.full(n, GUIDANCE_RATIONALE, dtype=object)
+    if is_cap.any():
+        rationale[is_cap] = [f"明細に「{kw}」が含まれるため資産寄りと判定" for kw in cap_first[is_cap]]
+    if is_exp.any():
+        rationale[is_exp] = [f"明細に「{kw}」が含まれるため費用寄りと判定" for kw in exp_first[is_exp]]
+
+    # 確信度（_calculate_confidence と同じ式）
+    cap_conf = np.minimum(0.85 + np.minimum(cap_count - 1, 2) * 0.03, 0.95)
+    exp_conf = np.minimum(0.85 + np.minimum(exp_count - 1, 2) * 0.03, 0.95)
+    guid_conf = np.select(
+        [conflicting, no_keywords, mixed_any, guid_any],
+        [0.55, 0.40, 0.60, 0.65],
+        default=0.50,
+    )
+    confidence = np.where(is_cap, cap_conf, np.where(is_exp, exp_conf, guid_conf))
+
+    flags = [[f for f in row if f is not None] for row in zip(*flag_cols)]
+    cls_names = np.array(_CLS_NAMES, dtype=object)[cls]
+
+    # 諸経費の按分処理（_prorate_items と同じ規則、書類単位）
+    prorate_capital = none_col.copy()
+    prorate_expense = none_col.copy()
+    if pror_any.any():
+        if by is not None and by in df.columns:
+            groups, _ = pd.factorize(df[by], use_na_sentinel=False)
+        else:
+            groups = np.zeros(n, dtype=np.int64)
+        weights = np.where(has_amount & (amount != 0), amount, 0.0)
+        n_groups = int(groups.max()) + 1 if n else 0
+        capital_total = np.bincount(groups, weights=np.where(is_cap & ~pror_any, weights, 0.0), minlength=n_groups)
+        expense_total = np.bincount(groups, weights=np.where(is_exp & ~pror_any, weights, 0.0), minlength=n_groups)
+        for i in np.flatnonzero(pror_any):
+            base_total = capital_total[groups[i]] + expense_total[groups[i]]
+            amt = amount_raw[i] if has_amount[i] and amount_raw[i] else 0
+            if base_total <= 0 or amt <= 0:
+                continue
+            capital_ratio = capital_total[groups[i]] / base_total
+            expense_share = int(amt * (1 - capital_ratio) + 0.5)
+            capital_share = amt - expense_share
+            prorate_capital[i] = capital_share
+            prorate_expense[i] = expense_share
+            if capital_share >= expense_share:
+                cls_names[i] = schema.CAPITAL_LIKE
+                rationale[i] = f"諸経費を按分: 資産¥{capital_share:,} / 経費¥{expense_share:,}"
+            else:
+                cls_names[i] = schema.EXPENSE_LIKE
+                rationale[i] = f"諸経費を按分: 経費¥{expense_share:,} / 資産¥{capital_share:,}"
+
+    label = pd.Series(cls_names, dtype=object).map(LABEL_JA).to_numpy(dtype=object)
+    return pd.DataFrame(
+        {
+            "classification": cls_names,
+            "label_ja": label,
+            "rationale_ja": rationale,
+            "flags": pd.Series(flags, dtype=object).to_numpy(dtype=object) if n else np.empty(0, dtype=object),
+            "confidence": confidence.astype(np.float64),
+            "_prorate_capital": prorate_capital,
+            "_prorate_expense": prorate_expense,
+        },
+        index=df.index,
+    )
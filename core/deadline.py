@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Per-request deadline budget.
+
+API の入口で :class:`Deadline` を作って :func:`set_deadline` し、以降の各ステージ
+（PDF抽出・Gemini・Vertex AI Search・耐用年数推定）は :func:`current_deadline` から
+残り時間を取り出して自分のタイムアウトに使う。予算が尽きたステージは外部呼び出しを
+行わず、ルールベース / Stop-first（GUIDANCE）のフォールバックに切り替える。
+
+- 期限は contextvars で伝搬する。``run_io`` はコンテキストごとスレッドに渡すが、
+  プロセスプールには渡らないため ``extract_pdf`` には :meth:`Deadline.wall_time` を
+  引数で渡し、ワーカー側で :meth:`Deadline.at_wall_time` から復元する
+- 期限を設定していないコードからは「無期限」の Deadline が見える（従来どおりの動作）
+"""
+import contextvars
+import os
+import time
+from typing import Callable, Optional
+
+# これ未満の残り時間では外部 API 呼び出しを始めない（接続だけで使い切るため）
+MIN_REMOTE_SECONDS_DEFAULT = 2.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage cannot start because the request budget is spent."""
+
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute expiry on a monotonic clock (``None`` seconds = unlimited)."""
+
+    __slots__ = ("expires_at", "_clock")
+
+    def __init__(self, seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self.expires_at: Optional[float] = None
+        if seconds is not None and seconds > 0:
+            self.expires_at = clock() + seconds
+
+    @classmethod
+    def at_wall_time(cls, wall_time: Optional[float]) -> "Deadline":
+        """Rebuild a deadline from :meth:`wall_time` (e.g. in another process)."""
+        if wall_time is None:
+            return cls()
+        return cls(max(1e-3, wall_time - time.time()))
+
+    @property
+    def unlimited(self) -> bool:
+        return self.expires_at is None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or ``None`` when unlimited."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0.0
+
+    def has(self, seconds: float) -> bool:
+        """True when at least ``seconds`` of budget are left."""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Stage timeout in seconds: the remaining budget, capped at ``cap``."""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+    def timeout_ms(self, cap_ms: Optional[int] = None) -> Optional[int]:
+        """Same as :meth:`timeout` in whole milliseconds (for ``HttpOptions``)."""
+        cap = None if cap_ms is None else cap_ms / 1000.0
+        seconds = self.timeout(cap)
+        return None if seconds is None else max(1, int(seconds * 1000))
+
+    def child(self, seconds: Optional[float]) -> "Deadline":
+        """A deadline that expires after ``seconds`` or with this one, whichever is first."""
+        budget = self.timeout(seconds)
+        if budget is None:
+            return Deadline(clock=self._clock)
+        return Deadline(max(budget, 1e-6), clock=self._clock)
+
+    def wall_time(self) -> Optional[float]:
+        """Expiry as ``time.time()`` (comparable across processes)."""
+        remaining = self.remaining()
+        return None if remaining is None else time.time() + remaining
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def __repr__(self) -> str:
+        remaining = self.remaining()
+        return "Deadline(unlimited)" if remaining is None else f"Deadline(remaining={remaining:.3f}s)"
+
+
+_UNLIMITED = Deadline()
+_current: "contextvars.ContextVar[Deadline]" = contextvars.ContextVar("fixed_asset_deadline", default=_UNLIMITED)
+
+
+def current_deadline() -> Deadline:
+    """The deadline of the request being processed (unlimited outside a request)."""
+    return _current.get()
+
+
+def set_deadline(deadline: Deadline) -> contextvars.Token:
+    """Make ``deadline`` current for this context; returns a token for :func:`reset_deadline`."""
+    return _current.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def min_remote_seconds() -> float:
+    """Smallest budget worth starting a remote call with (DEADLINE_MIN_REMOTE_SECONDS, default 2)."""
+    try:
+        return float(os.getenv("DEADLINE_MIN_REMOTE_SECONDS", MIN_REMOTE_SECONDS_DEFAULT))
+    except (TypeError, ValueError):
+        return MIN_REMOTE_SECONDS_DEFAULT
@@ -0,0 +1,291 @@
+"""Content-addressed cache for extract_pdf results.
+
+同じPDF（GUIDANCE の質問に答えた後の再アップロード等）を再度 fitz / pdfplumber /
+OCR / Gemini Vision / Document AI にかけないよう、抽出結果を
+「PDF の sha256 + 抽出オプション」をキーにキャッシュする。
+
+- メモリ層: JSON 文字列の LRU（EXTRACTION_CACHE_MEM_ITEMS、既定 128 件）
+- ディスク層: ``<key>.json`` ファイル（EXTRACTION_CACHE_DIR、既定 data/cache/extraction）。
+  合計サイズが EXTRACTION_CACHE_DISK_MB（既定 256、0 で無効）を超えたら古い順に削除する。
+
+キャッシュ実装は :func:`set_extraction_cache` で差し替えられる（``get``/``put``/``stats``
+を持つオブジェクトなら何でもよい。``None`` でキャッシュ無効）。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("fixed_asset_api")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 抽出ロジックを変えたら上げる（古いキャッシュを自動的に無効化する）
+EXTRACTOR_VERSION = 1
+
+_DEFAULT_MEM_ITEMS = 128
+_DEFAULT_DISK_MB = 256
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    val = os.getenv(name)
+    if val is None:
+        return default
+    return str(val).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def extraction_options(
+    *,
+    use_docai: bool = False,
+    use_ocr: bool = False,
+    use_gemini_vision: bool = False,
+) -> Dict[str, Any]:
+    """Return the options that actually drive extract_pdf (call args OR env flags)."""
+    from core.pdf_extract import OCR_TEXT_THRESHOLD_DEFAULT
+
+    return {
+        "use_docai": bool(use_docai or _bool_env("USE_DOCAI", False)),
+        "use_ocr": bool(use_ocr or _bool_env("USE_LOCAL_OCR", False)),
+        "use_gemini_vision": bool(use_gemini_vision or _bool_env("GEMINI_PDF_ENABLED", False)),
+        "ocr_threshold": _int_env("OCR_TEXT_THRESHOLD", OCR_TEXT_THRESHOLD_DEFAULT),
+    }
+
+
+def cache_key(sha256: str, options: Dict[str, Any]) -> str:
+    """Key = sha256(PDF sha256 + extractor options + EXTRACTOR_VERSION)."""
+    payload = json.dumps(
+        {"sha256": sha256, "options": options, "version": EXTRACTOR_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(extraction: Dict[str, Any], options: Dict[str, Any]) -> bool:
+    """Skip results where a requested remote extractor fell back to local parsing.
+
+    Gemini Vision / Document AI の一時的な失敗をキャッシュすると、次回も
+    ローカル抽出結果が返り続けてしまうため。
+    """
+    source = (extraction.get("meta") or {}).get("source")
+    if options.get("use_gemini_vision") and _bool_env("GEMINI_PDF_ENABLED", False):
+        return source == "gemini_vision"
+    # _try_docai は引数に関わらず USE_DOCAI=1 のときだけ実行される
+    if _bool_env("USE_DOCAI", False) and os.getenv("GOOGLE_CLOUD_PROJECT") and os.getenv("DOCAI_PROCESSOR_ID"):
+        return source == "docai"
+    return True
+
+
+class ExtractionCache:
+    """Two-tier (memory LRU + size-bounded directory) extraction cache."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_memory_items: int = _DEFAULT_MEM_ITEMS,
+        max_disk_bytes: int = _DEFAULT_DISK_MB * 1024 * 1024,
+    ) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir and max_disk_bytes > 0 else None
+        self.max_memory_items = max(0, max_memory_items)
+        self.max_disk_bytes = max(0, max_disk_bytes)
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # 初回書き込み時にディレクトリを走査
+        self._counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions_disk": 0}
+
+    # --- memory tier ---
+    def _remember(self, key: str, payload: str) -> None:
+        if self.max_memory_items <= 0:
+            return
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # --- disk tier ---
+    def _path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            payload = path.read_text(encoding="utf-8")
+            os.utime(path)  # mtime を LRU の最終利用時刻として使う
+            return payload
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Extraction cache read failed (%s): %s", path.name, e)
+            return None
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for entry in self.cache_dir.glob("*.json"):
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _evict_disk(self) -> None:
+        """Delete least-recently-used files until the directory fits max_disk_bytes."""
+        entries = []
+        for entry in self.cache_dir.glob("*.json"):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                entry.unlink()
+                total -= size
+                self._counters["evictions_disk"] += 1
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def _write_disk(self, key: str, payload: str) -> None:
+        if self.cache_dir is None:
+            return
+        data = payload.encode("utf-8")
+        if len(data) > self.max_disk_bytes:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            path = self._path(key)
+            previous = path.stat().st_size if path.exists() else 0
+            # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+            fd, tmp_name = tempfile.mkstemp(dir=str(self.cache_dir), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+            self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+        except OSError as e:
+            logger.warning("Extraction cache write failed: %s", e)
+
+    # --- public API ---
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached extraction, or None."""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self._counters["hits_memory"] += 1
+            else:
+                payload = self._read_disk(key)
+                if payload is not None:
+                    self._remember(key, payload)
+                    self._counters["hits_disk"] += 1
+                else:
+                    self._counters["misses"] += 1
+                    return None
+        try:
+            return json.loads(payload)
+        except ValueError:
+            logger.warning("Extraction cache entry %s is corrupt; ignoring", key[:12])
+            return None
+
+    def put(self, key: str, extraction: Dict[str, Any]) -> None:
+        try:
+            payload = json.dumps(extraction, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning("Extraction result not cacheable: %s", e)
+            return
+        with self._lock:
+            self._remember(key, payload)
+            self._write_disk(key, payload)
+            self._counters["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir is not None and self.cache_dir.exists():
+                for entry in self.cache_dir.glob("*.json"):
+                    try:
+                        entry.unlink()
+                    except OSError:
+                        pass
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            out["hits"] = out["hits_memory"] + out["hits_disk"]
+            out["memory_items"] = len(self._memory)
+            out["disk_bytes"] = self._disk_bytes
+            out["disk_enabled"] = self.cache_dir is not None
+            return out
+
+
+def _default_cache() -> Optional[ExtractionCache]:
+    if not _bool_env("EXTRACTION_CACHE_ENABLED", True):
+        return None
+    cache_dir = os.getenv("EXTRACTION_CACHE_DIR") or str(PROJECT_ROOT / "data" / "cache" / "extraction")
+    return ExtractionCache(
+        cache_dir=Path(cache_dir),
+        max_memory_items=_int_env("EXTRACTION_CACHE_MEM_ITEMS", _DEFAULT_MEM_ITEMS),
+        max_disk_bytes=_int_env("EXTRACTION_CACHE_DISK_MB", _DEFAULT_DISK_MB) * 1024 * 1024,
+    )
+
+
+_cache: Optional[Any] = _default_cache()
+
+
+def get_extraction_cache() -> Optional[Any]:
+    """Return the active cache (None when caching is disabled)."""
+    return _cache
+
+
+def set_extraction_cache(cache: Optional[Any]) -> None:
+    """Swap the cache implementation (tests, or a shared backend)."""
+    global _cache
+    _cache = cache
+
+
+def lookup(sha256: str, options: Dict[str, Any], filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Look up a cached extraction; ``meta.filename`` is rewritten to the new upload's name."""
+    cache = _cache
+    if cache is None:
+        return None
+    hit = cache.get(cache_key(sha256, options))
+    if hit is not None and filename is not None:
+        hit.setdefault("meta", {})["filename"] = filename
+    return hit
+
+
+def store(sha256: str, options: Dict[str, Any], extraction: Dict[str, Any]) -> None:
+    cache = _cache
+    if cache is None or not is_cacheable(extraction, options):
+        return
+    cache.put(cache_key(sha256, options), extraction)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Counters for /health (``{"enabled": False}`` when disabled)."""
+    cache = _cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide google-genai client registry.
+
+``genai.Client`` は内部に HTTP コネクションプールを持つため、呼び出しごとに
+作り直すと毎回 TLS ハンドシェイクと認証初期化が発生する。このモジュールは
+認証設定（Vertex AI / API キー）ごとにクライアントを1つだけ作って使い回す。
+
+- タイムアウトはクライアントではなく呼び出しごとに :func:`http_options` で指定する
+- asyncio から使う場合は :func:`get_async_client`（``client.aio``）を使う。
+  httpx の非同期コネクションはイベントループに紐づくため、ループごとに別クライアントを持つ
+- 認証情報が未設定なら ``None`` を返す（メッセージは呼び出し側で組み立てる）
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("fixed_asset_api")
+
+_clients: Dict[Tuple[Any, ...], Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, ...], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def _credentials_key() -> Optional[Tuple[Any, ...]]:
+    """Identify the active credentials from env (None when nothing is configured)."""
+    if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
+        return ("vertex", os.getenv("GOOGLE_CLOUD_PROJECT"), os.getenv("GOOGLE_CLOUD_LOCATION"))
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        return ("api_key", api_key)
+    return None
+
+
+def _new_client(key: Tuple[Any, ...]) -> Any:
+    from google import genai
+
+    if key[0] == "vertex":
+        return genai.Client()
+    return genai.Client(api_key=key[1])
+
+
+def get_client() -> Optional[Any]:
+    """Return the shared ``genai.Client`` for the current credentials.
+
+    Raises:
+        ImportError: google-genai is not installed
+    """
+    key = _credentials_key()
+    if key is None:
+        return None
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _new_client(key)
+                _clients[key] = client
+    return client
+
+
+def get_async_client() -> Optional[Any]:
+    """Return ``client.aio`` for the running event loop (must be called inside a coroutine)."""
+    key = _credentials_key()
+    if key is None:
+        return None
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(key)
+        if client is None:
+            client = _new_client(key)
+            per_loop[key] = client
+    return client.aio
+
+
+def http_options(timeout_ms: Optional[int]) -> Any:
+    """Per-call ``HttpOptions`` (pass as ``config.http_options``)."""
+    from google.genai import types
+
+    return types.HttpOptions(timeout=timeout_ms)
+
+
+def reset_clients() -> None:
+    """Drop all cached clients (credentials rotated, tests)."""
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
+
+
+def client_stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            "sync_clients": len(_clients),
+            "async_clients": sum(len(v) for v in _async_clients.values()),
+        }
@@ -3,12 +3,19 @@
 
 CSV/Excelファイルから固定資産台帳を読み込み、
 統一されたフォーマットの辞書リストとして返す。
+
+変換は列単位（pd.to_numeric・文字列メソッド）で行い、行ごとのエラーは
+ブールマスクで集める。百万行規模の連結台帳は :func:`iter_ledger` で
+``chunk_size`` 行ずつ読み込み・変換し、レコードのリストを順に返す
+（CSV はファイル全体をメモリに載せない）。
 """
 
+import codecs
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 
@@ -54,6 +61,15 @@ OPTIONAL_COLUMN_MAPPINGS = {
 }
 
 
+# iter_ledger が1回に読み込む行数
+DEFAULT_CHUNK_ROWS = 50_000
+
+CSV_ENCODINGS = ['utf-8', 'utf-8-sig', 'shift_jis', 'cp932']
+
+# 取得価額・耐用年数の文字列から除去する文字（カンマ、空白、円記号）
+_NUMERIC_NOISE = r'[,\s¥￥円]'
+
+
 class LedgerImportError(Exception):
     """台帳インポート時のエラー"""
     pass
@@ -126,59 +142,205 @@ def _validate_required_columns(mapping: Dict[str, str]) -> None:
         )
 
 
-def _convert_to_numeric(value: Any) -> Optional[float]:
-    """値を数値に変換"""
-    if pd.isna(value):
-        return None
-
-    if isinstance(value, (int, float)):
-        return float(value)
+def _text_series(series: pd.Series) -> pd.Series:
+    """列を str() 相当の文字列にして前後の空白を除く（欠損は欠損のまま）"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # str(Timestamp) と同じ表記（"2024-04-01 00:00:00"）にそろえる
+        text = series.map(str)
+    else:
+        text = series.astype(str)
+    return text.str.strip().where(series.notna())
+
+
+def _numeric_series(series: pd.Series) -> pd.Series:
+    """列単位で値を数値に変換（取得価額・耐用年数用）。変換できない値は NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    # 全角数字・全角記号を半角にしてから、カンマ・円記号・空白を除去
+    text = series.astype(str).str.normalize("NFKC").str.replace(_NUMERIC_NOISE, '', regex=True)
+    numeric = pd.to_numeric(text.where(series.notna()), errors='coerce').astype(float)
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        return numeric
+    # Excel の混在列: 文字列・数値以外（日付など）は数値として扱わない
+    is_number = series.map(lambda v: isinstance(v, (str, int, float)), na_action='ignore')
+    return numeric.where(is_number.fillna(False).astype(bool))
+
+
+def _convert_frame(
+    df: pd.DataFrame,
+    column_mapping: Dict[str, str],
+    first_row: int = 2,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    DataFrame を台帳レコードに変換する（列単位の変換 + マスクによる行エラー収集）
 
-    if isinstance(value, str):
-        # カンマ、円記号、スペースを除去
-        cleaned = re.sub(r'[,\s¥￥円]', '', value)
-        try:
-            return float(cleaned)
-        except ValueError:
-            return None
+    Args:
+        first_row: ``df`` の先頭行のExcel行番号（ヘッダー行=1）
 
-    return None
+    Returns:
+        (records, errors) — エラーは1行につき最初に見つかった1件、行番号順
+    """
+    raw = {key: df[col] for key, col in column_mapping.items()}
+    names = _text_series(raw['name'])
+    amounts = _numeric_series(raw['amount'])
+    accounts = _text_series(raw['account'])
+    lives = np.trunc(_numeric_series(raw['useful_life']).to_numpy())
+    raw_amounts = raw['amount'].to_numpy(dtype=object)
+    raw_lives = raw['useful_life'].to_numpy(dtype=object)
+
+    remaining = np.ones(len(df), dtype=bool)
+    errors: List[Tuple[int, str]] = []
+
+    def check(ok: np.ndarray, message: Any) -> None:
+        """まだエラーの無い行のうち ok でない行を記録し、以降の検査から外す"""
+        bad = remaining & ~ok
+        for position in np.flatnonzero(bad):
+            errors.append((position, f"行{first_row + position}: {message(position)}"))
+        remaining[bad] = False
+
+    with np.errstate(invalid='ignore'):
+        check(names.fillna('').ne('').to_numpy(dtype=bool), lambda i: "資産名が空です")
+        check(amounts.notna().to_numpy(dtype=bool), lambda i: f"取得価額を数値に変換できません: {raw_amounts[i]}")
+        check(accounts.fillna('').ne('').to_numpy(dtype=bool), lambda i: "勘定科目が空です")
+        check(np.isfinite(lives), lambda i: f"耐用年数を数値に変換できません: {raw_lives[i]}")
+        check(lives > 0, lambda i: f"耐用年数は正の整数である必要があります: {int(lives[i])}")
+
+    columns: Dict[str, List[Any]] = {
+        'name': names.to_numpy(dtype=object)[remaining].tolist(),
+        'amount': amounts.to_numpy(dtype=float)[remaining].tolist(),
+        'account': accounts.to_numpy(dtype=object)[remaining].tolist(),
+        'useful_life': lives[remaining].astype(np.int64).tolist(),
+    }
+    optional = [key for key in OPTIONAL_COLUMN_MAPPINGS if key in raw]
+    for key in optional:
+        values = _text_series(raw[key])
+        columns[key] = values.astype(object).where(values.notna(), None).to_numpy()[remaining].tolist()
 
+    records = []
+    for row in zip(*columns.values()):
+        record = dict(zip(columns, row))
+        for key in optional:
+            if record[key] is None:
+                del record[key]
+        records.append(record)
 
-def _convert_to_int(value: Any) -> Optional[int]:
-    """値を整数に変換（耐用年数用）"""
-    numeric = _convert_to_numeric(value)
-    if numeric is not None:
-        return int(numeric)
-    return None
+    errors.sort(key=lambda e: e[0])
+    return records, [message for _, message in errors]
 
 
-def _read_csv_with_encoding(file_path: str) -> pd.DataFrame:
-    """
-    UTF-8 → Shift-JIS の順でCSVを読み込む
+def _detect_csv_encoding(file_path: str) -> str:
     """
-    encodings = ['utf-8', 'utf-8-sig', 'shift_jis', 'cp932']
+    UTF-8 → Shift-JIS の順で、ファイル全体を復号できるエンコーディングを返す
 
-    last_error = None
-    for encoding in encodings:
+    チャンク読み込みの途中で復号エラーにならないよう、先にバイト列を逐次復号して確かめる。
+    """
+    last_error: Optional[Exception] = None
+    for encoding in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
         try:
-            df = pd.read_csv(file_path, encoding=encoding)
-            # 空のDataFrameでないか確認
-            if not df.empty:
-                return df
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+            return encoding
         except (UnicodeDecodeError, UnicodeError) as e:
             last_error = e
-            continue
-        except Exception as e:
-            last_error = e
-            continue
-
     raise LedgerImportError(
         f"CSVファイルの読み込みに失敗しました。対応エンコーディング: UTF-8, Shift-JIS\n"
         f"詳細: {last_error}"
     )
 
 
+def _iter_csv_frames(file_path: str, chunk_size: int) -> Iterator[Tuple[pd.DataFrame, Dict[str, str]]]:
+    """CSVを chunk_size 行ずつ読む（台帳で使う列だけ、すべて文字列として読み込む）"""
+    encoding = _detect_csv_encoding(file_path)
+    try:
+        header = pd.read_csv(file_path, encoding=encoding, nrows=0)
+    except pd.errors.EmptyDataError:
+        raise LedgerImportError("ファイルにデータが含まれていません")
+    except Exception as e:
+        raise LedgerImportError(f"CSVファイルの読み込みに失敗しました: {e}")
+
+    column_mapping = _find_column_mapping(header.columns.tolist())
+    _validate_required_columns(column_mapping)
+
+    # チャンクごとに型推論が変わらないよう文字列で読み、数値化は _convert_frame で行う
+    try:
+        reader = pd.read_csv(
+            file_path, encoding=encoding, dtype=str,
+            usecols=list(dict.fromkeys(column_mapping.values())), chunksize=chunk_size,
+        )
+        with reader:
+            for chunk in reader:
+                yield chunk, column_mapping
+    except Exception as e:
+        raise LedgerImportError(f"CSVファイルの読み込みに失敗しました: {e}")
+
+
+def iter_ledger(
+    file_path: str,
+    chunk_size: int = DEFAULT_CHUNK_ROWS,
+    errors: Optional[List[str]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    固定資産台帳を chunk_size 行ずつ変換し、レコードのリストを順に返す
+
+    CSV はチャンク単位で読み込むため、ファイルより少ないメモリで処理できる。
+    Excel は一括で読み込み、変換だけを chunk_size 行ずつ行う。
+
+    Args:
+        file_path: CSVまたはExcelファイルのパス
+        chunk_size: 1回に読み込む行数
+        errors: 渡された場合、行ごとのエラーメッセージを追記する
+
+    Yields:
+        List[Dict[str, Any]]: import_ledger と同じ形式のレコード（空のリストは返さない）
+
+    Raises:
+        LedgerImportError: ファイル読み込みに失敗した場合
+        ColumnMappingError: 必須カラムが見つからない場合
+    """
+    path = Path(file_path)
+
+    if not path.exists():
+        raise LedgerImportError(f"ファイルが見つかりません: {file_path}")
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive: {chunk_size}")
+
+    # ファイル形式に応じて読み込み
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        frames = _iter_csv_frames(file_path, chunk_size)
+    elif suffix in ['.xlsx', '.xls']:
+        frames = _iter_excel_frames(file_path, chunk_size)
+    else:
+        raise LedgerImportError(
+            f"サポートされていないファイル形式です: {suffix}\n"
+            "対応形式: .csv, .xlsx, .xls"
+        )
+
+    first_row = 2  # Excelの行番号（ヘッダー行=1）
+    for frame, column_mapping in frames:
+        records, frame_errors = _convert_frame(frame, column_mapping, first_row)
+        first_row += len(frame)
+        if errors is not None:
+            errors.extend(frame_errors)
+        if records:
+            yield records
+    if first_row == 2:
+        raise LedgerImportError("ファイルにデータが含まれていません")
+
+
+def _iter_excel_frames(file_path: str, chunk_size: int) -> Iterator[Tuple[pd.DataFrame, Dict[str, str]]]:
+    df = _read_excel(file_path)
+    if df.empty:
+        raise LedgerImportError("ファイルにデータが含まれていません")
+    column_mapping = _find_column_mapping(df.columns.tolist())
+    _validate_required_columns(column_mapping)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size], column_mapping
+
+
 def _read_excel(file_path: str) -> pd.DataFrame:
     """
     Excelファイルを読み込む
@@ -226,90 +388,10 @@ def import_ledger(file_path: str) -> List[Dict[str, Any]]:
         ColumnMappingError: 必須カラムが見つからない場合
         ValidationError: データのバリデーションに失敗した場合
     """
-    path = Path(file_path)
-
-    if not path.exists():
-        raise LedgerImportError(f"ファイルが見つかりません: {file_path}")
-
-    # ファイル形式に応じて読み込み
-    suffix = path.suffix.lower()
-    if suffix == '.csv':
-        df = _read_csv_with_encoding(file_path)
-    elif suffix in ['.xlsx', '.xls']:
-        df = _read_excel(file_path)
-    else:
-        raise LedgerImportError(
-            f"サポートされていないファイル形式です: {suffix}\n"
-            "対応形式: .csv, .xlsx, .xls"
-        )
-
-    if df.empty:
-        raise LedgerImportError("ファイルにデータが含まれていません")
-
-    # カラムマッピングを検出
-    column_mapping = _find_column_mapping(df.columns.tolist())
-
-    # 必須カラムの検証
-    _validate_required_columns(column_mapping)
-
-    # データを変換
-    results = []
-    errors = []
-
-    for idx, row in df.iterrows():
-        row_num = idx + 2  # Excelの行番号（ヘッダー行=1）
-
-        try:
-            record = {}
-
-            # 必須カラムの処理
-            # name
-            name_col = column_mapping['name']
-            name_value = row[name_col]
-            if pd.isna(name_value) or str(name_value).strip() == '':
-                errors.append(f"行{row_num}: 資産名が空です")
-                continue
-            record['name'] = str(name_value).strip()
-
-            # amount
-            amount_col = column_mapping['amount']
-            amount_value = _convert_to_numeric(row[amount_col])
-            if amount_value is None:
-                errors.append(f"行{row_num}: 取得価額を数値に変換できません: {row[amount_col]}")
-                continue
-            record['amount'] = amount_value
-
-            # account
-            account_col = column_mapping['account']
-            account_value = row[account_col]
-            if pd.isna(account_value) or str(account_value).strip() == '':
-                errors.append(f"行{row_num}: 勘定科目が空です")
-                continue
-            record['account'] = str(account_value).strip()
-
-            # useful_life
-            life_col = column_mapping['useful_life']
-            life_value = _convert_to_int(row[life_col])
-            if life_value is None:
-                errors.append(f"行{row_num}: 耐用年数を数値に変換できません: {row[life_col]}")
-                continue
-            if life_value <= 0:
-                errors.append(f"行{row_num}: 耐用年数は正の整数である必要があります: {life_value}")
-                continue
-            record['useful_life'] = life_value
-
-            # オプショナルカラムの処理
-            for opt_col in OPTIONAL_COLUMN_MAPPINGS.keys():
-                if opt_col in column_mapping:
-                    opt_value = row[column_mapping[opt_col]]
-                    if not pd.isna(opt_value):
-                        record[opt_col] = str(opt_value).strip()
-
-            results.append(record)
-
-        except Exception as e:
-            errors.append(f"行{row_num}: 処理エラー: {e}")
-            continue
+    results: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    for records in iter_ledger(file_path, errors=errors):
+        results.extend(records)
 
     # エラーがあれば報告（ただし部分的に成功した場合は結果も返す）
     if errors and not results:
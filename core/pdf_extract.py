@@ -1,15 +1,21 @@
 import datetime
 import hashlib
+import io
 import logging
 import os
 import re
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from core.deadline import Deadline, current_deadline, min_remote_seconds, reset_deadline, set_deadline
 
 logger = logging.getLogger("fixed_asset_api")
 
 OCR_TEXT_THRESHOLD_DEFAULT = 50
 TEXT_TOO_SHORT_CODE = "TEXT_TOO_SHORT"
+DEADLINE_SKIPPED_CODE = "DEADLINE_SKIPPED"
 
 # 日付パターン（金額誤認防止: 数字抽出前に除去する）
 _DATE_RE = re.compile(
@@ -40,6 +46,10 @@ def _int_env(name: str, default: int) -> int:
         return default
 
 
+# PDF の入力元: ファイルパス、またはメモリ上のバイト列（extract_pdf は1回だけ読み込んで共有する）
+PdfSource = Union[Path, str, bytes]
+
+
 def _compute_sha256(path: Path) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
@@ -48,6 +58,44 @@ def _compute_sha256(path: Path) -> str:
     return h.hexdigest()
 
 
+def _open_fitz(source: PdfSource) -> Any:
+    import fitz  # PyMuPDF
+
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(str(source))
+
+
+def _open_pdfplumber(source: PdfSource, pages: Optional[Sequence[int]] = None) -> Any:
+    import pdfplumber
+
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else str(source)
+    return pdfplumber.open(fp, pages=list(pages) if pages is not None else None)
+
+
+def _fitz_page_count(source: PdfSource) -> int:
+    try:
+        doc = _open_fitz(source)
+    except Exception:
+        return 0
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def _page_has_drawings(page: Any) -> bool:
+    """Return True if the fitz page contains vector paths (lines / rects / curves).
+
+    pdfplumber の既定の表検出（lines 戦略）は罫線などのベクター描画から表を組み立てるため、
+    描画が1つもないページでは表は検出されない。判定できない場合は True（安全側）。
+    """
+    try:
+        return bool(page.get_cdrawings())
+    except Exception:
+        return True
+
+
 def _safe_snippet(text: str, limit: int = 200) -> str:
     if not text:
         return ""
@@ -55,34 +103,96 @@ def _safe_snippet(text: str, limit: int = 200) -> str:
     return t if len(t) <= limit else t[:limit] + "..."
 
 
-def _extract_with_fitz(path: Path) -> Optional[List[Dict[str, Any]]]:
+def _extract_with_fitz(source: PdfSource) -> Optional[Iterator[Dict[str, Any]]]:
+    """Return a lazy iterator of raw fitz pages (None when PyMuPDF is unavailable).
+
+    ページオブジェクトは1ページずつ読み込み、次のページに進んだ時点で手放す。
+    """
     try:
-        import fitz  # PyMuPDF
+        import fitz  # noqa: F401  (PyMuPDF)
     except ImportError:
         return None
 
-    doc = fitz.open(str(path))
-    pages: List[Dict[str, Any]] = []
-    for page_index in range(doc.page_count):
-        page = doc.load_page(page_index)
-        text = page.get_text("text") or ""
-        pages.append({"page": page_index + 1, "text": text, "_page_obj": page})
-    return pages
+    doc = _open_fitz(source)
+    if not doc.page_count:
+        doc.close()
+        return None
+    return _iter_fitz_pages(doc)
 
 
-def _extract_all_tables_pdfplumber(path: Path) -> Dict[int, List[List[List[Optional[str]]]]]:
-    """Extract tables from all pages when fitz was used for text (pdfplumber for tables only)."""
+def _iter_fitz_pages(doc: Any) -> Iterator[Dict[str, Any]]:
     try:
-        import pdfplumber
+        for page_index in range(doc.page_count):
+            page = doc.load_page(page_index)
+            yield {
+                "page": page_index + 1,
+                "text": page.get_text("text") or "",
+                "_page_obj": page,
+                "_has_drawings": _page_has_drawings(page),
+            }
+    finally:
+        doc.close()
+
+
+class _LazyPlumberTables:
+    """Table extraction for fitz pages: pdfplumber is opened on first use and
+    each page's parsed layout is released right after its tables are read."""
+
+    def __init__(self, source: PdfSource) -> None:
+        self.source = source
+        self._pdf: Any = None
+        self._failed = False
+
+    def tables(self, page_no: int) -> List[List[List[Optional[str]]]]:
+        if self._failed:
+            return []
+        try:
+            if self._pdf is None:
+                import pdfplumber  # noqa: F401
+
+                self._pdf = _open_pdfplumber(self.source)
+            page = self._pdf.pages[page_no - 1]
+        except ImportError:
+            self._failed = True
+            return []
+        except Exception as e:
+            logger.warning("pdfplumber table extraction failed: %s", e)
+            self._failed = True
+            return []
+        try:
+            return _extract_tables_from_plumber_page(page)
+        finally:
+            page.close()
+
+    def close(self) -> None:
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+
+def _extract_all_tables_pdfplumber(
+    source: PdfSource,
+    page_numbers: Optional[Sequence[int]] = None,
+) -> Dict[int, List[List[List[Optional[str]]]]]:
+    """Extract tables when fitz was used for text (pdfplumber for tables only).
+
+    Args:
+        source: PDF path or bytes.
+        page_numbers: 1-based pages to analyse (None = all pages).
+    """
+    if page_numbers is not None and not page_numbers:
+        return {}
+    try:
+        import pdfplumber  # noqa: F401
     except ImportError:
         return {}
     out: Dict[int, List[List[List[Optional[str]]]]] = {}
     try:
-        with pdfplumber.open(str(path)) as pdf:
-            for i, page in enumerate(pdf.pages):
+        with _open_pdfplumber(source, page_numbers) as pdf:
+            for page in pdf.pages:
                 tables = _extract_tables_from_plumber_page(page)
                 if tables:
-                    out[i + 1] = tables
+                    out[page.page_number] = tables
     except Exception as e:
         logger.warning("pdfplumber table extraction failed: %s", e)
     return out
@@ -102,14 +212,17 @@ def _extract_tables_from_plumber_page(plumber_page: Any) -> List[List[List[Optio
         return []
 
 
-def _extract_with_pdfplumber(path: Path) -> Optional[List[Dict[str, Any]]]:
+def _extract_with_pdfplumber(source: PdfSource) -> Optional[Iterator[Dict[str, Any]]]:
+    """Return a lazy iterator of pdfplumber pages with tables (None when unavailable)."""
     try:
-        import pdfplumber
+        import pdfplumber  # noqa: F401
     except ImportError:
         return None
+    return _iter_plumber_pages(source)
+
 
-    pages: List[Dict[str, Any]] = []
-    with pdfplumber.open(str(path)) as pdf:
+def _iter_plumber_pages(source: PdfSource) -> Iterator[Dict[str, Any]]:
+    with _open_pdfplumber(source) as pdf:
         for i, page in enumerate(pdf.pages):
             try:
                 text = page.extract_text() or ""
@@ -117,8 +230,9 @@ def _extract_with_pdfplumber(path: Path) -> Optional[List[Dict[str, Any]]]:
                 logger.debug("pdfplumber text extraction failed on page %d: %s", i + 1, e)
                 text = ""
             tables = _extract_tables_from_plumber_page(page)
-            pages.append({"page": i + 1, "text": text, "tables": tables, "_plumber_page": page})
-    return pages
+            # 解析済みの文字・罫線キャッシュはページごとに解放する
+            page.close()
+            yield {"page": i + 1, "text": text, "tables": tables}
 
 
 def _ocr_page_via_fitz(page_obj: Any) -> Optional[str]:
@@ -148,10 +262,11 @@ def _mark_methods(methods: List[str]) -> str:
     return "mixed"
 
 
-def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
+def _try_gemini_vision(path: Path, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
     """
     Extract PDF using Gemini Vision API.
     Feature Flag: GEMINI_PDF_ENABLED=1
+    ``data`` は読み込み済みのPDFバイト列（省略時は path から読む）。
 
     PDFを画像化してGemini Visionに送信し、line_itemsを抽出する。
     人間が見るのと同じ精度で様々な様式のPDFを読み取れる。
@@ -161,8 +276,8 @@ def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
 
     try:
         import fitz  # PyMuPDF for PDF to image
-        from google import genai
         from google.genai import types
+        from core.genai_client import get_client, http_options
         from PIL import Image
         import io
         import json
@@ -170,18 +285,13 @@ def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
         return None
 
     try:
-        # Configure Gemini (Vertex AI or AI Studio) with RISK-003 timeout
-        _http_opts = types.HttpOptions(timeout=30_000)
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower() == "true":
-            client = genai.Client(http_options=_http_opts)
-        elif api_key:
-            client = genai.Client(api_key=api_key, http_options=_http_opts)
-        else:
+        # Shared Gemini client (Vertex AI or AI Studio)
+        client = get_client()
+        if client is None:
             return None
 
         # Convert PDF to images
-        doc = fitz.open(str(path))
+        doc = _open_fitz(data if data is not None else path)
         images = []
         for page_index in range(min(doc.page_count, 5)):  # Limit to 5 pages
             page = doc.load_page(page_index)
@@ -227,6 +337,8 @@ def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
                 temperature=0.1,
+                # RISK-003 timeout（リクエストの残り時間が短ければそちらに合わせる）
+                http_options=http_options(current_deadline().timeout_ms(30_000)),
             ),
         )
 
@@ -264,7 +376,7 @@ def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
         return {
             "meta": {
                 "filename": path.name,
-                "sha256": _compute_sha256(path),
+                "sha256": hashlib.sha256(data).hexdigest() if data is not None else _compute_sha256(path),
                 "num_pages": len(images),
                 "extracted_at": datetime.datetime.utcnow().isoformat() + "Z",
                 "source": "gemini_vision",
@@ -281,7 +393,7 @@ def _try_gemini_vision(path: Path) -> Optional[Dict[str, Any]]:
         return None
 
 
-def _try_docai(path: Path) -> Optional[Dict[str, Any]]:
+def _try_docai(path: Path, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
     """Extract PDF using Google Cloud Document AI. Only used when USE_DOCAI=1."""
     if not _bool_env("USE_DOCAI", False):
         return None
@@ -298,16 +410,18 @@ def _try_docai(path: Path) -> Optional[Dict[str, Any]]:
     try:
         client = DocumentProcessorServiceClient()
         name = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
-        raw_doc = RawDocument(content=path.read_bytes(), mime_type="application/pdf")
+        if data is None:
+            data = path.read_bytes()
+        raw_doc = RawDocument(content=data, mime_type="application/pdf")
         req = ProcessRequest(name=name, raw_document=raw_doc)
-        result = client.process_document(request=req)
+        result = client.process_document(request=req, timeout=current_deadline().timeout())
         doc = result.document
         text = (doc.text or "") if (doc and hasattr(doc, "text")) else ""
         num_pages = len(doc.pages) if (doc and hasattr(doc, "pages") and doc.pages) else 1
         return {
             "meta": {
                 "filename": path.name,
-                "sha256": _compute_sha256(path),
+                "sha256": hashlib.sha256(data).hexdigest(),
                 "num_pages": num_pages,
                 "extracted_at": datetime.datetime.utcnow().isoformat() + "Z",
                 "source": "docai",
@@ -320,12 +434,189 @@ def _try_docai(path: Path) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _finalize_page(
+    entry: Dict[str, Any],
+    tables: List[List[List[Optional[str]]]],
+    threshold: int,
+    ocr_enabled: bool,
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Apply the OCR fallback to one raw page and build its result entry.
+
+    Returns:
+        (page result, TEXT_TOO_SHORT warning or None)
+    """
+    page_no = entry.get("page") or 0
+    text = entry.get("text") or ""
+    method = "text"
+    evidence = []
+
+    if len(text) < threshold and ocr_enabled:
+        ocr_text = _ocr_page_via_fitz(entry.get("_page_obj"))
+        if ocr_text:
+            text = ocr_text
+            method = "ocr"
+        else:
+            evidence.append({"method": "ocr", "page": page_no, "snippet": "ocr_unavailable_or_failed"})
+
+    warning = None
+    if len(text) < threshold:
+        msg_suffix = "OCR is enabled." if ocr_enabled else "OCR is disabled (USE_LOCAL_OCR=false)."
+        warning = {
+            "code": TEXT_TOO_SHORT_CODE,
+            "message": "Text extraction is too short; scanned PDF suspected. " + msg_suffix,
+            "page": page_no,
+        }
+
+    evidence.append({"method": method, "page": page_no, "snippet": _safe_snippet(text)})
+    return {"page": page_no, "method": method, "text": text, "tables": tables, "evidence": evidence}, warning
+
+
+def plan_page_shards(source: PdfSource) -> List[Tuple[int, int]]:
+    """Split a PDF into ``[first, last)`` page ranges of PDF_PAGE_CHUNK pages.
+
+    Returns [] when the PDF fits in a single chunk (sharding would only add overhead).
+    """
+    chunk = max(1, _int_env("PDF_PAGE_CHUNK", 8))
+    num_pages = _fitz_page_count(source)
+    if num_pages <= chunk:
+        return []
+    return [(first, min(first + chunk, num_pages)) for first in range(0, num_pages, chunk)]
+
+
+def extract_page_shard(
+    path: str,
+    first: int,
+    last: int,
+    threshold: int,
+    ocr_enabled: bool,
+) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Process pages ``[first, last)`` (0-based) in a worker: text, tables and OCR.
+
+    ワーカーはパスから自分でPDFを開く（バイト列をプロセス間で複製しないため）。
+    """
+    doc = _open_fitz(path)
+    try:
+        entries = []
+        for page_index in range(first, last):
+            page = doc.load_page(page_index)
+            entries.append({
+                "page": page_index + 1,
+                "text": page.get_text("text") or "",
+                "_page_obj": page,
+                "_has_drawings": _page_has_drawings(page),
+            })
+        table_pages = [e["page"] for e in entries if e["_has_drawings"]]
+        tables_by_page = _extract_all_tables_pdfplumber(path, table_pages)
+        return [_finalize_page(e, tables_by_page.get(e["page"], []), threshold, ocr_enabled) for e in entries]
+    finally:
+        doc.close()
+
+
+def merge_page_shards(
+    path: Path,
+    shard_results: Iterable[List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]],
+) -> Dict[str, Any]:
+    """Merge :func:`extract_page_shard` results (in shard order) into an ``extract_pdf`` result."""
+    path = Path(path)
+    return _merge_shards(_new_meta(path, path.read_bytes()), shard_results, [])
+
+
+def _merge_shards(
+    meta: Dict[str, Any],
+    shard_results: Iterable[List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]],
+    warnings: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    merged = [entry for shard in shard_results for entry in shard]
+    results = [result for result, _ in merged]
+    meta["num_pages"] = len(results)
+    meta["source"] = _mark_methods([r["method"] for r in results])
+    meta["warnings"] = warnings + [w for _, w in merged if w is not None]
+    return {"meta": meta, "pages": results}
+
+
+def _extract_pages_parallel(
+    path: Path,
+    data: bytes,
+    executor: Executor,
+    threshold: int,
+    ocr_enabled: bool,
+) -> Optional[List[List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]]]:
+    """Submit page shards to the caller's executor and collect them in page order.
+
+    Returns None when the PDF fits in one chunk or the executor cannot be used
+    (caller falls back to serial).
+    """
+    shards = plan_page_shards(data)
+    if not shards:
+        return None
+    try:
+        futures = [
+            executor.submit(extract_page_shard, str(path), first, last, threshold, ocr_enabled)
+            for first, last in shards
+        ]
+        return [future.result() for future in futures]  # submit 順 = ページ順
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning("Page-parallel extraction unavailable, falling back to serial: %s", e)
+        return None
+
+
+def iter_pdf_pages(
+    source: PdfSource,
+    *,
+    use_ocr: bool = False,
+    warnings: Optional[List[Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield extracted pages one at a time (local fitz / pdfplumber path).
+
+    Each item has the same shape as ``extract_pdf(...)["pages"][i]``
+    (page, method, text, tables, evidence). Page objects and pdfplumber
+    layout caches are released before the next page is read, so peak memory
+    stays at roughly one page regardless of document length.
+
+    Args:
+        source: PDF path or bytes
+        use_ocr: Force local OCR for pages with too little text
+        warnings: If given, TEXT_TOO_SHORT warnings are appended to it
+    """
+    threshold = _int_env("OCR_TEXT_THRESHOLD", OCR_TEXT_THRESHOLD_DEFAULT)
+    ocr_enabled = use_ocr or _bool_env("USE_LOCAL_OCR", False)
+    if isinstance(source, str):
+        source = Path(source)
+
+    entries = _extract_with_fitz(source) or _extract_with_pdfplumber(source) or []
+    # 表の検出はベクター描画（罫線）のあるページだけ pdfplumber に回す
+    plumber_tables = _LazyPlumberTables(source)
+    try:
+        for entry in entries:
+            page_no = entry.get("page") or 0
+            tables = entry.get("tables")
+            if tables is None:
+                tables = plumber_tables.tables(page_no) if entry.get("_has_drawings", True) else []
+            result, warning = _finalize_page(entry, tables, threshold, ocr_enabled)
+            entry.clear()
+            if warning and warnings is not None:
+                warnings.append(warning)
+            yield result
+    finally:
+        plumber_tables.close()
+
+
+def _deadline_skipped_warning(stage: str) -> Dict[str, Any]:
+    return {
+        "code": DEADLINE_SKIPPED_CODE,
+        "message": f"{stage} skipped: request deadline nearly exhausted; used local extraction instead.",
+        "stage": stage,
+    }
+
+
 def extract_pdf(
     path: Path,
     *,
     use_docai: bool = False,
     use_ocr: bool = False,
     use_gemini_vision: bool = False,
+    page_executor: Optional[Executor] = None,
+    deadline_at: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Extract text and line items from PDF.
@@ -335,72 +626,76 @@ def extract_pdf(
         use_docai: Force use Document AI
         use_ocr: Force use local OCR
         use_gemini_vision: Force use Gemini Vision API (requires GEMINI_PDF_ENABLED=1)
+        page_executor: Caller-owned executor (typically a shared process pool)
+            to shard local extraction across, PDF_PAGE_CHUNK pages per task.
+            Only used for PDFs longer than one chunk; None = serial. The
+            executor is never created here, so workers never nest pools.
+        deadline_at: Request deadline as ``time.time()`` (see core.deadline).
+            Gemini Vision / Document AI are skipped when too little budget is
+            left and local extraction is used instead (DEADLINE_SKIPPED warning).
     """
-    path = Path(path)
-    threshold = _int_env("OCR_TEXT_THRESHOLD", OCR_TEXT_THRESHOLD_DEFAULT)
-    ocr_enabled = use_ocr or _bool_env("USE_LOCAL_OCR", False)
-    meta: Dict[str, Any] = {
+    token = set_deadline(Deadline.at_wall_time(deadline_at)) if deadline_at is not None else None
+    try:
+        return _extract_pdf(Path(path), use_docai, use_ocr, use_gemini_vision, page_executor)
+    finally:
+        if token is not None:
+            reset_deadline(token)
+
+
+def _new_meta(path: Path, data: bytes) -> Dict[str, Any]:
+    return {
         "filename": path.name,
-        "sha256": _compute_sha256(path),
+        "sha256": hashlib.sha256(data).hexdigest(),
         "num_pages": 0,
         "extracted_at": datetime.datetime.utcnow().isoformat() + "Z",
         "source": "local",
         "warnings": [],
     }
+
+
+def _extract_pdf(
+    path: Path,
+    use_docai: bool,
+    use_ocr: bool,
+    use_gemini_vision: bool,
+    page_executor: Optional[Executor],
+) -> Dict[str, Any]:
+    # ファイルは1回だけ読み、sha256・fitz・pdfplumber・Gemini/DocAI でバイト列を共有する
+    data = path.read_bytes()
+    threshold = _int_env("OCR_TEXT_THRESHOLD", OCR_TEXT_THRESHOLD_DEFAULT)
+    ocr_enabled = use_ocr or _bool_env("USE_LOCAL_OCR", False)
+    meta = _new_meta(path, data)
     warnings: List[Dict[str, Any]] = []
 
     # Priority 1: Gemini Vision (highest accuracy, like human reading)
     # Enabled either by env flag or explicit parameter
     if use_gemini_vision or _bool_env("GEMINI_PDF_ENABLED", False):
-        gemini_res = _try_gemini_vision(path)
-        if gemini_res:
-            return gemini_res
+        if current_deadline().has(min_remote_seconds()):
+            gemini_res = _try_gemini_vision(path, data)
+            if gemini_res:
+                return gemini_res
+        else:
+            warnings.append(_deadline_skipped_warning("gemini_vision"))
 
     # Priority 2: Document AI
     if use_docai or _bool_env("USE_DOCAI", False):
-        docai_res = _try_docai(path)
-        if docai_res:
-            return docai_res
-
-    pages = _extract_with_fitz(path) or _extract_with_pdfplumber(path) or []
-    meta["num_pages"] = len(pages)
-
-    tables_by_page: Dict[int, List[List[List[Optional[str]]]]] = {}
-    if pages and "_plumber_page" not in (pages[0] or {}):
-        tables_by_page = _extract_all_tables_pdfplumber(path)
-
-    results: List[Dict[str, Any]] = []
-    methods_used: List[str] = []
-    for entry in pages:
-        page_no = entry.get("page") or 0
-        text = entry.get("text") or ""
-        method = "text"
-        evidence = []
-        tables = entry.get("tables") or tables_by_page.get(page_no, [])
-
-        if len(text) < threshold and ocr_enabled:
-            ocr_text = _ocr_page_via_fitz(entry.get("_page_obj"))
-            if ocr_text:
-                text = ocr_text
-                method = "ocr"
-            else:
-                evidence.append({"method": "ocr", "page": page_no, "snippet": "ocr_unavailable_or_failed"})
-
-        if len(text) < threshold:
-            msg_suffix = "OCR is enabled." if ocr_enabled else "OCR is disabled (USE_LOCAL_OCR=false)."
-            warnings.append(
-                {
-                    "code": TEXT_TOO_SHORT_CODE,
-                    "message": "Text extraction is too short; scanned PDF suspected. " + msg_suffix,
-                    "page": page_no,
-                }
-            )
+        # Gemini Vision で時間を使った後でも予算が残っているか再確認する
+        if current_deadline().has(min_remote_seconds()):
+            docai_res = _try_docai(path, data)
+            if docai_res:
+                return docai_res
+        else:
+            warnings.append(_deadline_skipped_warning("docai"))
 
-        evidence.append({"method": method, "page": page_no, "snippet": _safe_snippet(text)})
-        results.append({"page": page_no, "method": method, "text": text, "tables": tables, "evidence": evidence})
-        methods_used.append(method)
+    # ページ並列抽出（大きなスキャン束向け）: 呼び出し側のプールにシャードを投入する
+    if page_executor is not None:
+        shard_results = _extract_pages_parallel(path, data, page_executor, threshold, ocr_enabled)
+        if shard_results is not None:
+            return _merge_shards(meta, shard_results, warnings)
 
-    meta["source"] = _mark_methods(methods_used)
+    results = list(iter_pdf_pages(data, use_ocr=use_ocr, warnings=warnings))
+    meta["num_pages"] = len(results)
+    meta["source"] = _mark_methods([r["method"] for r in results])
     meta["warnings"] = warnings
     return {"meta": meta, "pages": results}
 
@@ -491,82 +786,91 @@ def _parse_number(s: Any) -> Optional[float]:
 
 
 def _parse_line_items_from_tables(
-    pages: List[Dict[str, Any]],
+    pages: Iterable[Dict[str, Any]],
 ) -> List[Dict[str, Any]]:
-    """Parse line items from extracted tables. Returns list of {description, quantity, unit_price, amount, evidence}."""
+    """Parse line items from extracted tables. Returns list of {description, quantity, unit_price, amount, evidence}.
+
+    ``pages`` may be any iterable (e.g. :func:`iter_pdf_pages`); it is consumed in a single pass.
+    """
     line_items: List[Dict[str, Any]] = []
     seen: set = set()
-
     for p in pages or []:
-        page_no = p.get("page", 0)
-        tables = p.get("tables") or []
-        evidence_list = p.get("evidence") or []
-        snippets = [e.get("snippet", "") for e in evidence_list if isinstance(e, dict)]
-        source_text = " ".join(snippets) if snippets else (p.get("text") or "")[:500]
-
-        for table in tables:
-            if not table or len(table) < 2:
-                continue
-            header_row = table[0]
-            if not isinstance(header_row, list):
+        line_items.extend(_parse_page_table_items(p, seen))
+    return line_items
+
+
+def _parse_page_table_items(p: Dict[str, Any], seen: set) -> List[Dict[str, Any]]:
+    """Line items from one page's tables (``seen`` dedupes across pages)."""
+    line_items: List[Dict[str, Any]] = []
+    page_no = p.get("page", 0)
+    tables = p.get("tables") or []
+    evidence_list = p.get("evidence") or []
+    snippets = [e.get("snippet", "") for e in evidence_list if isinstance(e, dict)]
+    source_text = " ".join(snippets) if snippets else (p.get("text") or "")[:500]
+
+    for table in tables:
+        if not table or len(table) < 2:
+            continue
+        header_row = table[0]
+        if not isinstance(header_row, list):
+            continue
+        desc_col, qty_col, unit_col, amount_col = _detect_table_columns(header_row)
+        if desc_col < 0 and amount_col < 0:
+            desc_col = 0
+            if len(header_row) >= 4:
+                qty_col, unit_col, amount_col = 1, 2, 3
+            elif len(header_row) >= 3:
+                unit_col, amount_col = 1, 2
+            elif len(header_row) >= 2:
+                amount_col = 1
+
+        for row in table[1:]:
+            if not isinstance(row, list):
                 continue
-            desc_col, qty_col, unit_col, amount_col = _detect_table_columns(header_row)
-            if desc_col < 0 and amount_col < 0:
-                desc_col = 0
-                if len(header_row) >= 4:
-                    qty_col, unit_col, amount_col = 1, 2, 3
-                elif len(header_row) >= 3:
-                    unit_col, amount_col = 1, 2
-                elif len(header_row) >= 2:
-                    amount_col = 1
-
-            for row in table[1:]:
-                if not isinstance(row, list):
-                    continue
-                cells = [str(c).strip() if c is not None else "" for c in row]
-                desc = cells[desc_col] if 0 <= desc_col < len(cells) else ""
+            cells = [str(c).strip() if c is not None else "" for c in row]
+            desc = cells[desc_col] if 0 <= desc_col < len(cells) else ""
 
-                # 合計行・小計行・税込行は除外
-                if _is_total_row(desc):
-                    continue
+            # 合計行・小計行・税込行は除外
+            if _is_total_row(desc):
+                continue
 
-                qty_val = _parse_number(cells[qty_col]) if 0 <= qty_col < len(cells) else None
-                unit_val = _parse_number(cells[unit_col]) if 0 <= unit_col < len(cells) else None
-                amt_val = _parse_number(cells[amount_col]) if 0 <= amount_col < len(cells) else None
-                if amt_val is None and unit_val is not None and qty_val is not None:
-                    amt_val = unit_val * qty_val
-                if amt_val is None:
-                    amt_val = unit_val
-                if not desc and amt_val is None:
-                    continue
-                amt_key = round(amt_val, 2) if isinstance(amt_val, float) else amt_val
-                key = (page_no, (desc or "")[:80], amt_key)
-                if key in seen:
-                    continue
-                seen.add(key)
-                evidence_obj: Dict[str, Any] = {"source_text": desc or source_text, "position_hint": f"page{page_no}"}
-                if evidence_list:
-                    evidence_obj["snippets"] = [
-                        {"page": e.get("page", page_no), "method": e.get("method", "text"), "snippet": _safe_snippet(e.get("snippet", desc))}
-                        for e in evidence_list if isinstance(e, dict)
-                    ]
-
-                # descが空の場合: 品名のない行は集計行（小計・合計・税込等）の可能性が高いためスキップ
-                if not desc:
-                    continue
-                item_description = desc
+            qty_val = _parse_number(cells[qty_col]) if 0 <= qty_col < len(cells) else None
+            unit_val = _parse_number(cells[unit_col]) if 0 <= unit_col < len(cells) else None
+            amt_val = _parse_number(cells[amount_col]) if 0 <= amount_col < len(cells) else None
+            if amt_val is None and unit_val is not None and qty_val is not None:
+                amt_val = unit_val * qty_val
+            if amt_val is None:
+                amt_val = unit_val
+            if not desc and amt_val is None:
+                continue
+            amt_key = round(amt_val, 2) if isinstance(amt_val, float) else amt_val
+            key = (page_no, (desc or "")[:80], amt_key)
+            if key in seen:
+                continue
+            seen.add(key)
+            evidence_obj: Dict[str, Any] = {"source_text": desc or source_text, "position_hint": f"page{page_no}"}
+            if evidence_list:
+                evidence_obj["snippets"] = [
+                    {"page": e.get("page", page_no), "method": e.get("method", "text"), "snippet": _safe_snippet(e.get("snippet", desc))}
+                    for e in evidence_list if isinstance(e, dict)
+                ]
+
+            # descが空の場合: 品名のない行は集計行（小計・合計・税込等）の可能性が高いためスキップ
+            if not desc:
+                continue
+            item_description = desc
 
-                item: Dict[str, Any] = {
-                    "description": item_description,
-                    "evidence": evidence_obj,
-                }
-                if qty_val is not None:
-                    item["quantity"] = int(qty_val) if qty_val == int(qty_val) else qty_val
-                if unit_val is not None:
-                    item["unit_price"] = unit_val
-                if amt_val is not None:
-                    item["amount"] = int(amt_val) if amt_val == int(amt_val) else amt_val
-                line_items.append(item)
+            item: Dict[str, Any] = {
+                "description": item_description,
+                "evidence": evidence_obj,
+            }
+            if qty_val is not None:
+                item["quantity"] = int(qty_val) if qty_val == int(qty_val) else qty_val
+            if unit_val is not None:
+                item["unit_price"] = unit_val
+            if amt_val is not None:
+                item["amount"] = int(amt_val) if amt_val == int(amt_val) else amt_val
+            line_items.append(item)
 
     return line_items
 
@@ -703,6 +1007,12 @@ def _parse_line_items_from_text(text: str, page_no: int = 1) -> List[Dict[str, A
 
 
 def extraction_to_opal(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an extraction into the OPAL-like document.
+
+    ``extraction["pages"]`` may be a list or an iterator such as
+    ``iter_pdf_pages(path)`` – pages are consumed once, in order, so a large
+    scan can be converted without holding every page in memory.
+    """
     # If Gemini Vision already extracted line_items, use them directly
     if extraction.get("line_items"):
         return {
@@ -712,14 +1022,19 @@ def extraction_to_opal(extraction: Dict[str, Any]) -> Dict[str, Any]:
             "line_items": extraction.get("line_items"),
         }
 
+    # pages は list でも iter_pdf_pages() のジェネレータでもよい（1回の走査で処理する）
     pages = extraction.get("pages") if isinstance(extraction, dict) else []
     texts: List[str] = []
+    page_texts: List[Tuple[int, str]] = []
     evidence_snippets: List[Dict[str, Any]] = []
+    line_items: List[Dict[str, Any]] = []
+    seen: set = set()
 
     for p in pages or []:
         text = (p.get("text") or "").strip()
         if text:
             texts.append(text)
+            page_texts.append((p.get("page", 1), text))
 
         ev_list = p.get("evidence") if isinstance(p, dict) else []
         if isinstance(ev_list, list):
@@ -735,21 +1050,18 @@ def extraction_to_opal(extraction: Dict[str, Any]) -> Dict[str, Any]:
                     }
                 )
 
+        line_items.extend(_parse_page_table_items(p, seen))
+
     combined_text = "\n\n".join(texts).strip()
     if not combined_text:
         combined_text = extraction.get("meta", {}).get("filename", "")
 
-    line_items = _parse_line_items_from_tables(pages or [])
-
     if not line_items:
-        for p in pages or []:
-            text = (p.get("text") or "").strip()
-            page_no = p.get("page", 1)
-            if text:
-                parsed = _parse_line_items_from_text(text, page_no)
-                if parsed:
-                    line_items.extend(parsed)
-                    break
+        for page_no, text in page_texts:
+            parsed = _parse_line_items_from_text(text, page_no)
+            if parsed:
+                line_items.extend(parsed)
+                break
 
     if not line_items:
         evidence_obj: Dict[str, Any] = {"source_text": combined_text, "position_hint": ""}
@@ -1,7 +1,18 @@
 import json
+import re
+import threading
+from collections.abc import Mapping
 from copy import deepcopy
 from pathlib import Path
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Pattern, Tuple
+
+from core.classifier import (
+    CAPITAL_KEYWORDS,
+    EXPENSE_KEYWORDS,
+    _build_keyword_matcher,
+    _merge_keywords,
+)
 
 
 _EMPTY_POLICY = {
@@ -74,30 +85,122 @@ def _ensure_str_or_none(value: Any) -> Optional[str]:
     return None
 
 
-def load_policy(path: Optional[str]) -> Dict[str, Any]:
-    """
-    Load policy JSON. If path is None/empty/missing/invalid, return an empty policy shape.
-    The returned dict always has the expected keys filled with empty defaults.
+def _freeze(value: Any) -> Any:
+    """Return a read-only copy of a parsed policy section (dict → proxy, list → tuple)."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """Inverse of :func:`_freeze`: return a plain, mutable dict/list copy."""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class CompiledPolicy(Mapping):
+    """Immutable, pre-processed policy.
+
+    Behaves like the read-only policy dict (``policy["keywords"]["asset_add"]``
+    etc.; keyword lists are tuples) and additionally carries everything the
+    classifier would otherwise rebuild per line item:
+
+    - ``capital_keywords`` / ``expense_keywords``: base keywords merged with
+      the policy additions
+    - ``guidance_keywords``: ``keywords.guidance_add``
+    - ``keyword_matcher``: the compiled single-pass keyword matcher
+    - ``always_guidance_re``: precompiled ``regex.always_guidance``
+      (``None`` when unset or invalid)
+    - ``guidance_amount_jpy``: ``thresholds.guidance_amount_jpy``
+
+    Use :meth:`to_dict` to get a mutable copy for ad-hoc overrides.
     """
-    policy = _fresh_policy()
 
-    if not path:
-        return policy
+    __slots__ = (
+        "_data",
+        "source",
+        "capital_keywords",
+        "expense_keywords",
+        "guidance_keywords",
+        "keyword_matcher",
+        "always_guidance_re",
+        "guidance_amount_jpy",
+    )
 
-    try:
-        policy_path = Path(path)
-    except (TypeError, ValueError):
-        return policy
+    def __init__(self, policy: Dict[str, Any], source: Optional[str] = None) -> None:
+        data = _freeze(policy)
+        keywords = data["keywords"]
+        asset_add = keywords["asset_add"]
+        expense_add = keywords["expense_add"]
+        guidance_add = keywords["guidance_add"]
+        pattern = data["regex"]["always_guidance"]
+
+        always_guidance_re: Optional[Pattern[str]] = None
+        if pattern:
+            try:
+                always_guidance_re = re.compile(pattern)
+            except re.error:
+                always_guidance_re = None
+
+        setattr_ = object.__setattr__
+        setattr_(self, "_data", data)
+        setattr_(self, "source", source)
+        setattr_(self, "capital_keywords", tuple(_merge_keywords(CAPITAL_KEYWORDS, list(asset_add))))
+        setattr_(self, "expense_keywords", tuple(_merge_keywords(EXPENSE_KEYWORDS, list(expense_add))))
+        setattr_(self, "guidance_keywords", guidance_add)
+        setattr_(self, "keyword_matcher", _build_keyword_matcher(asset_add, expense_add, guidance_add))
+        setattr_(self, "always_guidance_re", always_guidance_re)
+        setattr_(self, "guidance_amount_jpy", data["thresholds"]["guidance_amount_jpy"])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("CompiledPolicy is immutable")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"CompiledPolicy(source={self.source!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a mutable deep copy in the plain policy-dict shape."""
+        return _thaw(self._data)
+
+
+_EMPTY_COMPILED = CompiledPolicy(_fresh_policy())
 
-    if not policy_path.exists() or not policy_path.is_file():
-        return policy
+# resolved path -> ((st_mtime_ns, st_size), CompiledPolicy)
+_POLICY_CACHE: Dict[str, Tuple[Tuple[int, int], CompiledPolicy]] = {}
+_POLICY_CACHE_LOCK = threading.Lock()
 
+
+def _parse_policy_file(policy_path: Path) -> Optional[Dict[str, Any]]:
+    """Read and normalize a policy JSON file.
+
+    Args:
+        policy_path: Path to an existing policy file.
+
+    Returns:
+        A policy dict in the ``_EMPTY_POLICY`` shape, or ``None`` if the file
+        cannot be read or parsed.
+    """
     try:
         with open(policy_path, "r", encoding="utf-8-sig") as f:
             raw = json.load(f)
     except (OSError, json.JSONDecodeError):
-        return policy
+        return None
 
+    policy = _fresh_policy()
     keywords = raw.get("keywords") if isinstance(raw, dict) else {}
     thresholds = raw.get("thresholds") if isinstance(raw, dict) else {}
     regex = raw.get("regex") if isinstance(raw, dict) else {}
@@ -116,3 +219,46 @@ def load_policy(path: Optional[str]) -> Dict[str, Any]:
     policy["regex"]["always_guidance"] = _ensure_str_or_none(always_guidance)
 
     return policy
+
+
+def load_policy(path: Optional[str]) -> CompiledPolicy:
+    """
+    Load policy JSON as an immutable :class:`CompiledPolicy`.
+
+    If path is None/empty/missing/invalid, return an empty policy shape.
+    Results are cached per resolved path and reloaded automatically when the
+    file's mtime or size changes, so repeated calls cost one ``stat``.
+    """
+    if not path:
+        return _EMPTY_COMPILED
+
+    try:
+        policy_path = Path(path).resolve()
+        stat = policy_path.stat()
+    except (TypeError, ValueError, OSError):
+        return _EMPTY_COMPILED
+
+    if not policy_path.is_file():
+        return _EMPTY_COMPILED
+
+    cache_key = str(policy_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _POLICY_CACHE_LOCK:
+        cached = _POLICY_CACHE.get(cache_key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    parsed = _parse_policy_file(policy_path)
+    if parsed is None:
+        return _EMPTY_COMPILED
+
+    compiled = CompiledPolicy(parsed, source=cache_key)
+    with _POLICY_CACHE_LOCK:
+        _POLICY_CACHE[cache_key] = (signature, compiled)
+    return compiled
+
+
+def clear_policy_cache() -> None:
+    """Drop every cached policy (the next :func:`load_policy` call re-reads from disk)."""
+    with _POLICY_CACHE_LOCK:
+        _POLICY_CACHE.clear()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Tests for the IVF approximate nearest-neighbour index (api/ann_index.py)."""
+import threading
+
+import numpy as np
+import pytest
+
+from api import embedding_cache
+from api.ann_index import IVFIndex
+from api.embedding_store import EmbeddingStore
+from api.similarity_search import EmbeddingIndex, batch_search_similar
+
+
+def _clustered(n, dim=16, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+    return [{"name": f"資産{i}", "embedding": p.tolist(), "metadata": {"row": i}} for i, p in enumerate(points)]
+
+
+def _assert_same_hits(actual, expected):
+    # 行列積の経路（gemm / gemv）で float32 の最下位桁がずれることがある
+    assert [[i for i, _ in hits] for hits in actual] == [[i for i, _ in hits] for hits in expected]
+    for a, e in zip(actual, expected):
+        assert [s for _, s in a] == pytest.approx([s for _, s in e], abs=1e-5)
+
+
+def _recall(approx, exact):
+    return np.mean([len({i for i, _ in a} & {i for i, _ in e}) / max(len(e), 1) for a, e in zip(approx, exact)])
+
+
+class TestIVFIndex:
+    def test_recall_and_probe_knob(self):
+        data = _clustered(3050)
+        index = EmbeddingIndex(data[:3000])
+        index.build_ann(n_lists=32, n_probe=4)
+        queries = [it["embedding"] for it in data[3000:]]
+        exact = index.batch_search(queries, top_k=10, exact=True)
+
+        assert _recall(index.batch_search(queries, top_k=10), exact) >= 0.9
+        # 全リストを走査すれば全件検索と一致する
+        index.ann.n_probe = 32
+        _assert_same_hits(index.batch_search(queries, top_k=10), exact)
+
+    def test_batch_equals_single_queries(self):
+        index = EmbeddingIndex(_clustered(1000))
+        index.build_ann(n_lists=16, n_probe=3)
+        queries = [it["embedding"] for it in _clustered(20, seed=2)]
+        _assert_same_hits(index.batch_search(queries, top_k=5), [index.search(q, top_k=5) for q in queries])
+
+    def test_incremental_extend_is_searchable(self):
+        items = _clustered(500)
+        index = EmbeddingIndex(items)
+        index.build_ann(n_lists=8, n_probe=8)
+        start = len(items)
+        items.append({"name": "新規", "embedding": [5.0] * 16, "metadata": {}})
+        assert index.extend(start) == 1
+        assert index.ann.ntotal == 501
+        assert index.search([5.0] * 16, top_k=1) == [(500, pytest.approx(1.0, abs=1e-5))]
+
+    def test_needs_retrain_after_growth(self):
+        vectors = np.eye(4, dtype=np.float32)
+        ann = IVFIndex(n_lists=2)
+        ann.train(vectors)
+        ann.add(vectors, np.arange(4))
+        assert not ann.needs_retrain()
+        ann.add(vectors, np.arange(4, 8))
+        assert ann.needs_retrain(factor=1.5)
+
+    def test_add_during_list_compaction_is_kept(self, monkeypatch):
+        """検索時のリスト連結と並行した add() の追加分が失われない"""
+        vectors = np.eye(4, dtype=np.float32)
+        ann = IVFIndex(n_lists=1)
+        ann.train(vectors)
+        ann.add(vectors[:2], np.arange(2))
+        ann.add(vectors[2:], np.arange(2, 4))
+
+        concatenate = np.concatenate
+        adder = threading.Thread(target=ann.add, args=(vectors[:1], np.array([4])))
+
+        def concatenate_then_add(*args, **kwargs):
+            result = concatenate(*args, **kwargs)
+            if adder.ident is None:  # 最初の連結でだけ割り込む
+                adder.start()
+                adder.join(0.2)  # ロックで待たされる（修正前はここで追加が完了していた）
+            return result
+
+        monkeypatch.setattr(np, "concatenate", concatenate_then_add)
+        ann.search(vectors[:1], top_k=1)
+        monkeypatch.setattr(np, "concatenate", concatenate)
+        adder.join()
+
+        assert ann.ntotal == 5
+        assert sorted(ann._list(0)[0].tolist()) == [0, 1, 2, 3, 4]
+
+    def test_threshold_applies_to_approximate_results(self):
+        index = EmbeddingIndex(_clustered(400))
+        index.build_ann(n_lists=8, n_probe=8)
+        results = batch_search_similar([index.items[0]["embedding"]], index, top_k=50, threshold=0.99)
+        assert results[0][0]["name"] == "資産0"
+        assert all(r["similarity"] >= 0.99 for r in results[0])
+
+
+def test_store_builds_ann_and_extends_on_add(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
+    monkeypatch.setenv("EMBEDDING_ANN", "1")
+    monkeypatch.setenv("EMBEDDING_ANN_MIN_ITEMS", "100")
+    monkeypatch.setenv("EMBEDDING_IVF_LISTS", "8")
+    store = EmbeddingStore(store_path=str(tmp_path / "embeddings"))
+    store.items = _clustered(200)
+    ann = store.index.ann
+    assert ann is not None and ann.ntotal == 200
+
+    monkeypatch.setattr(store, "_get_batch_embeddings", lambda names: [[7.0] * 16 for _ in names])
+    assert store.add_items([{"name": "追加資産", "amount": 1}]) == 1
+    assert store.index.ann is ann
+    assert ann.ntotal == 201
+    monkeypatch.setattr(store, "get_embedding", lambda text: [7.0] * 16)
+    assert store.search_by_name("追加資産", top_k=1)[0]["name"] == "追加資産"
+
+
+def test_store_without_flag_stays_exact(tmp_path, monkeypatch):
+    monkeypatch.delenv("EMBEDDING_ANN", raising=False)
+    store = EmbeddingStore(store_path=str(tmp_path / "embeddings"))
+    store.items = _clustered(200)
+    assert store.index.ann is None
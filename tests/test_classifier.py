@@ -5,6 +5,11 @@ import pytest
 from core import schema
 from core.adapter import adapt_opal_to_v1
 from core.classifier import (
+    CAPITAL_KEYWORDS,
+    EXPENSE_KEYWORDS,
+    PRORATE_KEYWORDS,
+    _KeywordMatcher,
+    _build_keyword_matcher,
     _find_keywords,
     _merge_keywords,
     _safe_policy,
@@ -13,6 +18,7 @@ from core.classifier import (
     _calculate_confidence,
     classify_line_item,
     classify_document,
+    classify_frame,
 )
 
 
@@ -211,6 +217,112 @@ class TestHelpers:
         assert flags == ["a", "b"]
 
 
+# ---------------------------------------------------------------------------
+# Single-pass keyword matcher
+# ---------------------------------------------------------------------------
+class TestKeywordMatcher:
+    @pytest.mark.parametrize("text", [
+        "",
+        "サーバー設置工事",
+        "空調設置および保守",
+        "一般管理費 現場管理費",  # 「管理」と重なる按分キーワード
+        "共通仮設費",  # 「仮設」を含む
+        "配線一式 移設 既設撤去",
+        "保守保守点検",
+    ])
+    def test_matches_find_keywords(self, text):
+        """全カテゴリで _find_keywords と同じヒット・同じ順序を返す"""
+        categories = {
+            "capital": CAPITAL_KEYWORDS,
+            "expense": EXPENSE_KEYWORDS,
+            "prorate": PRORATE_KEYWORDS,
+            "guidance": ["移設", "既設", "一式", "配線", "一式"],
+        }
+        hits = _KeywordMatcher(categories).scan(text)
+        for cat, keywords in categories.items():
+            assert hits[cat] == _find_keywords(text, keywords)
+
+    def test_empty_keyword_always_hits(self):
+        hits = _KeywordMatcher({"guidance": ["", "特注"]}).scan("テスト")
+        assert hits["guidance"] == [""]
+
+    def test_matcher_cached_per_policy(self):
+        assert _build_keyword_matcher(("更新",), (), ()) is _build_keyword_matcher(("更新",), (), ())
+
+
+# ---------------------------------------------------------------------------
+# Vectorized classification (classify_frame)
+# ---------------------------------------------------------------------------
+class TestClassifyFrame:
+    _WORDS = ["サーバー設置", "保守点検", "撤去", "移設", "諸経費", "運搬費", "新設", "修理", "一式", "不明品", ""]
+    _AMOUNTS = [None, 0, 50_000, 100_000, 150_000, 250_000, 300_000, 599_999, 600_000, 2_000_000]
+
+    @staticmethod
+    def _expected(frame, policy=None):
+        # 欠損セル（NaN）はキーなし扱い — classify_frame の契約と同じ
+        rows = [
+            {k: v for k, v in row.items() if v is not None and v == v}
+            for row in frame.astype(object).to_dict("records")
+        ]
+        return classify_document({"line_items": rows}, policy)["line_items"]
+
+    def _rows(self, n=400):
+        import random
+
+        rng = random.Random(7)
+        rows = []
+        for _ in range(n):
+            row = {
+                "description": " ".join(rng.sample(self._WORDS, rng.randint(1, 3))),
+                "amount": rng.choice(self._AMOUNTS),
+            }
+            if rng.random() < 0.3:
+                row["unit_price"] = rng.choice([80_000, 99_999.5, 120_000])
+            rows.append(row)
+        return rows
+
+    def _assert_same(self, result, expected):
+        for (_, got), item in zip(result.iterrows(), expected):
+            assert got["classification"] == item["classification"]
+            assert got["label_ja"] == item["label_ja"]
+            assert got["rationale_ja"] == item["rationale_ja"]
+            assert got["flags"] == item["flags"]
+            assert got["confidence"] == item["confidence"]
+            assert got["_prorate_capital"] == item.get("_prorate_capital")
+            assert got["_prorate_expense"] == item.get("_prorate_expense")
+
+    def test_matches_classify_document(self):
+        pd = pytest.importorskip("pandas")
+        frame = pd.DataFrame(self._rows())
+        result = classify_frame(frame)
+        assert len(result) == len(frame)
+        self._assert_same(result, self._expected(frame))
+
+    def test_matches_with_policy(self):
+        pd = pytest.importorskip("pandas")
+        frame = pd.DataFrame(self._rows(200))
+        policy = {
+            "keywords": {"asset_add": ["不明品"], "expense_add": [], "guidance_add": ["一式"]},
+            "thresholds": {"guidance_amount_jpy": 1_000_000},
+            "regex": {"always_guidance": "移設|撤去"},
+        }
+        self._assert_same(classify_frame(frame, policy), self._expected(frame, policy))
+
+    def test_prorate_per_document(self):
+        pd = pytest.importorskip("pandas")
+        doc_a = [{"description": "サーバー設置", "amount": 300_000}, {"description": "諸経費", "amount": 10_001}]
+        doc_b = [{"description": "保守点検", "amount": 100_000}, {"description": "諸経費", "amount": 5_000}]
+        frame = pd.DataFrame([dict(r, doc="a") for r in doc_a] + [dict(r, doc="b") for r in doc_b])
+        result = classify_frame(frame, by="doc")
+        self._assert_same(result, self._expected(pd.DataFrame(doc_a)) + self._expected(pd.DataFrame(doc_b)))
+
+    def test_empty_frame(self):
+        pd = pytest.importorskip("pandas")
+        result = classify_frame(pd.DataFrame({"description": [], "amount": []}))
+        assert len(result) == 0
+        assert "classification" in result.columns
+
+
 # ---------------------------------------------------------------------------
 # Confidence calculation
 # ---------------------------------------------------------------------------
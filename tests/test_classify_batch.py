@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Tests for POST /classify_batch – concurrent fan-out and streaming modes."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+import api.main as main
+
+_PDF = b"%PDF-1.4\n%fake\n"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("PDF_CLASSIFY_ENABLED", "1")
+    monkeypatch.setenv("BATCH_CONCURRENCY", "3")
+    monkeypatch.setattr(main.limiter, "enabled", False, raising=False)
+    state = {"running": 0, "peak": 0}
+
+    async def fake_process(content, policy_path, use_gemini_vision, estimate_useful_life_flag):
+        # 本文末尾のタグで処理時間と結果を切り替える（後のファイルほど早く終わる）
+        tag = content.split(b"\n")[-1].decode()
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        try:
+            await asyncio.sleep(0.05 * (5 - int(tag[-1])))
+            if tag == "boom3":
+                raise RuntimeError("broken pdf")
+            return SimpleNamespace(decision="CAPITAL_LIKE", confidence=0.9, reasons=[tag])
+        finally:
+            state["running"] -= 1
+
+    monkeypatch.setattr(main, "_process_single_pdf", fake_process)
+    with TestClient(main.app) as c:
+        c.state = state
+        yield c
+
+
+def _files(*tags):
+    return [("files", (f"{tag}.pdf", _PDF + tag.encode(), "application/pdf")) for tag in tags]
+
+
+class TestClassifyBatch:
+    def test_results_keep_upload_order(self, client):
+        resp = client.post("/classify_batch", files=_files("ok1", "ok2", "boom3", "ok4"))
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [r["filename"] for r in data["results"]] == ["ok1.pdf", "ok2.pdf", "boom3.pdf", "ok4.pdf"]
+        assert data["success"] == 3
+        assert data["failed"] == 1
+        assert "broken pdf" in data["results"][2]["error"]
+        assert client.state["peak"] == 3
+
+    def test_invalid_upload_reported_per_file(self, client):
+        files = _files("ok1") + [("files", ("bad.pdf", b"not a pdf", "application/pdf"))]
+        data = client.post("/classify_batch", files=files).json()
+        assert data["results"][0]["success"] is True
+        assert data["results"][1]["success"] is False
+        assert "magic bytes" in data["results"][1]["error"]
+
+    def test_ndjson_stream_emits_in_completion_order(self, client):
+        resp = client.post("/classify_batch?stream=ndjson", files=_files("ok1", "ok2", "ok4"))
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in resp.text.splitlines() if line]
+        results = [e for e in events if e["type"] == "result"]
+        assert [e["index"] for e in results] == [2, 1, 0]
+        assert events[-1] == {"type": "summary", "total": 3, "success": 3, "failed": 0}
+
+    def test_sse_stream(self, client):
+        resp = client.post("/classify_batch?stream=sse", files=_files("ok1", "boom3"))
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        frames = [f for f in resp.text.split("\n\n") if f]
+        assert frames[-1].startswith("event: summary\n")
+        first = frames[0].split("\n")
+        assert first[0] == "event: result"
+        assert json.loads(first[1][len("data: "):])["filename"] == "boom3.pdf"
+
+    def test_invalid_stream_mode(self, client):
+        resp = client.post("/classify_batch?stream=xml", files=_files("ok1"))
+        assert resp.status_code == 400
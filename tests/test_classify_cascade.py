@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Tests for the rules-first Gemini cascade in POST /classify (GEMINI_CASCADE=1)."""
+import pytest
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+import api.main as main
+
+
+def _opal(*items):
+    return {"opal_json": {"vendor": "Service Co", "line_items": [
+        {"item_description": desc, "amount": amount} for desc, amount in items
+    ]}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "GEMINI_ENABLED", True)
+    monkeypatch.setattr(main, "GEMINI_AVAILABLE", True)
+    monkeypatch.setattr(main.limiter, "enabled", False, raising=False)
+    monkeypatch.setenv("GEMINI_CASCADE", "1")
+    calls = []
+
+    def fake_gemini(line_items, context="", document_info=None):
+        calls.append([item["description"] for item in line_items])
+        return {
+            "decision": "CAPITAL_LIKE",
+            "confidence": 0.92,
+            "reasons": ["gemini"],
+            "line_item_analysis": [
+                {"description": item["description"], "classification": "CAPITAL_LIKE",
+                 "confidence": 0.92, "included_in_acquisition_cost": True, "reason": "器具備品"}
+                for item in line_items
+            ],
+            "acquisition_cost_total": 999,
+            "missing_fields": [],
+            "why_missing_matters": [],
+            "flags": [],
+        }
+
+    monkeypatch.setattr(main, "classify_with_gemini", fake_gemini)
+    monkeypatch.setattr(main, "_compute_ai_hints", lambda classified, use_gemini=True: ({}, []))
+    with TestClient(main.app) as c:
+        c.calls = calls
+        yield c
+
+
+class TestClassifyCascade:
+    def test_unambiguous_document_skips_gemini(self, client):
+        resp = client.post("/classify", json=_opal(("保守点検", 30000), ("消耗品", 5000)))
+        assert resp.status_code == 200
+        data = resp.json()
+        assert client.calls == []
+        assert data["decision"] == "EXPENSE_LIKE"
+        assert "cascade_rules_only" in data["trace"]
+
+    def test_only_uncertain_items_sent_and_merged_in_place(self, client):
+        resp = client.post(
+            "/classify",
+            json=_opal(("保守点検", 30000), ("サーバー本体", 800000), ("消耗品", 5000)),
+        )
+        data = resp.json()
+        assert client.calls == [["サーバー本体"]]
+        counts = data["metadata"]["classification_counts"]
+        assert counts == {"GUIDANCE": 0, "CAPITAL_LIKE": 1, "EXPENSE_LIKE": 2}
+        # 合計はルール確定分を含めて明細から再計算される（Gemini の部分合計は使わない）
+        assert data["metadata"]["acquisition_cost_total"] == 800000
+        assert data["metadata"]["expense_total"] == 35000
+        assert "cascade_gemini:1/3" in data["trace"]
+
+    def test_threshold_is_configurable(self, client, monkeypatch):
+        monkeypatch.setenv("GEMINI_CASCADE_MIN_CONFIDENCE", "0.86")
+        client.post("/classify", json=_opal(("保守点検", 30000), ("消耗品", 5000)))
+        assert client.calls == [["消耗品"]]
+
+    def test_gemini_failure_keeps_rule_results(self, client, monkeypatch):
+        monkeypatch.setattr(main, "classify_with_gemini", lambda *a, **k: {"line_item_analysis": [], "flags": ["api_error"]})
+        data = client.post("/classify", json=_opal(("保守点検", 30000), ("サーバー本体", 800000))).json()
+        assert data["decision"] == "GUIDANCE"
+        assert "gemini_fallback" in data["trace"]
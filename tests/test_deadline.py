@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Tests for core/deadline.py and per-request deadline propagation."""
+import asyncio
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from api.executor_pool import run_io
+from core import genai_client
+from core.deadline import Deadline, DeadlineExceeded, current_deadline, reset_deadline, set_deadline
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_text.pdf"
+
+
+class _Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeadline:
+    def test_unlimited_by_default(self):
+        deadline = current_deadline()
+        assert deadline.unlimited
+        assert deadline.remaining() is None
+        assert deadline.timeout(5.0) == 5.0
+        assert deadline.timeout() is None
+        assert deadline.has(1e9)
+
+    def test_remaining_budget_caps_stage_timeouts(self):
+        clock = _Clock()
+        deadline = Deadline(10.0, clock=clock)
+        assert deadline.timeout(30.0) == 10.0
+        assert deadline.timeout_ms(8_000) == 8_000
+        clock.now += 7.5
+        assert deadline.timeout(30.0) == pytest.approx(2.5)
+        assert deadline.timeout_ms(30_000) == 2_500
+        assert not deadline.has(3.0)
+        clock.now += 5
+        assert deadline.expired
+        assert deadline.remaining() == 0.0
+        with pytest.raises(DeadlineExceeded):
+            deadline.check("gemini")
+
+    def test_child_never_outlives_parent(self):
+        clock = _Clock()
+        parent = Deadline(10.0, clock=clock)
+        assert parent.child(30.0).remaining() == pytest.approx(10.0)
+        assert parent.child(3.0).remaining() == pytest.approx(3.0)
+        assert Deadline(clock=clock).child(3.0).remaining() == pytest.approx(3.0)
+
+    def test_wall_time_roundtrip(self):
+        deadline = Deadline(5.0)
+        rebuilt = Deadline.at_wall_time(deadline.wall_time())
+        assert rebuilt.remaining() == pytest.approx(5.0, abs=0.1)
+        assert Deadline.at_wall_time(None).unlimited
+
+    def test_run_io_carries_deadline_into_thread(self):
+        async def go():
+            set_deadline(Deadline(42.0))
+            return await run_io(lambda: current_deadline().remaining())
+
+        assert asyncio.run(go()) == pytest.approx(42.0, abs=1.0)
+        assert current_deadline().unlimited
+
+
+@pytest.fixture
+def expired_deadline():
+    token = set_deadline(Deadline(1e-6))
+    time.sleep(0.001)
+    yield
+    reset_deadline(token)
+
+
+def test_gemini_classification_skipped_without_budget(monkeypatch, expired_deadline):
+    genai = pytest.importorskip("google.genai")
+    from api import gemini_classifier
+
+    calls = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.models = SimpleNamespace(generate_content=lambda **kw: calls.append(kw))
+
+    monkeypatch.setenv("GEMINI_ENABLED", "1")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.delenv("GOOGLE_GENAI_USE_VERTEXAI", raising=False)
+    monkeypatch.setattr(genai, "Client", FakeClient)
+    monkeypatch.setattr(gemini_classifier, "_response_cache", None)
+    genai_client.reset_clients()
+    try:
+        result = gemini_classifier.classify_with_gemini([{"description": "ノートPC", "amount": 250000}])
+    finally:
+        genai_client.reset_clients()
+    assert calls == []
+    assert result["decision"] == "GUIDANCE"
+    assert "deadline_exceeded" in result["flags"]
+
+
+def test_extract_pdf_skips_gemini_vision_without_budget(monkeypatch):
+    pytest.importorskip("fitz")
+    import core.pdf_extract as pdf_extract
+
+    monkeypatch.setenv("GEMINI_PDF_ENABLED", "1")
+    monkeypatch.setattr(pdf_extract, "_try_gemini_vision", lambda *a: pytest.fail("Gemini Vision called"))
+    extraction = pdf_extract.extract_pdf(FIXTURE, deadline_at=time.time() - 1)
+    assert extraction["pages"]
+    codes = [w["code"] for w in extraction["meta"]["warnings"]]
+    assert pdf_extract.DEADLINE_SKIPPED_CODE in codes
+    assert current_deadline().unlimited
+
+
+def test_classify_degrades_to_rules_when_budget_runs_out(monkeypatch):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+
+    def slow_citations(classified, missing_fields, gemini_used=False):
+        time.sleep(0.5)
+        return [{"title": "late"}]
+
+    monkeypatch.setattr(main, "GEMINI_ENABLED", True)
+    monkeypatch.setattr(main, "GEMINI_AVAILABLE", True)
+    monkeypatch.setattr(main.limiter, "enabled", False, raising=False)
+    monkeypatch.setattr(
+        main, "classify_with_gemini",
+        lambda *a, **k: {"flags": ["deadline_exceeded"], "line_item_analysis": []},
+    )
+    monkeypatch.setattr(main, "_get_guidance_citations", slow_citations)
+    monkeypatch.setenv("REQUEST_DEADLINE_SECONDS", "0.2")
+    with TestClient(main.app) as client:
+        start = time.monotonic()
+        resp = client.post("/classify", json={"opal_json": {"line_items": [
+            {"item_description": "撤去・新設工事一式", "amount": 800000},
+        ]}})
+        elapsed = time.monotonic() - start
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["decision"] == "GUIDANCE"
+    assert "gemini_fallback" in data["trace"] and "rules" in data["trace"]
+    assert data["citations"] == []
+    assert elapsed < 0.5
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/embedding_cache.py and deduplicated embedding in EmbeddingStore."""
+import numpy as np
+
+from api.embedding_cache import EmbeddingCache, normalize_text
+from api.embedding_store import EmbeddingStore
+
+
+def _fake_vector(text):
+    return [float(len(text)), 1.0, 0.5]
+
+
+class _CountingStore(EmbeddingStore):
+    """API 呼び出しを記録するフェイク（ネットワークに出ない）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+        self.queries = []
+
+    def _get_batch_embeddings(self, texts):
+        self.batches.append(list(texts))
+        return [_fake_vector(t) for t in texts]
+
+    def get_embedding(self, text):
+        self.queries.append(text)
+        return _fake_vector(text)
+
+
+def test_normalize_text():
+    assert normalize_text("ﾉｰﾄPC") == "ノートPC"
+    assert normalize_text("  ノートＰＣ　 HP  ") == "ノートPC HP"
+    assert normalize_text(None) == ""
+
+
+class TestEmbeddingCache:
+    def test_roundtrip_is_keyed_by_model(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "emb.sqlite3")
+        cache.put_many("model-a", {"ノートPC": [1.0, 2.0], "事務机": [3.0, 4.0]})
+        found = cache.get_many("model-a", ["ノートPC", "事務机", "サーバー"])
+        assert set(found) == {"ノートPC", "事務机"}
+        assert found["ノートPC"].dtype == np.float32
+        assert cache.get("model-b", "ノートPC") is None
+
+    def test_persists_across_instances(self, tmp_path):
+        EmbeddingCache(tmp_path / "emb.sqlite3").put("m", "事務机", [0.25, 0.5])
+        reopened = EmbeddingCache(tmp_path / "emb.sqlite3", mem_items=0)
+        assert reopened.get("m", "事務机").tolist() == [0.25, 0.5]
+        assert reopened.stats()["items"] == 1
+
+    def test_memory_only_lru(self):
+        cache = EmbeddingCache(None, mem_items=1)
+        cache.put("m", "a", [1.0])
+        cache.put("m", "b", [2.0])
+        assert cache.get("m", "a") is None
+        assert cache.get("m", "b").tolist() == [2.0]
+
+
+class TestStoreDedupe:
+    def test_duplicate_names_embedded_once(self, tmp_path):
+        store = _CountingStore(store_path=str(tmp_path / "e"), cache=EmbeddingCache(None))
+        names = ["ノートPC", "事務机", "ﾉｰﾄPC", "ノートPC ", "", "事務机"] * 50
+        count = store.add_items([{"name": n, "row": i} for i, n in enumerate(names)])
+
+        assert count == 250
+        assert store.batches == [["ノートPC", "事務机"]]
+        assert store.items[2]["name"] == "ﾉｰﾄPC"  # 元の表記は保持する
+        assert list(store.items[2]["embedding"]) == _fake_vector("ノートPC")
+        assert store.items[-1]["metadata"]["row"] == len(names) - 1
+
+    def test_second_ingestion_and_queries_stay_local(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "emb.sqlite3")
+        _CountingStore(store_path=str(tmp_path / "a"), cache=cache).add_items([{"name": "事務机"}])
+
+        store = _CountingStore(store_path=str(tmp_path / "b"), cache=cache)
+        store.add_items([{"name": "事務机"}, {"name": "サーバー"}])
+        assert store.batches == [["サーバー"]]
+
+        for _ in range(3):
+            assert store.search_by_name("サーバー", top_k=1)[0]["name"] == "サーバー"
+        assert store.queries == []  # 取り込み時の Embedding を再利用
+        store.search_by_name("ノートPC", top_k=1)
+        store.search_by_name("ノートPC", top_k=1)
+        assert store.queries == ["ノートPC"]
+
+    def test_model_env_separates_entries(self, tmp_path, monkeypatch):
+        cache = EmbeddingCache(None)
+        _CountingStore(store_path=str(tmp_path / "a"), cache=cache).add_items([{"name": "事務机"}])
+        monkeypatch.setenv("EMBEDDING_MODEL", "text-embedding-005")
+        store = _CountingStore(store_path=str(tmp_path / "b"), cache=cache)
+        assert store.model == "text-embedding-005"
+        store.add_items([{"name": "事務机"}])
+        assert store.batches == [["事務机"]]
+
+    def test_failed_batch_is_not_cached(self, tmp_path):
+        cache = EmbeddingCache(None)
+        store = _CountingStore(store_path=str(tmp_path / "e"), cache=cache)
+
+        def broken(texts):
+            raise ConnectionError("quota")
+
+        store._get_batch_embeddings = broken
+        assert store.add_items([{"name": "事務机"}]) == 0
+        assert cache.get(store.model, "事務机") is None
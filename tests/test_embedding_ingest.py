@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Tests for concurrent, resumable embedding ingestion (EmbeddingStore.aadd_items)."""
+import asyncio
+import os
+
+import pytest
+
+from api import embedding_cache
+from api.embedding_store import EmbeddingStore, ingest_ledger
+from api.rate_limit import AsyncTokenBucket
+
+
+@pytest.fixture(autouse=True)
+def no_shared_embedding_cache(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
+
+
+class _RateLimited(Exception):
+    code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 RESOURCE_EXHAUSTED")
+        self.details = {"error": {"details": [
+            {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after}s"},
+        ]}}
+
+
+class _FakeAsyncStore(EmbeddingStore):
+    BATCH_SIZE = 10
+
+    def __init__(self, *args, fail_batches=(), rate_limit_once=False, delay=0.01, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_batches = set(fail_batches)
+        self.rate_limit_once = rate_limit_once
+        self.delay = delay
+
+    async def _aget_batch_embeddings(self, texts):
+        self.calls.append(list(texts))
+        if self.rate_limit_once:
+            self.rate_limit_once = False
+            raise _RateLimited(0.05)
+        if texts[0] in self.fail_batches:
+            raise ValueError("invalid argument")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def _ledger(n, distinct):
+    return [{"name": f"資産{i % distinct}", "row": i} for i in range(n)]
+
+
+def _limiter():
+    return AsyncTokenBucket(10_000, capacity=10_000)
+
+
+def test_batches_run_concurrently_and_dedupe(tmp_path):
+    store = _FakeAsyncStore(store_path=str(tmp_path / "e"))
+    count = asyncio.run(store.aadd_items(_ledger(500, 100), concurrency=4, limiter=_limiter()))
+    assert count == 500
+    assert len(store.calls) == 10
+    assert store.max_in_flight == 4
+    assert store.items[499]["name"] == "資産99"
+    assert store.items[499]["metadata"] == {"row": 499}
+
+
+def test_retry_after_is_honoured(tmp_path):
+    store = _FakeAsyncStore(store_path=str(tmp_path / "e"), rate_limit_once=True)
+    limiter = _limiter()
+    assert asyncio.run(store.aadd_items(_ledger(5, 5), limiter=limiter)) == 5
+    assert len(store.calls) == 2
+    assert limiter._paused_until > 0
+
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "ingest.checkpoint.sqlite3")
+    ledger = _ledger(60, 60)
+    first = _FakeAsyncStore(store_path=str(tmp_path / "e"), fail_batches={"資産30"})
+    assert asyncio.run(first.aadd_items(ledger, checkpoint_path=checkpoint, concurrency=2, limiter=_limiter())) == 50
+
+    resumed = _FakeAsyncStore(store_path=str(tmp_path / "e"))
+    assert asyncio.run(resumed.aadd_items(ledger, checkpoint_path=checkpoint, limiter=_limiter())) == 60
+    assert resumed.calls == [[f"資産{i}" for i in range(30, 40)]]
+
+
+def test_ingest_ledger_saves_and_removes_checkpoint(tmp_path, monkeypatch):
+    async def fake_batch(self, texts):
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(EmbeddingStore, "_aget_batch_embeddings", fake_batch)
+    base = str(tmp_path / "embeddings")
+    assert ingest_ledger(_ledger(30, 7), output_path=base) == 30
+    assert os.path.exists(base + ".meta.json")
+    assert not os.path.exists(base + ".checkpoint.sqlite3")
+    store = EmbeddingStore(store_path=base)
+    store.load()
+    assert len(store) == 30
@@ -7,10 +7,18 @@ import os
 import tempfile
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
 
+from api import embedding_cache, embedding_store
 # Import the module under test
-from api.embedding_store import EmbeddingStore, generate_embeddings_for_ledger
+from api.embedding_store import EmbeddingStore, generate_embeddings_for_ledger, migrate_json_store
+
+
+@pytest.fixture(autouse=True)
+def no_shared_embedding_cache(monkeypatch):
+    """共有の Embedding キャッシュ（data/cache）をテスト間で持ち越さない"""
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
 
 
 class TestEmbeddingStoreUnit:
@@ -173,6 +181,21 @@ class TestEmbeddingStoreUnit:
         assert results[0]["name"] == "ノートPC"  # Highest similarity
         assert results[0]["similarity"] == 1.0
 
+    def test_search_index_follows_item_changes(self, temp_store_path):
+        """The cached search matrix is rebuilt when items are replaced or appended."""
+        store = EmbeddingStore(store_path=temp_store_path)
+        store.items = [{"name": "ノートPC", "embedding": [1.0, 0.0], "metadata": {}}]
+        index = store.index
+        assert store.index is index
+        assert index.matrix.dtype.name == "float32"
+
+        store.items.append({"name": "サーバー", "embedding": [0.0, 1.0], "metadata": {}})
+        with patch.object(store, "get_embedding", return_value=[0.0, 2.0]):
+            assert store.search_by_name("サーバー", top_k=1)[0]["name"] == "サーバー"
+
+        store.clear()
+        assert len(store.index) == 0
+
     def test_no_api_key_raises_error(self, temp_store_path):
         """Test that missing API key raises error."""
         # Clear the API key
@@ -269,3 +292,119 @@ class TestGenerateEmbeddingsForLedger:
 
         assert len(data["items"]) == 2
         assert data["items"][0]["name"] == "資産A"
+
+
+class TestBinaryStoreFormat:
+    """Binary (.npy + .meta.json) persistence and JSON migration."""
+
+    ITEMS = [
+        {"name": "ノートPC", "embedding": [3.0, 4.0, 0.0], "metadata": {"amount": 150000}},
+        {"name": "サーバー", "embedding": [0.0, 0.0, 2.0], "metadata": {"amount": 800000}},
+    ]
+
+    def test_save_and_memmap_load(self, tmp_path):
+        base = str(tmp_path / "embeddings")
+        store = EmbeddingStore(store_path=base)
+        store.items = [dict(item) for item in self.ITEMS]
+        store.save()
+        assert os.path.exists(store.matrix_path) and os.path.exists(base + ".meta.json")
+        meta = json.loads((tmp_path / "embeddings.meta.json").read_text(encoding="utf-8"))
+        assert meta["matrix"] == os.path.basename(store.matrix_path)
+
+        loaded = EmbeddingStore(store_path=base)
+        loaded.load()
+        assert isinstance(loaded.index.matrix, np.memmap)
+        assert loaded.items[0]["name"] == "ノートPC"
+        assert loaded.items[1]["metadata"] == {"amount": 800000}
+        # 保存されるのは正規化済みベクトル
+        assert list(loaded.items[0]["embedding"]) == pytest.approx([0.6, 0.8, 0.0])
+        with patch.object(loaded, "get_embedding", return_value=[0.0, 0.0, 1.0]):
+            assert loaded.search_by_name("サーバー", top_k=1)[0]["name"] == "サーバー"
+
+    def test_resave_while_mapped_keeps_old_mapping_valid(self, tmp_path):
+        base = str(tmp_path / "embeddings")
+        store = EmbeddingStore(store_path=base)
+        store.items = [dict(item) for item in self.ITEMS]
+        store.save()
+        reader = EmbeddingStore(store_path=base)
+        reader.load()
+
+        store.items.append({"name": "プリンター", "embedding": [1.0, 0.0, 0.0], "metadata": {}})
+        store.save()
+        assert reader.index.matrix.shape == (2, 3)  # 既存の memmap は古いファイルを指したまま
+        reader.load()
+        assert len(reader) == 3
+
+    def test_load_migrates_legacy_json_once(self, tmp_path):
+        legacy = tmp_path / "embeddings.json"
+        legacy.write_text(json.dumps({"items": self.ITEMS}, ensure_ascii=False), encoding="utf-8")
+
+        store = EmbeddingStore(store_path=str(tmp_path / "embeddings"))
+        store.load()
+        assert [it["name"] for it in store.items] == ["ノートPC", "サーバー"]
+        matrix_path = store.matrix_path
+        assert os.path.exists(matrix_path)
+
+        mtime = os.path.getmtime(matrix_path)
+        again = EmbeddingStore(store_path=str(tmp_path / "embeddings"))
+        again.load()
+        assert again.matrix_path == matrix_path
+        assert os.path.getmtime(matrix_path) == mtime
+
+    def test_load_during_save_sees_previous_consistent_version(self, tmp_path, monkeypatch):
+        base = str(tmp_path / "embeddings")
+        store = EmbeddingStore(store_path=base)
+        store.items = [dict(item) for item in self.ITEMS]
+        store.save()
+
+        seen = []
+        original = embedding_store._atomic_write
+
+        def write_then_load(path, write):
+            original(path, write)
+            if path.endswith(".npy"):
+                # 新しい行列を書いた直後・meta を置き換える前に別のワーカーが読む
+                reader = EmbeddingStore(store_path=base)
+                reader.load()
+                seen.append(len(reader))
+
+        monkeypatch.setattr(embedding_store, "_atomic_write", write_then_load)
+        store.items.append({"name": "プリンター", "embedding": [1.0, 0.0, 0.0], "metadata": {}})
+        store.save()
+        assert seen == [2]
+        monkeypatch.undo()
+        reader = EmbeddingStore(store_path=base)
+        reader.load()
+        assert len(reader) == 3
+
+    def test_old_matrix_versions_are_removed(self, tmp_path):
+        base = str(tmp_path / "embeddings")
+        store = EmbeddingStore(store_path=base)
+        store.items = [dict(item) for item in self.ITEMS]
+        paths = []
+        for _ in range(3):
+            store.save()
+            paths.append(store.matrix_path)
+        assert len(set(paths)) == 3
+        # 最新と直前の1世代だけ残る
+        assert sorted(p.name for p in tmp_path.glob("embeddings*.npy")) == sorted(
+            os.path.basename(p) for p in paths[1:]
+        )
+
+    def test_loads_unversioned_format(self, tmp_path):
+        base = tmp_path / "embeddings"
+        np.save(str(base) + ".npy", np.asarray([[1.0, 0.0]], dtype=np.float32))
+        meta = {"format_version": 1, "count": 1, "dim": 2, "items": [{"name": "机", "metadata": {}}]}
+        (tmp_path / "embeddings.meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        store = EmbeddingStore(store_path=str(base))
+        store.load()
+        assert [it["name"] for it in store.items] == ["机"]
+        assert store.matrix_path == str(base) + ".npy"
+
+    def test_migrate_json_store_skips_items_without_embedding(self, tmp_path):
+        legacy = tmp_path / "old.json"
+        items = self.ITEMS + [{"name": "no vector", "embedding": [], "metadata": {}}]
+        legacy.write_text(json.dumps({"items": items}, ensure_ascii=False), encoding="utf-8")
+        assert migrate_json_store(str(legacy), str(tmp_path / "new")) == 2
+        meta = json.loads((tmp_path / "new.meta.json").read_text(encoding="utf-8"))
+        assert meta["count"] == 2 and meta["dim"] == 3
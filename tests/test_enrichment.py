@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Tests for the concurrent post-classification enrichment (_enrich)."""
+import asyncio
+import time
+
+import pytest
+
+import api.main as main
+
+DELAY = 0.2
+
+
+def _classified(*classifications):
+    return {"line_items": [
+        {"description": f"明細{i}", "amount": 100000, "classification": c, "confidence": 0.5, "flags": []}
+        for i, c in enumerate(classifications)
+    ]}
+
+
+@pytest.fixture
+def slow_lookups(monkeypatch):
+    """各外部呼び出しを DELAY 秒かかるフェイクに差し替える"""
+    calls = []
+
+    def fake_hints(classified, use_gemini=True):
+        calls.append(("ai_hint", use_gemini))
+        if use_gemini:
+            time.sleep(DELAY)
+        hint = {"suggestion": "CAPITAL_LIKE", "suggestion_label": "資産寄り", "confidence": 0.9 if use_gemini else 0.6}
+        return {0: hint}, ["ai_hint" if use_gemini else "ai_hint_heuristic"]
+
+    def fake_citations(classified, missing_fields, gemini_used=False):
+        calls.append(("vertex_search", gemini_used))
+        time.sleep(DELAY)
+        return [{"title": "耐用年数省令"}]
+
+    def fake_useful_life_batch(items):
+        calls.append(("useful_life", [item["description"] for item in items]))
+        time.sleep(DELAY)
+        return [{"useful_life_years": 4 + i, "category": "器具備品"} for i, _ in enumerate(items)]
+
+    monkeypatch.setattr(main, "_compute_ai_hints", fake_hints)
+    monkeypatch.setattr(main, "_get_guidance_citations", fake_citations)
+    monkeypatch.setattr(main, "estimate_useful_life_batch", fake_useful_life_batch)
+    monkeypatch.setattr(main, "USEFUL_LIFE_AVAILABLE", True)
+    return calls
+
+
+def _run(classified, decision, **kwargs):
+    initial = main._format_classify_response(classified, trace_steps=[])
+    initial.decision = decision
+    trace = []
+
+    async def go():
+        return await main._enrich(classified, initial, trace, **kwargs)
+
+    start = time.monotonic()
+    citations, useful_life = asyncio.run(go())
+    return citations, useful_life, trace, time.monotonic() - start
+
+
+class TestEnrich:
+    def test_lookups_run_concurrently(self, slow_lookups):
+        classified = _classified("GUIDANCE", "CAPITAL_LIKE")
+        citations, useful_life, trace, elapsed = _run(
+            classified, "GUIDANCE", hints=True, useful_life=True, gemini_used=True,
+        )
+        assert citations == [{"title": "耐用年数省令"}]
+        assert useful_life is None  # GUIDANCE 判定では耐用年数を求めない
+        assert classified["line_items"][0]["ai_hint"]["confidence"] == 0.9
+        assert trace == ["ai_hint", "vertex_search"]
+        assert ("vertex_search", True) in slow_lookups
+        assert elapsed < 2 * DELAY
+
+    def test_capital_document_estimates_useful_life(self, slow_lookups):
+        classified = _classified("CAPITAL_LIKE", "EXPENSE_LIKE", "CAPITAL_LIKE")
+        citations, useful_life, trace, _ = _run(classified, "CAPITAL_LIKE", hints=True, useful_life=True)
+        assert citations == []
+        assert useful_life == {"useful_life_years": 4, "category": "器具備品"}
+        assert trace == ["useful_life"]
+        # 全 CAPITAL_LIKE 明細を1回の呼び出しで推定し、明細ごとに付与する
+        assert slow_lookups == [("useful_life", ["明細0", "明細2"])]
+        items = classified["line_items"]
+        assert [item.get("useful_life", {}).get("useful_life_years") for item in items] == [4, None, 5]
+        formatted = main._format_classify_response(classified, trace_steps=[]).line_items
+        assert formatted[2]["useful_life"]["useful_life_years"] == 5
+        assert "useful_life" not in formatted[1]
+
+    def test_disabled_steps_are_not_started(self, slow_lookups):
+        _run(_classified("GUIDANCE"), "GUIDANCE", hints=False, useful_life=False)
+        assert [name for name, _ in slow_lookups] == ["vertex_search"]
+
+    def test_timeouts_drop_slow_lookups(self, slow_lookups, monkeypatch):
+        monkeypatch.setenv("ENRICH_HINTS_TIMEOUT", "0.05")
+        monkeypatch.setenv("ENRICH_CITATIONS_TIMEOUT", "0.05")
+        classified = _classified("GUIDANCE")
+        citations, _, trace, elapsed = _run(classified, "GUIDANCE", hints=True, useful_life=False)
+        assert citations == []
+        # Gemini が間に合わなければヒューリスティック推定に切り替える
+        assert classified["line_items"][0]["ai_hint"]["confidence"] == 0.6
+        assert trace == ["ai_hint_heuristic"]
+        assert elapsed < DELAY
+
+    def test_failed_lookup_does_not_fail_request(self, slow_lookups, monkeypatch):
+        def broken(*args, **kwargs):
+            raise RuntimeError("search backend down")
+
+        monkeypatch.setattr(main, "_get_guidance_citations", broken)
+        citations, _, trace, _ = _run(_classified("GUIDANCE"), "GUIDANCE", hints=True, useful_life=False)
+        assert citations == []
+        assert trace == ["ai_hint"]
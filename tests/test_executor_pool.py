@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/executor_pool.py – blocking stages run off the event loop."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.executor_pool import _StagePool, executor_stats, run_io
+
+
+class TestStagePool:
+    def test_runs_in_worker_thread(self):
+        pool = _StagePool("test", 2, use_processes=False)
+        try:
+            name = asyncio.run(pool.run(lambda: threading.current_thread().name))
+        finally:
+            pool.shutdown()
+        assert name.startswith("fa-test")
+
+    def test_event_loop_not_blocked(self):
+        """ブロッキング処理中も他のコルーチンが進むこと"""
+        pool = _StagePool("test", 1, use_processes=False)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(pool.run(time.sleep, 0.2), ticker())
+
+        try:
+            asyncio.run(main())
+        finally:
+            pool.shutdown()
+        assert len(ticks) == 5
+        assert ticks[-1] - ticks[0] < 0.2
+
+    def test_stats_queue_depth_and_wait(self):
+        pool = _StagePool("test", 1, use_processes=False)
+        seen = {}
+
+        async def main():
+            tasks = [asyncio.ensure_future(pool.run(time.sleep, 0.05)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            seen.update(pool.stats())
+            await asyncio.gather(*tasks)
+
+        try:
+            asyncio.run(main())
+        finally:
+            pool.shutdown()
+        assert seen["in_flight"] == 3
+        assert seen["queue_depth"] == 2
+        stats = pool.stats()
+        assert stats["completed"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["wait_ms_max"] >= 50
+
+    def test_timed_out_call_still_counted_until_worker_is_free(self):
+        """wait_for で諦めても、ワーカーが実行中の間は in_flight / queue_depth に残る"""
+        pool = _StagePool("test", 1, use_processes=False)
+        seen = {}
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.run(time.sleep, 0.2), timeout=0.02)
+            queued = asyncio.ensure_future(pool.run(time.sleep, 0.01))
+            await asyncio.sleep(0.01)
+            seen.update(pool.stats())
+            await queued
+
+        try:
+            asyncio.run(main())
+        finally:
+            pool.shutdown()
+        assert seen["in_flight"] == 2
+        assert seen["queue_depth"] == 1
+        stats = pool.stats()
+        assert stats["in_flight"] == 0
+        assert stats["completed"] == 2
+
+    def test_failure_counted_and_raised(self):
+        pool = _StagePool("test", 1, use_processes=False)
+
+        def boom():
+            raise ValueError("bad pdf")
+
+        try:
+            with pytest.raises(ValueError, match="bad pdf"):
+                asyncio.run(pool.run(boom))
+        finally:
+            pool.shutdown()
+        assert pool.stats()["failed"] == 1
+
+
+def test_run_io_and_health_snapshot():
+    assert asyncio.run(run_io(sum, [1, 2, 3])) == 6
+    stats = executor_stats()
+    assert set(stats) == {"extract", "io"}
+    assert stats["io"]["kind"] == "thread"
+    assert stats["io"]["completed"] >= 1
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Tests for core/extraction_cache.py – sha256-keyed extraction cache."""
+import os
+
+import pytest
+
+from core import extraction_cache
+from core.extraction_cache import ExtractionCache, cache_key, extraction_options
+
+
+def _extraction(text="サーバー設置 500,000", source="local"):
+    return {
+        "meta": {"filename": "a.pdf", "sha256": "x", "source": source, "warnings": []},
+        "pages": [{"page": 1, "method": "text", "text": text, "tables": [], "evidence": []}],
+    }
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = ExtractionCache(cache_dir=tmp_path / "cache", max_memory_items=2, max_disk_bytes=10_000)
+    monkeypatch.setattr(extraction_cache, "_cache", c)
+    return c
+
+
+class TestCacheKey:
+    def test_options_change_key(self, monkeypatch):
+        monkeypatch.delenv("USE_LOCAL_OCR", raising=False)
+        base = extraction_options()
+        ocr = extraction_options(use_ocr=True)
+        assert cache_key("abc", base) != cache_key("abc", ocr)
+        assert cache_key("abc", base) == cache_key("abc", dict(base))
+
+    def test_env_flags_are_part_of_options(self, monkeypatch):
+        monkeypatch.setenv("USE_LOCAL_OCR", "1")
+        monkeypatch.setenv("OCR_TEXT_THRESHOLD", "10")
+        opts = extraction_options()
+        assert opts["use_ocr"] is True
+        assert opts["ocr_threshold"] == 10
+
+
+class TestExtractionCache:
+    def test_miss_then_memory_hit(self, cache):
+        assert cache.get("k") is None
+        cache.put("k", _extraction())
+        assert cache.get("k") == _extraction()
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits_memory"] == 1
+
+    def test_hit_returns_independent_copy(self, cache):
+        cache.put("k", _extraction())
+        cache.get("k")["pages"].clear()
+        assert cache.get("k")["pages"]
+
+    def test_disk_tier_survives_new_instance(self, cache, tmp_path):
+        cache.put("k", _extraction())
+        fresh = ExtractionCache(cache_dir=tmp_path / "cache", max_disk_bytes=10_000)
+        assert fresh.get("k") == _extraction()
+        assert fresh.stats()["hits_disk"] == 1
+
+    def test_memory_lru_bound(self, tmp_path):
+        c = ExtractionCache(cache_dir=None, max_memory_items=2)
+        for key in ("a", "b", "c"):
+            c.put(key, _extraction())
+        assert c.get("a") is None
+        assert c.get("c") is not None
+        assert c.stats()["disk_enabled"] is False
+
+    def test_disk_size_eviction_drops_oldest(self, tmp_path):
+        c = ExtractionCache(cache_dir=tmp_path, max_memory_items=0, max_disk_bytes=2_500)
+        payload = _extraction("x" * 900)
+        for i, key in enumerate(("a", "b", "c")):
+            c.put(key, payload)
+            os.utime(tmp_path / f"{key}.json", (1_000 + i, 1_000 + i))
+        assert not (tmp_path / "a.json").exists()
+        assert (tmp_path / "c.json").exists()
+        assert c.stats()["evictions_disk"] >= 1
+        assert c.stats()["disk_bytes"] <= 2_500
+
+
+class TestModuleHelpers:
+    def test_lookup_and_store_roundtrip(self, cache):
+        opts = {"use_ocr": False}
+        assert extraction_cache.lookup("sha", opts) is None
+        extraction_cache.store("sha", opts, _extraction())
+        hit = extraction_cache.lookup("sha", opts, filename="b.pdf")
+        assert hit["meta"]["filename"] == "b.pdf"
+        assert extraction_cache.cache_stats()["hits"] == 1
+
+    def test_remote_fallback_not_cached(self, cache, monkeypatch):
+        monkeypatch.setenv("GEMINI_PDF_ENABLED", "1")
+        opts = {"use_gemini_vision": True}
+        extraction_cache.store("sha", opts, _extraction(source="local"))
+        assert extraction_cache.lookup("sha", opts) is None
+        extraction_cache.store("sha", opts, _extraction(source="gemini_vision"))
+        assert extraction_cache.lookup("sha", opts) is not None
+
+    def test_disabled_cache(self, monkeypatch):
+        monkeypatch.setattr(extraction_cache, "_cache", None)
+        extraction_cache.store("sha", {}, _extraction())
+        assert extraction_cache.lookup("sha", {}) is None
+        assert extraction_cache.cache_stats() == {"enabled": False}
+
+
+def test_upload_path_touches_cache_off_the_event_loop(cache, monkeypatch):
+    """キャッシュのディスク I/O と一時ファイルは I/O プールのスレッドで実行する"""
+    import asyncio
+    import threading
+
+    from api import main
+
+    threads = {}
+
+    def spy(name, fn):
+        def wrapper(*args, **kwargs):
+            threads[name] = threading.current_thread().name
+            return fn(*args, **kwargs)
+        return wrapper
+
+    async def fake_run_cpu(fn, *args, **kwargs):
+        return _extraction()
+
+    monkeypatch.delenv("PDF_PAGE_WORKERS", raising=False)
+    monkeypatch.setattr(main, "run_cpu", fake_run_cpu)
+    monkeypatch.setattr(extraction_cache, "lookup", spy("lookup", extraction_cache.lookup))
+    monkeypatch.setattr(extraction_cache, "store", spy("store", extraction_cache.store))
+    monkeypatch.setattr(main, "_write_temp_pdf", spy("write", main._write_temp_pdf))
+
+    trace = []
+    first = asyncio.run(main._extract_upload(b"%PDF-1.4 dummy", trace, False))
+    second = asyncio.run(main._extract_upload(b"%PDF-1.4 dummy", trace, False))
+
+    assert trace == ["extract", "extract_cache"]
+    assert second["pages"] == first["pages"]
+    assert set(threads) == {"lookup", "store", "write"}
+    assert all(name.startswith("fa-io") for name in threads.values())
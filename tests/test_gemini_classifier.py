@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Tests for chunked Gemini classification of large documents."""
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api import gemini_classifier
+from core import genai_client
+
+_ITEM_LINE = re.compile(r"^\d+\. (.+) — ¥([\d,]+)", re.MULTILINE)
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """各明細を金額で判定して返すフェイク（同時実行数を記録する）"""
+    genai = pytest.importorskip("google.genai")
+    state = {"calls": 0, "running": 0, "peak": 0, "fail_containing": None}
+    lock = threading.Lock()
+
+    class FakeModels:
+        def generate_content(self, model, contents, config):
+            with lock:
+                state["calls"] += 1
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            try:
+                time.sleep(0.05)
+                if state["fail_containing"] and state["fail_containing"] in contents:
+                    raise TimeoutError("deadline")
+                parsed = [(desc, int(amount.replace(",", ""))) for desc, amount in _ITEM_LINE.findall(contents)]
+                analysis = [
+                    {
+                        "description": desc,
+                        "classification": "CAPITAL_LIKE" if amount >= 100_000 else "EXPENSE_LIKE",
+                        "confidence": 0.9,
+                        "included_in_acquisition_cost": amount >= 100_000,
+                    }
+                    for desc, amount in parsed
+                ]
+                capital_total = sum(amount for _, amount in parsed if amount >= 100_000)
+                expense_total = sum(amount for _, amount in parsed if amount < 100_000)
+                payload = {
+                    "decision": "CAPITAL_LIKE" if capital_total else "EXPENSE_LIKE",
+                    "confidence": 0.9,
+                    "reasons": ["ok"],
+                    "line_item_analysis": analysis,
+                    "acquisition_cost_total": capital_total,
+                    "expense_total": expense_total,
+                    "estimated_useful_life_years": 15 if capital_total else 0,
+                }
+                return SimpleNamespace(text=json.dumps(payload, ensure_ascii=False))
+            finally:
+                with lock:
+                    state["running"] -= 1
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.models = FakeModels()
+
+    monkeypatch.setenv("GEMINI_ENABLED", "1")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_CHUNK_ITEMS", "20")
+    monkeypatch.setenv("GEMINI_CHUNK_CONCURRENCY", "4")
+    monkeypatch.delenv("GOOGLE_GENAI_USE_VERTEXAI", raising=False)
+    monkeypatch.setattr(genai, "Client", FakeClient)
+    monkeypatch.setattr(gemini_classifier, "_response_cache", None)
+    genai_client.reset_clients()
+    yield state
+    genai_client.reset_clients()
+
+
+def _items(n):
+    # 3件に1件が資産（10万円以上）
+    return [{"description": f"工事項目{i:03d}", "amount": 150_000 if i % 3 == 0 else 20_000} for i in range(n)]
+
+
+class TestChunking:
+    def test_small_document_is_single_call(self, fake_gemini):
+        result = gemini_classifier.classify_with_gemini(_items(5))
+        assert fake_gemini["calls"] == 1
+        assert "gemini_chunked" not in result["flags"]
+
+    def test_chunks_respect_item_and_char_limits(self, monkeypatch):
+        monkeypatch.setenv("GEMINI_CHUNK_ITEMS", "50")
+        items = [{"description": "長い品名" * 40, "amount": 1000} for _ in range(60)]
+        chunks = gemini_classifier._chunk_line_items(items, "", {"title": "見積書"})
+        assert sum(len(c) for c in chunks) == 60
+        assert all(len(c) <= 50 for c in chunks)
+        for chunk in chunks:
+            note = gemini_classifier._chunk_context("", 1, len(chunk), 60)
+            prompt = gemini_classifier._build_user_prompt(chunk, note, {"title": "見積書"})
+            assert len(prompt) <= gemini_classifier._MAX_PROMPT_CHARS
+
+    def test_large_document_merged_in_item_order(self, fake_gemini):
+        items = _items(300)
+        start = time.monotonic()
+        result = gemini_classifier.classify_with_gemini(items, document_info={"title": "改修工事見積"})
+        elapsed = time.monotonic() - start
+
+        assert fake_gemini["calls"] == 15
+        assert fake_gemini["peak"] == 4
+        assert elapsed < 0.05 * 15
+        assert [a["description"] for a in result["line_item_analysis"]] == [it["description"] for it in items]
+        assert result["acquisition_cost_total"] == sum(it["amount"] for it in items if it["amount"] >= 100_000)
+        assert result["expense_total"] == sum(it["amount"] for it in items if it["amount"] < 100_000)
+        assert result["decision"] == "CAPITAL_LIKE"
+        assert "gemini_chunked" in result["flags"]
+
+    def test_failed_chunk_items_become_guidance(self, fake_gemini):
+        fake_gemini["fail_containing"] = "工事項目025"
+        result = gemini_classifier.classify_with_gemini(_items(60))
+        lia = result["line_item_analysis"]
+        assert len(lia) == 60
+        assert {a["classification"] for a in lia[20:40]} == {"GUIDANCE"}
+        assert lia[0]["classification"] == "CAPITAL_LIKE"
+        assert result["decision"] == "GUIDANCE"
+        assert "api_error" in result["flags"]
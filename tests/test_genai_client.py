@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Tests for core/genai_client.py – shared google-genai client registry."""
+import asyncio
+
+import pytest
+
+from core import genai_client
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    genai = pytest.importorskip("google.genai")
+    created = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.kwargs = kwargs
+            self.aio = object()
+            created.append(self)
+
+    monkeypatch.delenv("GOOGLE_GENAI_USE_VERTEXAI", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", "key-a")
+    monkeypatch.setattr(genai, "Client", FakeClient)
+    genai_client.reset_clients()
+    yield created
+    genai_client.reset_clients()
+
+
+def test_client_is_reused(fake_client):
+    first = genai_client.get_client()
+    assert genai_client.get_client() is first
+    assert fake_client == [first]
+    assert first.kwargs == {"api_key": "key-a"}
+
+
+def test_credentials_change_creates_new_client(fake_client, monkeypatch):
+    first = genai_client.get_client()
+    monkeypatch.setenv("GEMINI_API_KEY", "key-b")
+    second = genai_client.get_client()
+    assert second is not first
+    assert second.kwargs == {"api_key": "key-b"}
+
+
+def test_no_credentials_returns_none(fake_client, monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY")
+    assert genai_client.get_client() is None
+    assert fake_client == []
+
+
+def test_async_client_per_event_loop(fake_client):
+    async def grab():
+        return genai_client.get_async_client(), genai_client.get_async_client()
+
+    a1, a2 = asyncio.run(grab())
+    b1, _ = asyncio.run(grab())
+    assert a1 is a2
+    assert a1 is not b1
+    assert genai_client.client_stats()["sync_clients"] == 0
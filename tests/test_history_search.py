@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/history_search.py (n-gram indexed history lookup)."""
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from api import history_search
+from api.history_search import HistoryIndex, get_history_index, search_by_keywords, search_similar_from_history
+
+NAMES = [
+    "ノートPC HP ProBook", "ノートPC Dell", "デスクトップPC", "事務机", "事務椅子",
+    "複合機リース", "空調設備工事", "LED照明", "棚", "明細(1)", "ノートPC HP ProBook",
+]
+
+
+def _history(names=NAMES):
+    return [{"description": n, "decision": "CAPITAL_LIKE", "amount": i} for i, n in enumerate(names)]
+
+
+def _brute_force(query, history, top_k, threshold):
+    """索引を使わない従来の線形走査"""
+    results, seen = [], set()
+    q = query.lower().replace(" ", "").replace("　", "")
+    for entry in history:
+        name = entry["description"]
+        if name in seen or history_search._is_placeholder(name):
+            continue
+        sim = SequenceMatcher(None, q, name.lower().replace(" ", "").replace("　", "")).ratio()
+        if threshold <= sim < 1.0:
+            seen.add(name)
+            results.append((name, sim))
+    results.sort(key=lambda r: r[1], reverse=True)
+    return results[:top_k]
+
+
+class TestHistoryIndex:
+    @pytest.mark.parametrize("query", ["ノートPC", "ノートパソコン HP", "事務用机", "LED 照明器具", "棚", "机"])
+    def test_matches_linear_scan(self, query):
+        history = _history()
+        got = search_similar_from_history(query, history, top_k=5, threshold=0.3)
+        assert [(r["name"], r["similarity"]) for r in got] == _brute_force(query, history, 5, 0.3)
+
+    def test_matches_linear_scan_without_shared_ngrams(self):
+        # 共通の bigram が無くても SequenceMatcher では閾値を超える短い名称
+        history = _history(["複写機", "電子機器", "機複合", "合複", "機"] + NAMES)
+        for query in ["複合機", "電話機", "合機複"]:
+            got = search_similar_from_history(query, history, top_k=10, threshold=0.5)
+            assert [(r["name"], r["similarity"]) for r in got] == _brute_force(query, history, 10, 0.5)
+        assert [r["name"] for r in search_similar_from_history("複合機", history)][:1] == ["複写機"]
+        assert "電子機器" in [r["name"] for r in search_similar_from_history("電話機", history)]
+
+    def test_random_queries_match_linear_scan(self):
+        rng = random.Random(7)
+        alphabet = "機器複合写電話子事務机椅PC照明棚"
+        names = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(300)]
+        history = _history(names)
+        for _ in range(300):
+            query = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+            got = search_similar_from_history(query, history, top_k=5, threshold=0.5)
+            assert [(r["name"], r["similarity"]) for r in got] == _brute_force(query, history, 5, 0.5), query
+
+    def test_duplicates_and_placeholders_are_skipped(self):
+        index = HistoryIndex(_history())
+        assert len(index) == len(set(NAMES)) - 1
+        assert index.size == len(NAMES)
+        hit = index.search_similar("ノートPC HP", top_k=1)[0]
+        assert hit["name"] == "ノートPC HP ProBook"
+        assert hit["amount"] == 0  # 最初に現れた履歴エントリ
+
+    def test_keywords(self):
+        history = _history()
+        names = [r["name"] for r in search_by_keywords("ノートPC", history, top_k=5)]
+        assert names == ["ノートPC Dell", "ノートPC HP ProBook"]
+        # 名称 ⊂ クエリ
+        assert [r["name"] for r in search_by_keywords("事務机（木製）", history)] == ["事務机"]
+        assert [r["name"] for r in search_by_keywords("棚", history)] == ["棚"]
+
+    def test_incremental_add_and_cached_index(self):
+        history = _history()
+        index = get_history_index(history)
+        assert search_similar_from_history("サーバーラック", history) == []
+        history.append({"description": "サーバーラック 42U", "decision": "CAPITAL_LIKE"})
+        assert search_similar_from_history("サーバーラック", history)[0]["name"] == "サーバーラック 42U"
+        assert get_history_index(history) is index
+        assert index.size == len(history)
+        # 別のリスト（クリア後など）には新しい索引を作る
+        assert get_history_index(_history()) is not index
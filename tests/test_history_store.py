@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/history_store.py and the /history endpoints."""
+import csv
+import io
+
+import pytest
+
+from api import history_store
+from api.history_store import HistoryStore, invoice_key
+
+
+def _entries(n, vendor="A商事"):
+    return [
+        {
+            "timestamp": f"2026-10-{1 + i % 28:02d} 09:00:00",
+            "source": f"invoice_{i}.pdf",
+            "vendor": vendor,
+            "description": ["ノートPC HP", "事務机", "LED照明工事"][i % 3],
+            "amount": 1000 * (i + 1),
+            "decision": "CAPITAL_LIKE" if i % 2 else "EXPENSE_LIKE",
+            "useful_life_years": 4 if i % 2 else "",
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3")
+    yield store
+    store.close()
+
+
+class TestHistoryStore:
+    def test_bulk_append_and_keyset_pages(self, store):
+        assert store.append_many(_entries(120)) == 120
+        seen, cursor = [], None
+        while True:
+            page = store.query(limit=50, cursor=cursor)
+            seen.extend(e["id"] for e in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == sorted(seen, reverse=True)
+        assert len(seen) == len(set(seen)) == 120
+
+    def test_filters(self, store):
+        store.append_many(_entries(30))
+        store.append_many(_entries(5, vendor="B電機"))
+        assert store.count(vendor="B電機") == 5
+        assert store.count(min_amount=10_000, max_amount=20_000) == 11
+        assert store.count(since="2026-10-05", until="2026-10-06") == 2
+        assert store.count(description="ノートpc") == 12
+        assert store.count(decision="CAPITAL_LIKE", vendor="A商事") == 15
+        items = store.query(vendor="B電機", limit=2)["items"]
+        assert [e["amount"] for e in items] == [5000, 4000]
+        assert items[1]["useful_life_years"] == 4 and items[0]["useful_life_years"] == ""
+
+    def test_invoice_key_lookup(self, store):
+        key = invoice_key("請求書.pdf", 110000, vendor="A商事")
+        assert not store.has_invoice(key)
+        store.append({"description": "ノートPC", "invoice_key": key})
+        assert store.has_invoice(invoice_key("請求書.pdf", 110000.0, vendor="A商事"))
+        assert not store.has_invoice(invoice_key("請求書.pdf", 120000, vendor="A商事"))
+
+    def test_streaming_csv(self, store):
+        store.append_many(_entries(25))
+        chunks = list(store.iter_csv(batch_size=10))
+        assert len(chunks) == 3
+        text = "".join(chunks)
+        assert text.startswith("\ufeff")
+        rows = list(csv.DictReader(io.StringIO(text[1:])))
+        assert len(rows) == 25
+        assert rows[0]["source"] == "invoice_0.pdf"
+        assert list(rows[0]) == history_store.CSV_FIELDS
+
+    def test_similar_search_index_follows_appends(self, store):
+        store.append_many(_entries(3))
+        assert store.search_similar("ノートPC")[0]["name"] == "ノートPC HP"
+        store.append({"description": "サーバーラック 42U", "decision": "CAPITAL_LIKE"})
+        assert store.search_similar("サーバーラック")[0]["name"] == "サーバーラック 42U"
+        store.clear()
+        assert len(store) == 0
+        assert store.search_similar("サーバーラック") == []
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+
+    import api.main as main
+
+    store = HistoryStore(tmp_path / "api_history.sqlite3")
+    monkeypatch.setattr(history_store, "_history_store", store)
+    monkeypatch.setattr(main.limiter, "enabled", False, raising=False)
+    with TestClient(main.app) as client:
+        yield client
+    store.close()
+
+
+def test_history_endpoints(client):
+    body = {"source": "見積書.pdf", "vendor": "A商事", "total_amount": 250000, "entries": [
+        {"description": "ノートPC HP ProBook", "amount": 200000, "decision": "CAPITAL_LIKE", "useful_life_years": 4},
+        {"description": "設定作業費", "amount": 50000, "decision": "EXPENSE_LIKE"},
+    ]}
+    assert client.post("/history", json=body).json() == {"added": 2, "duplicate": False}
+    assert client.post("/history", json=body).json()["duplicate"] is True
+    assert client.get("/history/duplicate", params={"source": "見積書.pdf", "total_amount": 250000,
+                                                    "vendor": "A商事"}).json() == {"duplicate": True}
+
+    page = client.get("/history", params={"vendor": "A商事", "limit": 3}).json()
+    assert len(page["items"]) == 3 and page["next_cursor"] is not None
+    rest = client.get("/history", params={"vendor": "A商事", "cursor": page["next_cursor"]}).json()
+    assert len(rest["items"]) == 1 and rest["next_cursor"] is None
+
+    similar = client.get("/history/similar", params={"q": "ノートPC HP"}).json()
+    assert similar["results"][0]["name"] == "ノートPC HP ProBook"
+
+    resp = client.get("/history/export")
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert resp.text.count("\n") == 5  # ヘッダ + 4行
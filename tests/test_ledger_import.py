@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Tests for core/ledger_import.py (column-wise conversion and chunked reading)."""
+import pytest
+
+from core.ledger_import import (
+    ColumnMappingError,
+    LedgerImportError,
+    ValidationError,
+    import_ledger,
+    import_ledger_safe,
+    iter_ledger,
+)
+
+HEADER = "資産番号,資産名,取得価額,勘定科目,耐用年数,設置場所\n"
+
+
+def _write(tmp_path, rows, encoding="utf-8", header=HEADER, name="ledger.csv"):
+    path = tmp_path / name
+    path.write_text(header + "".join(rows), encoding=encoding)
+    return str(path)
+
+
+def test_converts_rows_and_reports_errors_in_row_order(tmp_path):
+    path = _write(tmp_path, [
+        'A001, ノートPC ,"150,000",器具備品,4,本社\n',
+        'A002,,100000,器具備品,4,本社\n',
+        'A003,サーバー,abc,器具備品,5,\n',
+        'A004,複合機,￥９８，０００円,器具備品,5.9,\n',
+        'A005,机,50000,,15,\n',
+        'A006,椅子,50000,器具備品,x,\n',
+        'A007,棚,50000,器具備品,0,\n',
+    ])
+    errors = []
+    records = [r for batch in iter_ledger(path, errors=errors) for r in batch]
+
+    assert records == [
+        {"name": "ノートPC", "amount": 150000.0, "account": "器具備品", "useful_life": 4,
+         "asset_id": "A001", "location": "本社"},
+        # 全角数字・全角記号も数値化し、耐用年数は切り捨て
+        {"name": "複合機", "amount": 98000.0, "account": "器具備品", "useful_life": 5, "asset_id": "A004"},
+    ]
+    assert errors == [
+        "行3: 資産名が空です",
+        "行4: 取得価額を数値に変換できません: abc",
+        "行6: 勘定科目が空です",
+        "行7: 耐用年数を数値に変換できません: x",
+        "行8: 耐用年数は正の整数である必要があります: 0",
+    ]
+
+
+def test_chunked_reading_matches_single_pass(tmp_path):
+    rows = [f"A{i:04d},資産{i},{1000 + i},器具備品,{'0' if i % 7 == 0 else 4},\n" for i in range(250)]
+    path = _write(tmp_path, rows)
+
+    errors = []
+    batches = list(iter_ledger(path, chunk_size=40, errors=errors))
+    assert all(0 < len(batch) <= 40 for batch in batches)
+    assert [r for batch in batches for r in batch] == list(next(iter_ledger(path, chunk_size=1000)))
+    # 行番号はチャンクをまたいでも通し番号
+    assert errors[-1] == "行247: 耐用年数は正の整数である必要があります: 0"
+    assert len(errors) == 36
+
+
+def test_shift_jis_file(tmp_path):
+    path = _write(tmp_path, ["A001,事務机,80000,器具備品,15,倉庫\n"], encoding="cp932")
+    assert import_ledger(path)[0]["name"] == "事務机"
+
+
+def test_all_rows_invalid_raises(tmp_path):
+    path = _write(tmp_path, ["A001,,1000,器具備品,4,\n"])
+    with pytest.raises(ValidationError):
+        import_ledger(path)
+
+
+def test_partial_errors_are_returned_as_warnings(tmp_path):
+    path = _write(tmp_path, ["A001,PC,1000,器具備品,4,\n", "A002,PC,abc,器具備品,4,\n"])
+    result = import_ledger_safe(path)
+    assert result["success"] and len(result["data"]) == 1
+    assert "行3: 取得価額を数値に変換できません: abc" in result["warnings"][0]
+
+
+def test_missing_columns_and_empty_files(tmp_path):
+    with pytest.raises(ColumnMappingError):
+        import_ledger(_write(tmp_path, ["x,1\n"], header="資産名,取得価額\n"))
+    with pytest.raises(LedgerImportError):
+        import_ledger(_write(tmp_path, [], name="empty.csv"))
+    with pytest.raises(LedgerImportError):
+        import_ledger(_write(tmp_path, [], header="", name="blank.csv"))
+
+
+def test_excel_file(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "ledger.xlsx"
+    pd.DataFrame({
+        "資産名": ["ノートPC", "サーバー"],
+        "取得価額": [150000, "1,200,000"],
+        "勘定科目": ["器具備品", "器具備品"],
+        "耐用年数": [4, 5],
+        "取得日": pd.to_datetime(["2024-04-01", None]),
+    }).to_excel(path, index=False)
+    records = import_ledger(str(path))
+    assert [r["amount"] for r in records] == [150000.0, 1200000.0]
+    assert records[0]["acquisition_date"] == "2024-04-01 00:00:00"
+    assert "acquisition_date" not in records[1]
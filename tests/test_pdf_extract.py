@@ -1,5 +1,12 @@
+import os
+import subprocess
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import pytest
+
 from core.pdf_extract import TEXT_TOO_SHORT_CODE, extract_pdf, extraction_to_opal
 from core.adapter import adapt_opal_to_v1
 from core.classifier import classify_document
@@ -118,3 +125,144 @@ def test_extract_pdf_emits_warning_for_short_text(monkeypatch, tmp_path):
     warnings = extraction["meta"].get("warnings")
     assert warnings
     assert warnings[0]["code"] == TEXT_TOO_SHORT_CODE
+
+
+def _make_pdf_with_table_on_page_2(path):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "見積書 本文のみ", fontname="japan")
+    page = doc.new_page()
+    for r in range(4):
+        page.draw_line((72, 100 + r * 20), (372, 100 + r * 20))
+    for c in range(4):
+        page.draw_line((72 + c * 100, 100), (72 + c * 100, 160))
+    for r, row in enumerate([("item", "qty", "amount"), ("server", "1", "500000"), ("cable", "2", "20000")]):
+        for c, cell in enumerate(row):
+            page.insert_text((76 + c * 100, 114 + r * 20), cell)
+    doc.save(str(path))
+
+
+def test_tables_only_parsed_on_pages_with_drawings(monkeypatch, tmp_path):
+    """pdfplumber には罫線（ベクター描画）のあるページだけを渡す"""
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+
+    import core.pdf_extract as pdf_extract
+
+    calls = []
+    original = pdf_extract._extract_tables_from_plumber_page
+
+    def spy(plumber_page):
+        calls.append(plumber_page.page_number)
+        return original(plumber_page)
+
+    monkeypatch.setattr(pdf_extract, "_extract_tables_from_plumber_page", spy)
+    data = extract_pdf(pdf_path, use_docai=False, use_ocr=False)
+
+    assert calls == [2]
+    assert data["pages"][0]["tables"] == []
+    assert data["pages"][1]["tables"][0][1] == ["server", "1", "500000"]
+
+
+def test_extract_pdf_backends_accept_bytes(tmp_path):
+    from core.pdf_extract import _extract_with_fitz, _extract_with_pdfplumber
+
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+    raw = pdf_path.read_bytes()
+
+    fitz_pages = _extract_with_fitz(raw)
+    assert [p["_has_drawings"] for p in fitz_pages] == [False, True]
+    plumber_pages = _extract_with_pdfplumber(raw)
+    assert [p["page"] for p in plumber_pages] == [1, 2]
+
+
+def test_page_parallel_matches_serial(monkeypatch, tmp_path):
+    """ページ並列抽出はページ順・内容ともに逐次抽出と一致する"""
+    import core.pdf_extract as pdf_extract
+
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+    monkeypatch.setenv("PDF_PAGE_CHUNK", "1")
+
+    serial = extract_pdf(pdf_path)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        parallel = extract_pdf(pdf_path, page_executor=pool)
+    assert pdf_extract.plan_page_shards(pdf_path) == [(0, 1), (1, 2)]
+
+    for data in (serial, parallel):
+        data["meta"].pop("extracted_at")
+    assert parallel == serial
+    assert [p["page"] for p in parallel["pages"]] == [1, 2]
+
+
+def test_page_parallel_falls_back_to_serial(monkeypatch, tmp_path):
+    import core.pdf_extract as pdf_extract
+
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+    monkeypatch.setenv("PDF_PAGE_CHUNK", "1")
+    monkeypatch.setattr(pdf_extract, "_extract_pages_parallel", lambda *args: None)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        data = extract_pdf(pdf_path, page_executor=pool)
+    assert data["meta"]["num_pages"] == 2
+    assert data["pages"][1]["tables"][0][1] == ["server", "1", "500000"]
+
+
+def test_page_shards_run_through_shared_pool_and_exit_cleanly(tmp_path):
+    """API のページ並列は run_cpu のプールだけを使い、ワーカー内でプールを入れ子にしない"""
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+    script = textwrap.dedent("""
+        import asyncio, sys
+        from api import main
+        from api.executor_pool import run_cpu, shutdown_executors
+        from core.pdf_extract import extract_pdf
+
+        async def run(path):
+            content = open(path, "rb").read()
+            sharded = await main._extract_upload(content, [], False)
+            # ワーカー内の extract_pdf は PDF_PAGE_WORKERS があってもプールを作らない
+            whole = await run_cpu(extract_pdf, path)
+            return sharded, whole
+
+        sharded, whole = asyncio.run(run(sys.argv[1]))
+        shutdown_executors()
+        assert [p["page"] for p in sharded["pages"]] == [1, 2]
+        assert sharded["pages"] == whole["pages"]
+        print("ok")
+    """)
+    env = {
+        **os.environ,
+        "EXTRACT_WORKERS": "2",
+        "PDF_PAGE_WORKERS": "2",
+        "PDF_PAGE_CHUNK": "1",
+        "EXTRACTION_CACHE_ENABLED": "0",
+        "PYTHONPATH": str(Path(__file__).resolve().parents[1]),
+    }
+    proc = subprocess.run(
+        [sys.executable, "-c", script, str(pdf_path)],
+        env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().endswith("ok")
+    assert "leaked" not in proc.stderr
+
+
+def test_iter_pdf_pages_streams_into_extraction_to_opal(tmp_path):
+    """iter_pdf_pages は extract_pdf と同じページを1件ずつ返し、extraction_to_opal でそのまま消費できる"""
+    from core.pdf_extract import iter_pdf_pages
+
+    pdf_path = tmp_path / "two_pages.pdf"
+    _make_pdf_with_table_on_page_2(pdf_path)
+    extraction = extract_pdf(pdf_path)
+
+    pages = iter_pdf_pages(pdf_path)
+    first = next(pages)
+    assert set(first) == {"page", "method", "text", "tables", "evidence"}
+    assert first == extraction["pages"][0]
+
+    streamed = extraction_to_opal({"meta": extraction["meta"], "pages": iter_pdf_pages(pdf_path)})
+    assert streamed == extraction_to_opal(extraction)
+    assert streamed["line_items"][0]["description"] == "server"
@@ -21,7 +21,7 @@ def test_adapter_shapes_schema():
 def test_classifier_guidance_with_threshold_policy():
     opal = {"line_items": [{"description": "unknown item", "amount": 2_000_000}]}
     doc = adapt_opal_to_v1(opal)
-    policy = load_policy(None)
+    policy = load_policy(None).to_dict()
     policy["thresholds"]["guidance_amount_jpy"] = 1_000_000
     result = classify_document(doc, policy)
     item = result["line_items"][0]
@@ -31,6 +31,6 @@ def test_classifier_guidance_with_threshold_policy():
 
 def test_policy_missing_returns_defaults():
     policy = load_policy("does_not_exist.json")
-    assert policy["keywords"]["asset_add"] == []
+    assert list(policy["keywords"]["asset_add"]) == []
     assert policy["thresholds"]["guidance_amount_jpy"] is None
     assert policy["regex"]["always_guidance"] is None
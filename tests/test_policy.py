@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for core/policy.py – CompiledPolicy and the path/mtime cache."""
+import json
+import os
+
+import pytest
+
+from core import schema
+from core.classifier import classify_line_item
+from core.policy import CompiledPolicy, clear_policy_cache, load_policy
+
+
+def _write_policy(path, asset_add=None, always_guidance=None):
+    path.write_text(
+        json.dumps({
+            "keywords": {"asset_add": asset_add or [], "expense_add": [], "guidance_add": []},
+            "thresholds": {"guidance_amount_jpy": 1_000_000},
+            "regex": {"always_guidance": always_guidance},
+        }, ensure_ascii=False),
+        encoding="utf-8",
+    )
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    clear_policy_cache()
+    yield
+    clear_policy_cache()
+
+
+class TestCompiledPolicy:
+    def test_returns_compiled_policy(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path, asset_add=["特注"], always_guidance="リース")
+        policy = load_policy(str(path))
+        assert isinstance(policy, CompiledPolicy)
+        assert policy["keywords"]["asset_add"] == ("特注",)
+        assert policy.capital_keywords[-1] == "特注"
+        assert policy.always_guidance_re.search("リース契約")
+        assert policy.guidance_amount_jpy == 1_000_000
+
+    def test_immutable(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path)
+        policy = load_policy(str(path))
+        with pytest.raises(TypeError):
+            policy["thresholds"]["guidance_amount_jpy"] = 1
+        with pytest.raises(AttributeError):
+            policy.guidance_amount_jpy = 1
+
+    def test_to_dict_is_mutable_copy(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path, asset_add=["特注"])
+        policy = load_policy(str(path))
+        copy = policy.to_dict()
+        copy["keywords"]["asset_add"].append("追加")
+        assert policy["keywords"]["asset_add"] == ("特注",)
+
+    def test_invalid_regex_is_ignored(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path, always_guidance="(")
+        policy = load_policy(str(path))
+        assert policy.always_guidance_re is None
+        item = classify_line_item({"description": "サーバー設置", "amount": 500_000}, policy)
+        assert item["classification"] == schema.CAPITAL_LIKE
+
+    def test_classification_matches_plain_dict(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path, asset_add=["特注"], always_guidance="リース")
+        compiled = load_policy(str(path))
+        for desc in ("特注ラック", "リース契約更新", "年間保守", "その他"):
+            a = classify_line_item({"description": desc, "amount": 1_500_000}, compiled)
+            b = classify_line_item({"description": desc, "amount": 1_500_000}, compiled.to_dict())
+            assert a == b
+
+
+class TestPolicyCache:
+    def test_cached_by_path(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path)
+        assert load_policy(str(path)) is load_policy(str(path))
+
+    def test_reloads_when_file_changes(self, tmp_path):
+        path = tmp_path / "policy.json"
+        _write_policy(path, asset_add=["特注"])
+        first = load_policy(str(path))
+        _write_policy(path, asset_add=["特注", "量産"])
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        second = load_policy(str(path))
+        assert second is not first
+        assert second["keywords"]["asset_add"] == ("特注", "量産")
+
+    def test_missing_file_returns_empty_policy(self):
+        policy = load_policy("does_not_exist.json")
+        assert isinstance(policy, CompiledPolicy)
+        assert policy.always_guidance_re is None
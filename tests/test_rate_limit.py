@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/rate_limit.py."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from api.rate_limit import AsyncTokenBucket, is_retryable, retry_after_seconds
+
+
+class _FakeTime:
+    """clock と sleep を共有するフェイク（sleep すると時計が進む）"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def _bucket(fake, rate, capacity=None):
+    return AsyncTokenBucket(rate, capacity=capacity, clock=fake.clock, sleep=fake.sleep)
+
+
+class TestAsyncTokenBucket:
+    def test_paces_requests_at_rate(self):
+        fake = _FakeTime()
+        bucket = _bucket(fake, rate=10, capacity=2)
+        times = []
+
+        async def go():
+            for _ in range(12):
+                await bucket.acquire()
+                times.append(fake.now)
+
+        asyncio.run(go())
+        # バースト2件の後は 0.1 秒間隔
+        assert times[:2] == [0.0, 0.0]
+        assert times[-1] == pytest.approx(1.0)
+
+    def test_defer_holds_back_all_callers(self):
+        fake = _FakeTime()
+        bucket = _bucket(fake, rate=100)
+        bucket.defer(5.0)
+
+        async def go():
+            await bucket.acquire()
+            return fake.now
+
+        assert asyncio.run(go()) == pytest.approx(5.0, abs=0.02)
+
+    def test_per_minute(self):
+        bucket = AsyncTokenBucket.per_minute(600)
+        assert bucket.rate == 10 and bucket.capacity == 10
+        with pytest.raises(ValueError):
+            AsyncTokenBucket(0)
+
+
+def _api_error(code, headers=None, details=None):
+    exc = RuntimeError(f"{code} error")
+    exc.code = code
+    exc.response = SimpleNamespace(headers=headers or {})
+    exc.details = details
+    return exc
+
+
+class TestRetryHints:
+    def test_retry_after_header_seconds_and_date(self):
+        assert retry_after_seconds(_api_error(429, {"Retry-After": "7"})) == 7.0
+        date_exc = _api_error(429, {"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})
+        now = 1792567670.0  # 2026-10-21 07:27:50 UTC
+        assert retry_after_seconds(date_exc, now=now) == pytest.approx(10.0)
+
+    def test_retry_info_in_error_details(self):
+        details = {"error": {"code": 429, "details": [
+            {"@type": "type.googleapis.com/google.rpc.QuotaFailure"},
+            {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12s"},
+        ]}}
+        assert retry_after_seconds(_api_error(429, details=details)) == 12.0
+        assert retry_after_seconds(_api_error(429)) is None
+
+    def test_is_retryable(self):
+        assert is_retryable(_api_error(429))
+        assert is_retryable(_api_error(503))
+        assert not is_retryable(_api_error(400))
+        assert is_retryable(ConnectionError("reset"))
+        assert is_retryable(RuntimeError("Quota exceeded"))
+        assert not is_retryable(ValueError("bad input"))
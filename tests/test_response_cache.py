@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/response_cache.py and the Gemini classification cache."""
+from types import SimpleNamespace
+
+import pytest
+
+from api import gemini_classifier
+from api.response_cache import MemoryResponseCache, SQLiteResponseCache, canonical_key
+from core import genai_client
+
+
+class _Clock:
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def factory(**kwargs):
+        if request.param == "memory":
+            return MemoryResponseCache(**kwargs)
+        return SQLiteResponseCache(tmp_path / "responses.sqlite3", **kwargs)
+
+    return factory
+
+
+def test_canonical_key_ignores_dict_order():
+    assert canonical_key({"a": 1, "b": [1, 2]}) == canonical_key({"b": [1, 2], "a": 1})
+    assert canonical_key({"a": 1}) != canonical_key({"a": 2})
+
+
+class TestResponseCache:
+    def test_roundtrip_and_namespaces(self, make_cache):
+        cache = make_cache(max_items=10)
+        assert cache.get("ns", "k") is None
+        cache.put("ns", "k", {"decision": "CAPITAL_LIKE"})
+        assert cache.get("ns", "k") == {"decision": "CAPITAL_LIKE"}
+        assert cache.get("other", "k") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+
+    def test_ttl_expiry(self, make_cache):
+        clock = _Clock()
+        cache = make_cache(max_items=10, ttl_seconds=60, clock=clock)
+        cache.put("ns", "k", {"v": 1})
+        clock.now += 59
+        assert cache.get("ns", "k") == {"v": 1}
+        clock.now += 2
+        assert cache.get("ns", "k") is None
+        assert cache.stats()["expired"] == 1
+
+    def test_size_bound_evicts_least_recently_used(self, make_cache):
+        clock = _Clock()
+        cache = make_cache(max_items=2, clock=clock)
+        for key in ("a", "b"):
+            clock.now += 1
+            cache.put("ns", key, {"key": key})
+        clock.now += 1
+        cache.get("ns", "a")  # a を最近使ったことにする
+        clock.now += 1
+        cache.put("ns", "c", {"key": "c"})
+        assert cache.get("ns", "b") is None
+        assert cache.get("ns", "a") == {"key": "a"}
+        assert cache.stats()["items"] == 2
+
+    def test_hit_returns_independent_copy(self, make_cache):
+        cache = make_cache(max_items=10)
+        cache.put("ns", "k", {"reasons": ["x"]})
+        cache.get("ns", "k")["reasons"].append("mutated")
+        assert cache.get("ns", "k") == {"reasons": ["x"]}
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    SQLiteResponseCache(path).put("ns", "k", {"decision": "EXPENSE_LIKE"})
+    assert SQLiteResponseCache(path).get("ns", "k") == {"decision": "EXPENSE_LIKE"}
+
+
+class TestClassifyWithGeminiCache:
+    @pytest.fixture
+    def fake_genai(self, monkeypatch):
+        genai = pytest.importorskip("google.genai")
+        calls = []
+
+        class FakeModels:
+            def generate_content(self, model, contents, config):
+                calls.append(contents)
+                return SimpleNamespace(text='{"decision": "CAPITAL_LIKE", "confidence": 0.9, "reasons": ["PC"]}')
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.models = FakeModels()
+
+        monkeypatch.setenv("GEMINI_ENABLED", "1")
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.delenv("GOOGLE_GENAI_USE_VERTEXAI", raising=False)
+        monkeypatch.setattr(genai, "Client", FakeClient)
+        monkeypatch.setattr(gemini_classifier, "_response_cache", MemoryResponseCache(max_items=10))
+        genai_client.reset_clients()
+        yield calls
+        genai_client.reset_clients()
+
+    def test_repeat_document_served_from_cache(self, fake_genai):
+        items = [{"description": "年間保守契約", "amount": 120000}]
+        first = gemini_classifier.classify_with_gemini(items, document_info={"vendor": "A社"})
+        # プロンプトに現れないフィールドの違いではキーが変わらない
+        second = gemini_classifier.classify_with_gemini(
+            [{"description": "年間保守契約", "amount": 120000, "evidence": {"page": 3}}],
+            document_info={"vendor": "A社"},
+        )
+        assert first == second
+        assert len(fake_genai) == 1
+
+        gemini_classifier.classify_with_gemini(items, document_info={"vendor": "B社"})
+        assert len(fake_genai) == 2
+
+    def test_model_change_misses(self, fake_genai, monkeypatch):
+        items = [{"description": "ノートPC", "amount": 250000}]
+        gemini_classifier.classify_with_gemini(items)
+        monkeypatch.setenv("GEMINI_MODEL", "another-model")
+        gemini_classifier.classify_with_gemini(items)
+        assert len(fake_genai) == 2
+
+    def test_disabled_cache(self, fake_genai, monkeypatch):
+        monkeypatch.setattr(gemini_classifier, "_response_cache", None)
+        for _ in range(2):
+            gemini_classifier.classify_with_gemini([{"description": "ノートPC", "amount": 250000}])
+        assert len(fake_genai) == 2
+        assert gemini_classifier.response_cache_stats() == {"enabled": False}
@@ -7,7 +7,7 @@ import math
 import pytest
 import numpy as np
 
-from api.similarity_search import cosine_similarity, search_similar, batch_search_similar
+from api.similarity_search import EmbeddingIndex, batch_search_similar, cosine_similarity, search_similar
 
 
 class TestCosineSimilarity:
@@ -232,3 +232,56 @@ class TestBatchSearchSimilar:
         results = batch_search_similar([], sample_items, top_k=1, threshold=0.0)
 
         assert results == []
+
+
+class TestEmbeddingIndex:
+    """EmbeddingIndex (vectorized matrix search) matches the pairwise definition."""
+
+    @pytest.fixture
+    def random_items(self):
+        rng = np.random.default_rng(0)
+        return [
+            {"name": f"資産{i}", "embedding": rng.normal(size=32).tolist(), "metadata": {"row": i}}
+            for i in range(500)
+        ]
+
+    def test_matches_pairwise_cosine(self, random_items):
+        query = np.random.default_rng(1).normal(size=32).tolist()
+        expected = sorted(
+            ((cosine_similarity(query, it["embedding"]), i) for i, it in enumerate(random_items)),
+            key=lambda x: -x[0],
+        )[:10]
+        hits = EmbeddingIndex(random_items).search(query, top_k=10)
+        assert [i for i, _ in hits] == [i for _, i in expected]
+        assert [s for _, s in hits] == pytest.approx([s for s, _ in expected], abs=1e-5)
+
+    def test_batch_equals_single_queries(self, random_items):
+        index = EmbeddingIndex(random_items)
+        queries = [it["embedding"] for it in random_items[:5]]
+        batch = batch_search_similar(queries, index, top_k=3, threshold=0.0)
+        assert batch == [search_similar(q, index, top_k=3, threshold=0.0) for q in queries]
+        assert [r[0]["name"] for r in batch] == [f"資産{i}" for i in range(5)]
+
+    def test_ties_keep_item_order(self):
+        items = [{"name": str(i), "embedding": [1.0, 0.0]} for i in range(6)]
+        results = search_similar([2.0, 0.0], items, top_k=3, threshold=0.0)
+        assert [r["name"] for r in results] == ["0", "1", "2"]
+
+    def test_ties_keep_item_order_for_many_rows(self):
+        items = [{"name": str(i), "embedding": [1.0, 0.0]} for i in range(1500)]
+        items[700]["embedding"] = [1.0, 0.1]  # 同点の行より低い類似度
+        index = EmbeddingIndex(items)
+        assert [i for i, _ in index.search([1.0, 0.0], top_k=3)] == [0, 1, 2]
+        hits = index.search([1.0, 0.0], top_k=1499)
+        assert [i for i, _ in hits] == [i for i in range(1500) if i != 700]
+
+    def test_skips_zero_and_mismatched_vectors(self):
+        items = [
+            {"name": "zero", "embedding": [0.0, 0.0]},
+            {"name": "wrong_dim", "embedding": [1.0, 0.0, 0.0]},
+            {"name": "ok", "embedding": [0.0, 3.0]},
+        ]
+        index = EmbeddingIndex(items)
+        assert len(index) == 2
+        assert index.search([0.0, 1.0], top_k=5) == [(2, 1.0), (0, 0.0)]
+        assert index.search([1.0, 0.0, 0.0], top_k=5) == []
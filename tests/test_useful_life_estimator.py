@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Tests for api/useful_life_estimator.py (master matching and the Gemini memo)."""
+import pytest
+
+from api import useful_life_estimator as ule
+from api.response_cache import MemoryResponseCache
+
+
+@pytest.fixture(autouse=True)
+def _no_shared_cache():
+    ule.set_estimate_cache(None)
+    yield
+    ule.set_estimate_cache(None)
+
+
+class TestKeywordMatcher:
+    def test_longest_keyword_wins_regardless_of_order(self):
+        for keywords in (["パソコン", "ノートパソコン"], ["ノートパソコン", "パソコン"]):
+            matcher = ule.KeywordMatcher(keywords)
+            assert keywords[matcher.longest("新品ノートパソコン一式")] == "ノートパソコン"
+
+    def test_ties_prefer_earliest_then_master_order(self):
+        matcher = ule.KeywordMatcher(["机", "椅子", "棚"])
+        assert matcher.longest("棚と机") == 2
+        assert ule.KeywordMatcher(["ab", "bc"]).longest("abc") == 0
+
+    def test_suffix_keywords_found_through_failure_links(self):
+        matcher = ule.KeywordMatcher(["abcd", "bc"])
+        assert matcher.longest("xabcx") == 1
+        assert matcher.longest("zzz") == -1
+        assert ule.KeywordMatcher([]).longest("abc") == -1
+
+    def test_large_master(self):
+        keywords = [f"資産{i:05d}" for i in range(20000)] + ["サーバーラック"]
+        matcher = ule.KeywordMatcher(keywords)
+        assert matcher.longest("19:サーバーラック 資産12345 設置") == len(keywords) - 1
+        assert matcher.longest("資産12345 設置") == 12345
+
+
+class TestLookupMaster:
+    def test_prefers_specific_keyword(self):
+        result = ule.estimate_useful_life("軽自動車 1台")
+        assert result["source"] == "master_lookup"
+        assert result["useful_life_years"] == 4
+
+    def test_normalizes_width_and_spacing(self):
+        # 半角カナ・全角英数も同じキーワードに一致する
+        assert ule._lookup_master("ﾉｰﾄﾊﾟｿｺﾝ")["useful_life_years"] == 4
+        assert ule._lookup_master("ＰＣ用ディスプレイ")["subcategory"] == "電子計算機"
+        assert ule._lookup_master("未登録の何か") is None
+
+    def test_master_changes_are_picked_up(self, monkeypatch):
+        master = dict(ule.USEFUL_LIFE_MASTER)
+        master["テスト機器"] = {"years": 7, "category": "c", "subcategory": "s", "basis": "b"}
+        monkeypatch.setattr(ule, "USEFUL_LIFE_MASTER", master)
+        assert ule._lookup_master("テスト機器")["useful_life_years"] == 7
+
+
+class TestGeminiMemo:
+    def test_second_estimate_is_served_from_cache(self, monkeypatch):
+        calls = []
+
+        def fake_call(prompt):
+            calls.append(prompt)
+            return {"useful_life_years": 8, "category": "器具及び備品", "source": "gemini_api"}
+
+        monkeypatch.setattr(ule, "_call_gemini_api", fake_call)
+        ule.set_estimate_cache(MemoryResponseCache(max_items=10))
+
+        first = ule.estimate_useful_life("業務用 焙煎機", "器具及び備品")
+        second = ule.estimate_useful_life("業務用　焙煎機", "器具及び備品")
+        assert first["useful_life_years"] == second["useful_life_years"] == 8
+        assert second.get("cached") is True
+        assert len(calls) == 1
+
+        # カテゴリが違えば別の推定
+        ule.estimate_useful_life("業務用 焙煎機", "機械装置")
+        assert len(calls) == 2
+
+    def test_failures_are_not_cached(self, monkeypatch):
+        results = [None, {"useful_life_years": 10, "source": "gemini_api"}]
+        monkeypatch.setattr(ule, "_call_gemini_api", lambda prompt: results.pop(0))
+        ule.set_estimate_cache(MemoryResponseCache(max_items=10))
+
+        assert ule.estimate_useful_life("特殊な装置X")["source"] == "default"
+        assert ule.estimate_useful_life("特殊な装置X")["useful_life_years"] == 10
+        assert not results
+
+
+class TestBatch:
+    @pytest.fixture
+    def batch_calls(self, monkeypatch):
+        calls = []
+
+        def fake_batch(entries):
+            calls.append([description for description, _ in entries])
+            return [
+                {"useful_life_years": 10 + i, "source": "gemini_api"} for i in range(len(entries))
+            ]
+
+        monkeypatch.setattr(ule, "_call_gemini_batch", fake_batch)
+        monkeypatch.setattr(ule, "_call_gemini_api", lambda prompt: pytest.fail("single call not expected"))
+        ule.set_estimate_cache(MemoryResponseCache(max_items=100))
+        return calls
+
+    def test_master_hits_resolved_locally_and_rest_in_one_call(self, batch_calls):
+        items = [
+            {"description": "ノートパソコン"},
+            {"description": "焙煎機"},
+            {"description": ""},
+            {"description": "製氷機"},
+            {"description": "焙煎機 "},  # 正規化後は同じ資産
+        ]
+        results = ule.estimate_useful_life_batch(items)
+        assert batch_calls == [["焙煎機", "製氷機"]]
+        assert [r["source"] for r in results] == ["master_lookup", "gemini_api", "error", "gemini_api", "gemini_api"]
+        assert [r["useful_life_years"] for r in results] == [4, 10, 0, 11, 10]
+        assert [r["original_description"] for r in results] == [i["description"] for i in items]
+        assert results[1] is not results[4]
+
+        # 2回目は保存済みの推定だけで返る
+        again = ule.estimate_useful_life_batch(items[1:2])
+        assert len(batch_calls) == 1 and again[0]["cached"] is True
+
+    def test_large_input_is_chunked(self, batch_calls, monkeypatch):
+        monkeypatch.setenv("USEFUL_LIFE_BATCH_ITEMS", "3")
+        items = [{"description": f"特殊装置{i}"} for i in range(7)]
+        results = ule.estimate_useful_life_batch(items)
+        assert sorted(len(c) for c in batch_calls) == [1, 3, 3]
+        assert [r["useful_life_years"] for r in results] == [10, 11, 12, 10, 11, 12, 10]
+
+
+class TestCallGeminiBatch:
+    def test_maps_answers_by_index(self, monkeypatch):
+        response = {"items": [
+            {"index": 1, "useful_life_years": 6},
+            {"index": "0", "useful_life_years": 8},
+            {"index": 7, "useful_life_years": 9},
+        ]}
+        monkeypatch.setattr(ule, "_generate_json", lambda prompt, timeout_ms: response)
+        results = ule._call_gemini_batch([("a", None), ("b", None), ("c", None)])
+        assert [r and r["useful_life_years"] for r in results] == [8, 6, None]
+        assert results[0]["source"] == "gemini_api" and "index" not in results[0]
+
+    def test_positional_fallback_only_when_counts_match(self, monkeypatch):
+        monkeypatch.setattr(ule, "_generate_json", lambda prompt, timeout_ms: [{"useful_life_years": 3}])
+        assert ule._call_gemini_batch([("a", None)])[0]["useful_life_years"] == 3
+        assert ule._call_gemini_batch([("a", None), ("b", None)]) == [None, None]
+
+    def test_failed_request_yields_defaults(self, monkeypatch):
+        monkeypatch.setattr(ule, "_generate_json", lambda prompt, timeout_ms: None)
+        ule.set_estimate_cache(MemoryResponseCache(max_items=10))
+        results = ule.estimate_useful_life_batch([{"description": "謎A"}, {"description": "謎B"}])
+        assert [r["source"] for r in results] == ["default", "default"]
+        assert ule.get_estimate_cache().stats()["items"] == 0
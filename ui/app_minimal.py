@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Minimal Streamlit UI for fixed asset classification."""
+import asyncio
 import csv
 import io
 import json
 import os
+import sqlite3
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -53,6 +55,13 @@ try:
 except ImportError:
     HISTORY_SEARCH_AVAILABLE = False
 
+# 判定履歴の永続ストア（SQLite。api/ が無い UI 単体コンテナではセッション内のみ）
+try:
+    from api.history_store import get_history_store, invoice_key
+    HISTORY_STORE_AVAILABLE = True
+except ImportError:
+    HISTORY_STORE_AVAILABLE = False
+
 # PDF分割機能（高精度モード用）
 try:
     from core.pdf_splitter import generate_thumbnail_grid_with_metadata
@@ -145,8 +154,30 @@ def _get_selected_total(source_name: str, line_items: List[Dict]) -> Tuple[float
     return selected_total, selected_count
 
 
+def _history_store():
+    """永続ストア（使えなければ None → st.session_state.history を使う）"""
+    if not HISTORY_STORE_AVAILABLE:
+        return None
+    try:
+        return get_history_store()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _history_count() -> int:
+    store = _history_store()
+    return len(store) if store is not None else len(st.session_state.history)
+
+
+def _document_total(result: Dict[str, Any]) -> float:
+    return sum((item.get("amount") or 0) for item in result.get("line_items", []) or [])
+
+
 def _check_duplicate(source_name: str, total_amount: float) -> bool:
     """履歴に同じファイル名・金額の組み合わせがあるかチェック"""
+    store = _history_store()
+    if store is not None:
+        return store.has_invoice(invoice_key(source_name, total_amount))
     for entry in st.session_state.history:
         if entry.get("source") == source_name:
             # 同じソース名が既にある
@@ -156,6 +187,10 @@ def _check_duplicate(source_name: str, total_amount: float) -> bool:
 
 def _export_history_csv() -> bytes:
     """履歴をCSV形式でエクスポート（Excel対応UTF-8 BOM付き）"""
+    store = _history_store()
+    if store is not None:
+        # ストアは BOM 付きの CSV を少しずつ返す
+        return "".join(store.iter_csv()).encode("utf-8")
     output = io.StringIO()
     fieldnames = [
         "timestamp", "source", "description", "amount",
@@ -175,6 +210,7 @@ def _add_to_history(source_name: str, result: Dict[str, Any]) -> None:
     confidence = result.get("confidence", 0.0)
     useful_life = result.get("useful_life", {}) or {}
     line_items = result.get("line_items", [])
+    entries = []
 
     for item in line_items:
         desc = item.get("description", "")
@@ -182,6 +218,8 @@ def _add_to_history(source_name: str, result: Dict[str, Any]) -> None:
         item_class = item.get("classification", decision)
         if desc.startswith("明細(") or desc.startswith("明細（"):
             desc = ""
+        # 明細ごとの耐用年数（APIが全資産明細をまとめて推定）を優先
+        item_life = item.get("useful_life") or useful_life
         entry = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "source": source_name,
@@ -189,10 +227,10 @@ def _add_to_history(source_name: str, result: Dict[str, Any]) -> None:
             "amount": amount,
             "decision": item_class,
             "confidence": confidence,
-            "category": useful_life.get("category", ""),
-            "useful_life_years": useful_life.get("useful_life_years", ""),
+            "category": item_life.get("category", ""),
+            "useful_life_years": item_life.get("useful_life_years", ""),
         }
-        st.session_state.history.append(entry)
+        entries.append(entry)
 
     if not line_items:
         entry = {
@@ -205,7 +243,21 @@ def _add_to_history(source_name: str, result: Dict[str, Any]) -> None:
             "category": useful_life.get("category", ""),
             "useful_life_years": useful_life.get("useful_life_years", ""),
         }
-        st.session_state.history.append(entry)
+        entries.append(entry)
+
+    store = _history_store()
+    if store is not None:
+        key = invoice_key(source_name, _document_total(result))
+        store.append_many({**entry, "invoice_key": key} for entry in entries)
+    else:
+        st.session_state.history.extend(entries)
+
+
+def _similar_from_history(query: str) -> List[Dict[str, Any]]:
+    store = _history_store()
+    if store is not None:
+        return store.search_similar(query, top_k=3, threshold=0.5)
+    return search_similar_from_history(query, st.session_state.history, top_k=3, threshold=0.5)
 
 
 # ページ設定
@@ -263,7 +315,7 @@ if demo_cases_dir.exists():
 with st.sidebar:
     # 履歴・エクスポート
     st.markdown("### 📋 判定履歴")
-    history_count = len(st.session_state.history)
+    history_count = _history_count()
     st.metric("蓄積件数", f"{history_count}件")
 
     if history_count > 0:
@@ -275,7 +327,10 @@ with st.sidebar:
             mime="text/csv; charset=utf-8",
             use_container_width=True,
         )
-        if st.button("🗑️ 履歴クリア", use_container_width=True):
+        # 共有ストアは全セッション・/history API の履歴なので、UI から消せるのはセッションの履歴だけ
+        if _history_store() is not None:
+            st.caption("判定履歴は共有ストアに保存されます（ここからは削除できません）")
+        elif st.button("🗑️ 履歴クリア", use_container_width=True):
             st.session_state.history = []
             st.rerun()
 
@@ -356,7 +411,8 @@ with st.sidebar:
                             if EMBEDDING_AVAILABLE and len(result["data"]) > 0:
                                 try:
                                     store = EmbeddingStore()
-                                    added = store.add_items(result["data"])
+                                    # 複数バッチを並行に Embedding 化（EMBEDDING_RPM で送信ペースを制限）
+                                    added = asyncio.run(store.aadd_items(result["data"]))
                                     st.session_state.embedding_store = store
                                     st.caption(f"類似検索用に{added}件を学習")
                                 except Exception:
@@ -567,11 +623,9 @@ def _render_line_items_and_actions(result: dict, decision: str, show_reasons: bo
         current_name = ""
         if line_items and len(line_items) > 0:
             current_name = line_items[0].get("description", "")
-        if current_name and not current_name.startswith("明細") and len(st.session_state.history) > 1:
+        if current_name and not current_name.startswith("明細") and _history_count() > 1:
             try:
-                similar = search_similar_from_history(
-                    current_name, st.session_state.history, top_k=3, threshold=0.5
-                )
+                similar = _similar_from_history(current_name)
                 if similar:
                     render_similar_cases(current_name, similar)
             except Exception:
@@ -694,7 +748,7 @@ else:
                         _fb_resp = requests.post(_fb_url, files=_fb_files, params=_fb_params, timeout=30)
                         _fb_resp.raise_for_status()
                         _fb_data = _fb_resp.json()
-                    if _check_duplicate(_fb_pdf.name, 0):
+                    if _check_duplicate(_fb_pdf.name, _document_total(_fb_data)):
                         st.session_state.duplicate_warning = _fb_pdf.name
                     else:
                         st.session_state.duplicate_warning = None
@@ -4,7 +4,8 @@
 Batch upload UI for fixed asset classification.
 複数PDFを一括でアップロードし、判定結果をテーブル表示する。
 """
-from typing import Any, Dict, List, Optional
+import json
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
 import streamlit as st
@@ -42,6 +43,53 @@ def _format_confidence(confidence: Optional[float]) -> str:
     return f"{confidence:.0%}"
 
 
+def _read_batch_stream(
+    response: requests.Response,
+    total_files: int,
+    on_result: Callable[[int, Dict[str, Any]], None],
+) -> Dict[str, Any]:
+    """
+    /classify_batch?stream=ndjson の応答を1行ずつ読み、BatchResponse 形式にまとめる
+
+    Args:
+        response: stream=True で取得したレスポンス
+        total_files: 送信したファイル数
+        on_result: 1件完了するごとに (完了件数, 結果) で呼ばれるコールバック
+
+    Returns:
+        {"results": [...アップロード順...], "total", "success", "failed"}
+    """
+    # ストリーミング非対応のサーバーは通常のJSONを返す
+    if not response.headers.get("content-type", "").startswith("application/x-ndjson"):
+        return response.json()
+
+    results: List[Optional[Dict[str, Any]]] = [None] * total_files
+    summary: Dict[str, Any] = {}
+    done = 0
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        event = json.loads(line)
+        if event.get("type") == "summary":
+            summary = event
+        elif event.get("type") == "result":
+            index = event.get("index", done)
+            item = {k: v for k, v in event.items() if k not in ("type", "index")}
+            if 0 <= index < total_files:
+                results[index] = item
+            done += 1
+            on_result(done, item)
+
+    ordered = [r for r in results if r is not None]
+    success = sum(1 for r in ordered if r.get("success"))
+    return {
+        "results": ordered,
+        "total": summary.get("total", total_files),
+        "success": summary.get("success", success),
+        "failed": summary.get("failed", len(ordered) - success),
+    }
+
+
 def render_batch_upload(api_url: str) -> None:
     """
     一括アップロードUIをレンダリング
@@ -117,23 +165,29 @@ def render_batch_upload(api_url: str) -> None:
             progress_placeholder.progress(0.0, text=f"処理中... (0/{total_files})")
             status_placeholder.info("📤 ファイルをアップロードしています...")
 
-            # API呼び出し（一括）
-            # タイムアウトは1ファイル30秒を想定
+            # API呼び出し（一括・NDJSONストリーミング）
+            # サーバー側で並行処理され、1ファイル完了ごとに結果が届く
+            # タイムアウトは1ファイル30秒を想定（読み取り間隔に対して適用される）
             timeout = max(60, total_files * 30)
 
+            def on_result(done: int, item: Dict[str, Any]) -> None:
+                icon = "✅" if item.get("success") else "❌"
+                progress_placeholder.progress(
+                    done / total_files, text=f"処理中... ({done}/{total_files})"
+                )
+                status_placeholder.info(f"{icon} {item.get('filename', '')}")
+
             response = requests.post(
                 batch_url,
                 files=files_to_send,
-                params={"estimate_useful_life_flag": "1"},
+                params={"estimate_useful_life_flag": "1", "stream": "ndjson"},
                 timeout=timeout,
+                stream=True,
             )
 
-            # 進捗更新（API呼び出し完了）
-            progress_placeholder.progress(1.0, text=f"処理完了 ({total_files}/{total_files})")
-            status_placeholder.empty()
-
+            # 進捗更新（完了ごとに on_result で更新）
             if response.status_code == 200:
-                result_data = response.json()
+                result_data = _read_batch_stream(response, total_files, on_result)
                 st.session_state.batch_results = result_data
             elif response.status_code == 400:
                 error_detail = response.json().get("detail", {})
@@ -145,6 +199,10 @@ def render_batch_upload(api_url: str) -> None:
             else:
                 st.error(f"⚠️ APIエラー（ステータス: {response.status_code}）")
 
+            # どの応答でも最後に100%表示し、ステータス表示を消す
+            progress_placeholder.progress(1.0, text=f"処理完了 ({total_files}/{total_files})")
+            status_placeholder.empty()
+
         except requests.exceptions.Timeout:
             st.error("⚠️ タイムアウトしました。ファイル数を減らしてお試しください。")
         except requests.exceptions.ConnectionError:
@@ -154,6 +212,7 @@ def render_batch_upload(api_url: str) -> None:
         finally:
             st.session_state.batch_processing = False
             progress_placeholder.empty()
+            status_placeholder.empty()
             st.rerun()
 
     # 結果表示